@@ -1,10 +1,17 @@
 """Django Admin models for Arklet."""
 
 from django.contrib import admin, messages
+from django.contrib.admin.views.main import ChangeList
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils.functional import cached_property
 
 from arklet.ark.forms import MintArkAdminForm
 from arklet.ark.models import APIKey, Ark, Key, Naan, Shoulder, User
 
+# Query string parameter of the last ARK on the previous changelist page
+AFTER_VAR = "after"
+
 
 @admin.register(User)
 class UserAdmin(admin.ModelAdmin):
@@ -22,23 +29,143 @@ class NaanAdmin(admin.ModelAdmin):
 class ShoulderAdmin(admin.ModelAdmin):
     """Django Admin model for ARK shoulders."""
 
-    list_display = ["shoulder", "name", "naan"]
+    list_display = ["shoulder", "name", "naan", "minter_template", "redirect_template"]
+    readonly_fields = ["minter_counter"]
+
+
+class ApproximateCountPaginator(Paginator):
+    """Paginator that never counts every row of a huge table.
+
+    The unfiltered count is PostgreSQL's estimate from pg_class.reltuples, kept up to
+    date by (auto)vacuum and analyze. Filtered counts stop at MAX_COUNT rows.
+    """
+
+    MAX_COUNT = 10000
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        connection = connections[queryset.db]
+        if connection.vendor == "postgresql" and not queryset.query.where:
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    "SELECT reltuples FROM pg_class WHERE oid = %s::regclass",
+                    [queryset.model._meta.db_table],
+                )
+                estimate = int(cursor.fetchone()[0])
+            # The estimate is -1 (0 before PostgreSQL 14) until the first analyze
+            if estimate > 0:
+                return estimate
+        return queryset[: self.MAX_COUNT].count()
+
+
+class KeysetChangeList(ChangeList):
+    """ChangeList that pages through ARKs by primary key instead of OFFSET.
+
+    A page is the list_per_page ARKs after the last ARK of the previous page, so
+    every page costs an index range scan, however deep into the table it is.
+    """
+
+    def __init__(self, request, *args, **kwargs):
+        super().__init__(request, *args, **kwargs)
+        # Filter, search and ordering links all start over from the first page
+        self.params.pop(AFTER_VAR, None)
+        getattr(self, "filter_params", {}).pop(AFTER_VAR, None)
+
+    def get_filters_params(self, params=None):
+        lookup_params = super().get_filters_params(params)
+        lookup_params.pop(AFTER_VAR, None)
+        return lookup_params
+
+    def get_results(self, request):
+        paginator = self.model_admin.get_paginator(
+            request, self.queryset, self.list_per_page
+        )
+        after = request.GET.get(AFTER_VAR)
+        queryset = self.queryset.filter(ark__gt=after) if after else self.queryset
+        # One extra row tells whether there is a next page
+        result_list = list(queryset[: self.list_per_page + 1])
+        has_next = len(result_list) > self.list_per_page
+        result_list = result_list[: self.list_per_page]
+
+        self.result_count = paginator.count
+        self.show_full_result_count = False
+        self.show_admin_actions = True
+        self.full_result_count = None
+        self.result_list = result_list
+        self.can_show_all = False
+        self.multi_page = bool(after) or has_next
+        self.paginator = paginator
+        self.first_page_url = (
+            self.get_query_string(remove=[AFTER_VAR]) if after else None
+        )
+        self.next_page_url = (
+            self.get_query_string({AFTER_VAR: result_list[-1].ark})
+            if has_next
+            else None
+        )
+
+
+class ShoulderListFilter(admin.SimpleListFilter):
+    """Filter on the shoulders in the Shoulder table.
+
+    The stock filter for a CharField would list the shoulders with a SELECT DISTINCT
+    over every ARK.
+    """
+
+    title = "shoulder"
+    parameter_name = "shoulder"
+
+    def lookups(self, request, model_admin):
+        shoulders = (
+            Shoulder.objects.order_by("naan", "shoulder")
+            .values_list("naan", "shoulder")
+            .distinct()
+        )
+        return [
+            (f"{naan}{shoulder}", f"{naan}{shoulder}") for naan, shoulder in shoulders
+        ]
+
+    def queryset(self, request, queryset):
+        if not self.value():
+            return queryset
+        naan, _, shoulder = self.value().partition("/")
+        return queryset.filter(naan_id=naan, shoulder=f"/{shoulder}")
 
 
 @admin.register(Ark)
 class ArkAdmin(admin.ModelAdmin):
     """Django Admin model for ARKs.
 
-    In practice, stock Django Admin doesn't work well for large randomly sorted tables.
-    This view will tend to take a long time to load as a full table count query is run.
+    Stock Django Admin doesn't work well for large randomly sorted tables: it counts
+    every row and pages with OFFSET, so this changelist replaces both. Pages are read
+    in ark order with KeysetChangeList, counts are approximate, searches are ARK
+    prefix matches and filters are on the (naan, shoulder, ark) index. Sorting by
+    other columns is disabled, as it would need a full table sort.
 
     The "Add ARK" action uses MintArkAdminForm so that staff can mint new ARKs through
     the admin instead of having to call the API directly.
     """
 
     list_display = ["ark", "url", "created_at", "updated_at"]
+    list_filter = ["naan", ShoulderListFilter]
+    search_fields = ["ark"]
+    search_help_text = "ARKs starting with, e.g. ark:/13960/t5"
+    ordering = ["ark"]
+    sortable_by = []
+    paginator = ApproximateCountPaginator
     show_full_result_count = False
 
+    def get_changelist(self, request, **kwargs):
+        return KeysetChangeList
+
+    def get_search_results(self, request, queryset, search_term):
+        # A prefix match on the primary key, which ark_ark_prefix_idx serves
+        prefix = search_term.strip().removeprefix("ark:").lstrip("/")
+        if not prefix:
+            return queryset, False
+        return queryset.filter(ark__startswith=prefix), False
+
     def get_form(self, request, obj=None, **kwargs):
         if obj is None:  # add view – return the minting form directly to avoid
             # modelform_factory calling fields_for_model with 'naan', which raises
@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class ArkConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "arklet.ark"
+
+    def ready(self):
+        # Connect the signals that keep the shoulder registry current
+        from arklet.ark import shoulders  # noqa: F401
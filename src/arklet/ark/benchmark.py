@@ -0,0 +1,384 @@
+"""Benchmarks for the hot paths of arklet.
+
+Each scenario drives one endpoint in-process through the Django test client, so the
+full middleware stack and URL routing are included in the measurements. The ASGI
+scenarios instead await the resolve views directly, many requests at a time, to compare
+the async view with the sync one run in a thread the way Django's ASGI handler does.
+Scenarios are run against whatever database is configured; the benchmark management
+command creates a throwaway test database for them.
+
+Results are plain dicts, ready to be dumped as JSON and compared between releases.
+"""
+
+import asyncio
+import json
+import platform
+import random
+import statistics
+import time
+import tracemalloc
+from collections.abc import Awaitable, Callable
+from datetime import datetime, timezone
+from typing import Optional
+
+import django
+from asgiref.sync import async_to_sync, sync_to_async
+from django.conf import settings
+from django.db import connection
+from django.test import AsyncRequestFactory, Client, override_settings
+
+from arklet.ark import utils
+from arklet.ark.cache import get_resolver_cache
+from arklet.ark.models import Ark, Key, Naan, Shoulder, User
+from arklet.ark.utils import (
+    generate_noid,
+    generate_noids,
+    noid_check_digit,
+    noid_check_digits,
+    parse_ark_parts,
+)
+from arklet.ark.views import aresolve_ark, resolve_ark
+
+SCENARIOS: dict[str, Callable] = {}
+
+# Requests in flight at once in the ASGI scenarios
+ASGI_CONCURRENCY = 100
+# The ASGI scenarios resolve ARKs drawn from this many, like traffic to popular items
+HOT_ARKS = 1000
+
+
+def scenario(name: str):
+    """Register a benchmark scenario.
+
+    A scenario is called with a BenchmarkContext and an iteration count and returns
+    one latency sample, in seconds, per iteration.
+    """
+
+    def register(fn):
+        SCENARIOS[name] = fn
+        return fn
+
+    return register
+
+
+def summarize(samples: list[float], elapsed: Optional[float] = None) -> dict:
+    """Throughput and latency percentiles, in milliseconds, of a list of samples.
+
+    Throughput is over elapsed seconds of wall time, which is less than the sum of
+    the samples when requests run concurrently.
+    """
+    ordered = sorted(samples)
+    elapsed = sum(samples) if elapsed is None else elapsed
+
+    def percentile(p):
+        return ordered[min(len(ordered) - 1, int(p / 100 * len(ordered)))] * 1000
+
+    return {
+        "iterations": len(samples),
+        "ops_per_sec": len(samples) / elapsed if elapsed else None,
+        "mean_ms": statistics.fmean(samples) * 1000,
+        "p50_ms": percentile(50),
+        "p95_ms": percentile(95),
+        "p99_ms": percentile(99),
+        "max_ms": ordered[-1] * 1000,
+    }
+
+
+# Peak bytes allocated by each call of time_calls made while tracemalloc is tracing
+_allocation_peaks: list[int] = []
+
+
+def time_calls(fn: Callable[[int], object], iterations: int) -> list[float]:
+    """Call fn(i) for each iteration and return the duration of each call.
+
+    While tracemalloc is tracing, the peak memory allocated by each call is recorded
+    too, for run_benchmarks to report.
+    """
+    tracing = tracemalloc.is_tracing()
+    samples = []
+    for i in range(iterations):
+        if tracing:
+            tracemalloc.reset_peak()
+            baseline = tracemalloc.get_traced_memory()[0]
+        start = time.perf_counter()
+        fn(i)
+        samples.append(time.perf_counter() - start)
+        if tracing:
+            _allocation_peaks.append(tracemalloc.get_traced_memory()[1] - baseline)
+    return samples
+
+
+class BenchmarkContext:
+    """The seeded NAAN, shoulder, ARKs and clients shared by the scenarios."""
+
+    def __init__(self, ark_count: int, seed: int = 0):
+        self.random = random.Random(seed)
+        self.naan = Naan.objects.create(
+            naan=99999,
+            name="Benchmark",
+            description="Benchmark NAAN",
+            url="https://example.com",
+        )
+        self.shoulder = Shoulder.objects.create(
+            shoulder="/b1", naan=self.naan, name="Benchmark", description=""
+        )
+        self.auth = f"Bearer {Key.objects.create(naan=self.naan, active=True).key}"
+        self.arks = seed_arks(self.naan, self.shoulder.shoulder, ark_count)
+        self.client = Client()
+        admin = User.objects.create_superuser("benchmark", password=None)
+        self.admin_client = Client()
+        self.admin_client.force_login(admin)
+
+    def random_ark(self) -> str:
+        return self.random.choice(self.arks)
+
+
+def seed_arks(naan: Naan, shoulder: str, count: int) -> list[str]:
+    """Bulk create count bound ARKs and return their ark strings."""
+    arks = []
+    for start in range(0, count, 10000):
+        batch = [
+            Ark(
+                ark=f"{naan.naan}{shoulder}{noid}",
+                naan=naan,
+                shoulder=shoulder,
+                assigned_name=noid,
+                url=f"https://example.com/{noid}",
+            )
+            for noid in generate_noids(min(10000, count - start), 10)
+        ]
+        Ark.objects.bulk_create(batch, ignore_conflicts=True)
+        arks.extend(ark.ark for ark in batch)
+    return arks
+
+
+@scenario("resolve")
+def bench_resolve(ctx: BenchmarkContext, iterations: int) -> list[float]:
+    """Resolve random seeded ARKs."""
+    targets = [ctx.random_ark() for _ in range(iterations)]
+    return time_calls(lambda i: ctx.client.get(f"/ark:/{targets[i]}"), iterations)
+
+
+@scenario("resolve_fast")
+def bench_resolve_fast(ctx: BenchmarkContext, iterations: int) -> list[float]:
+    """Resolve random seeded ARKs as a resolver-only process does."""
+    targets = [ctx.random_ark() for _ in range(iterations)]
+    # See ARKLET_RESOLVER_ONLY in settings.py
+    with override_settings(
+        MIDDLEWARE=settings.ARKLET_RESOLVER_MIDDLEWARE,
+        ROOT_URLCONF="arklet.entrypoints.resolver_urls",
+    ):
+        client = Client()
+        return time_calls(lambda i: client.get(f"/ark:/{targets[i]}"), iterations)
+
+
+@scenario("mint")
+def bench_mint(ctx: BenchmarkContext, iterations: int) -> list[float]:
+    """Mint ARKs one per request."""
+    body = {"naan": ctx.naan.naan, "shoulder": ctx.shoulder.shoulder, "url": ""}
+    return time_calls(
+        lambda i: ctx.client.post(
+            "/mint", body, content_type="application/json", HTTP_AUTHORIZATION=ctx.auth
+        ),
+        iterations,
+    )
+
+
+@scenario("update")
+def bench_update(ctx: BenchmarkContext, iterations: int) -> list[float]:
+    """Rebind random seeded ARKs one per request."""
+    bodies = [
+        {"ark": f"ark:/{ctx.random_ark()}", "url": f"https://example.com/u{i}"}
+        for i in range(iterations)
+    ]
+    return time_calls(
+        lambda i: ctx.client.put(
+            "/update",
+            bodies[i],
+            content_type="application/json",
+            HTTP_AUTHORIZATION=ctx.auth,
+        ),
+        iterations,
+    )
+
+
+@scenario("admin_changelist")
+def bench_admin_changelist(ctx: BenchmarkContext, iterations: int) -> list[float]:
+    """Render the first page of the Ark admin changelist."""
+    return time_calls(lambda i: ctx.admin_client.get("/admin/ark/ark/"), iterations)
+
+
+# NOIDs generated or check digits computed per iteration of the NOID scenarios
+NOID_BATCH = 10000
+
+
+@scenario("generate_noid")
+def bench_generate_noid(ctx: BenchmarkContext, iterations: int) -> list[float]:
+    """Generate a batch of NOIDs one at a time."""
+    return time_calls(
+        lambda i: [generate_noid(8) for _ in range(NOID_BATCH)], iterations
+    )
+
+
+@scenario("generate_noids")
+def bench_generate_noids(ctx: BenchmarkContext, iterations: int) -> list[float]:
+    """Generate a batch of NOIDs with the bulk API."""
+    return time_calls(lambda i: generate_noids(NOID_BATCH, 8), iterations)
+
+
+@scenario("noid_check_digit")
+def bench_noid_check_digit(ctx: BenchmarkContext, iterations: int) -> list[float]:
+    """Compute a batch of check digits one at a time."""
+    arks = [f"99999/b1{noid}" for noid in generate_noids(NOID_BATCH, 8)]
+    return time_calls(lambda i: [noid_check_digit(ark) for ark in arks], iterations)
+
+
+@scenario("noid_check_digits")
+def bench_noid_check_digits(ctx: BenchmarkContext, iterations: int) -> list[float]:
+    """Compute a batch of check digits with the bulk API."""
+    arks = [f"99999/b1{noid}" for noid in generate_noids(NOID_BATCH, 8)]
+    return time_calls(lambda i: noid_check_digits(arks), iterations)
+
+
+def ark_urls(count: int) -> list[str]:
+    """Distinct ARKs in the shapes resolve_ark sees, some with qualifiers."""
+    suffixes = ["", "", "/page2.pdf", "?info"]
+    return [
+        f"https://n2t.net/ark:/99999/b1{noid}{suffixes[i % len(suffixes)]}"
+        for i, noid in enumerate(generate_noids(count, 8))
+    ]
+
+
+@scenario("parse_ark")
+def bench_parse_ark(ctx: BenchmarkContext, iterations: int) -> list[float]:
+    """Parse a batch of distinct ARKs, none of them cached."""
+    arks = ark_urls(NOID_BATCH)
+
+    def parse(i):
+        utils._parse_ark.cache_clear()
+        for ark in arks:
+            parse_ark_parts(ark)
+
+    return time_calls(parse, iterations)
+
+
+@scenario("parse_ark_cached")
+def bench_parse_ark_cached(ctx: BenchmarkContext, iterations: int) -> list[float]:
+    """Parse a batch of ARKs drawn from a few hot ones, as the parse cache sees."""
+    hot = ark_urls(HOT_ARKS)
+    arks = [ctx.random.choice(hot) for _ in range(NOID_BATCH)]
+    return time_calls(lambda i: [parse_ark_parts(ark) for ark in arks], iterations)
+
+
+def time_concurrent_calls(
+    fn: Callable[[int], Awaitable], iterations: int, concurrency: int
+) -> list[float]:
+    """Await fn(i) for each iteration, up to concurrency calls at once."""
+
+    async def run():
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def timed(i):
+            async with semaphore:
+                start = time.perf_counter()
+                await fn(i)
+                return time.perf_counter() - start
+
+        return await asyncio.gather(*(timed(i) for i in range(iterations)))
+
+    return async_to_sync(run)()
+
+
+def asgi_requests(ctx: BenchmarkContext, iterations: int) -> list[tuple]:
+    factory = AsyncRequestFactory()
+    arks = [ctx.random.choice(ctx.arks[:HOT_ARKS]) for _ in range(iterations)]
+    return [(factory.get(f"/ark:/{ark}"), f"ark:/{ark}") for ark in arks]
+
+
+@scenario("resolve_asgi_sync")
+def bench_resolve_asgi_sync(ctx: BenchmarkContext, iterations: int) -> list[float]:
+    """Resolve concurrently with the sync view, run in a thread as ASGI does."""
+    requests = asgi_requests(ctx, iterations)
+    view = sync_to_async(resolve_ark)
+    return time_concurrent_calls(
+        lambda i: view(requests[i][0], ark=requests[i][1]), iterations, ASGI_CONCURRENCY
+    )
+
+
+@scenario("resolve_asgi_async")
+def bench_resolve_asgi_async(ctx: BenchmarkContext, iterations: int) -> list[float]:
+    """Resolve concurrently with the async view, as routed under ASGI."""
+    requests = asgi_requests(ctx, iterations)
+    return time_concurrent_calls(
+        lambda i: aresolve_ark(requests[i][0], ark=requests[i][1]),
+        iterations,
+        ASGI_CONCURRENCY,
+    )
+
+
+# Iterations traced per scenario to measure allocations; tracing slows every call
+ALLOCATION_ITERATIONS = 200
+
+
+def trace_allocations(ctx: BenchmarkContext, name: str, iterations: int) -> dict:
+    """Rerun a scenario under tracemalloc and summarize its per-call peak allocations.
+
+    Only scenarios timed with time_calls are measured; the others report nothing.
+    """
+    _allocation_peaks.clear()
+    tracemalloc.start()
+    try:
+        SCENARIOS[name](ctx, min(iterations, ALLOCATION_ITERATIONS))
+    finally:
+        tracemalloc.stop()
+    if not _allocation_peaks:
+        return {}
+    return {
+        "alloc_peak_kib_mean": statistics.fmean(_allocation_peaks) / 1024,
+        "alloc_peak_kib_max": max(_allocation_peaks) / 1024,
+    }
+
+
+def run_benchmarks(
+    scenarios: list[str],
+    ark_count: int,
+    iterations: int,
+    use_cache: bool = True,
+    allocations: bool = False,
+) -> dict:
+    """Seed ark_count ARKs, then run each scenario for the given iterations.
+
+    With use_cache=False, the resolver cache is disabled, so the database cost of
+    resolve_ark is measured rather than the cache's. With allocations=True, each
+    scenario is run again under tracemalloc to measure the memory each call allocates.
+    """
+    ctx = BenchmarkContext(ark_count)
+    cache_size = get_resolver_cache().max_size if use_cache else 0
+    results = {}
+    for name in scenarios:
+        # Every scenario starts with a fresh cache and fresh cache counters
+        with override_settings(ARKLET_RESOLVER_CACHE_SIZE=cache_size):
+            start = time.perf_counter()
+            samples = SCENARIOS[name](ctx, iterations)
+            results[name] = summarize(samples, time.perf_counter() - start)
+            results[name]["resolver_cache"] = get_resolver_cache().stats()
+        if allocations:
+            with override_settings(ARKLET_RESOLVER_CACHE_SIZE=cache_size):
+                results[name].update(trace_allocations(ctx, name, iterations))
+    return {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "database": connection.vendor,
+            "django": django.get_version(),
+            "python": platform.python_version(),
+            "arks": ark_count,
+            "iterations": iterations,
+            "resolver_cache": use_cache,
+            "allocations": allocations,
+        },
+        "results": results,
+    }
+
+
+def dumps(results: dict) -> str:
+    return json.dumps(results, indent=2, sort_keys=True)
@@ -0,0 +1,277 @@
+"""In-process caches used to keep hot lookups off the database.
+
+Each cache is a bounded LRU with a per-entry TTL. A cache may optionally be backed by
+one of Django's configured caches (see the CACHES setting) so that entries are shared
+between worker processes. The in-process LRU is always consulted first.
+
+Writes in one process can't reach the local entries of the others, so a cache may cap
+how long it keeps them with local_ttl: a delete is then seen everywhere within that
+long. Clearing a shared cache bumps its generation, a counter kept in the shared
+backend that versions every shared key. Other processes check it at most every
+GENERATION_CHECK_INTERVAL seconds and drop their local entries when it has moved.
+"""
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+
+_MISSING = object()
+
+# Seconds between checks of the shared generation, so clears reach other processes
+# within this long at the cost of one backend read per interval
+GENERATION_CHECK_INTERVAL = 1
+
+
+class LRUCache:
+    """Bounded, thread-safe LRU cache with a TTL on every entry.
+
+    A max_size of 0 disables the cache entirely: every get is a miss and every set is
+    dropped. When backend names a Django cache alias, entries are written through to
+    that cache and local misses are filled from it. local_ttl, if given, caps the
+    TTL of local entries, so that deletes in other processes are seen within it.
+    """
+
+    def __init__(
+        self,
+        max_size: int,
+        ttl: int,
+        backend: str = "",
+        prefix: str = "",
+        local_ttl: Optional[int] = None,
+    ):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.local_ttl = local_ttl
+        self.prefix = prefix
+        self.backend = caches[backend] if backend and max_size else None
+        self._entries: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+        self._generation = None
+        self._generation_checked_at = float("-inf")
+        self.hits = 0
+        self.misses = 0
+        self.shared_hits = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def _shared_key(self, key: str) -> str:
+        # Keys may be arbitrary user input, which memcached and friends won't accept.
+        digest = hashlib.sha256(key.encode()).hexdigest()
+        return f"{self.prefix}{self._generation}:{digest}"
+
+    @property
+    def _generation_key(self) -> str:
+        return f"{self.prefix}generation"
+
+    def _generation_due(self) -> bool:
+        return (
+            self.backend is not None
+            and time.monotonic() - self._generation_checked_at
+            >= GENERATION_CHECK_INTERVAL
+        )
+
+    def _check_generation(self) -> None:
+        """Pick up clears made by other processes, see GENERATION_CHECK_INTERVAL."""
+        if self._generation_due():
+            self._set_generation(self.backend.get(self._generation_key, 0))
+
+    async def _acheck_generation(self) -> None:
+        if self._generation_due():
+            self._set_generation(await self.backend.aget(self._generation_key, 0))
+
+    def _set_generation(self, generation: int) -> None:
+        with self._lock:
+            self._generation_checked_at = time.monotonic()
+            if generation != self._generation:
+                self._entries.clear()
+                self._generation = generation
+
+    def get(self, key: str, default=None):
+        """Return the cached value for key, or default when absent or expired."""
+        if not self.max_size:
+            return default
+        self._check_generation()
+        value = self._get_local(key)
+        if value is _MISSING and self.backend is not None:
+            value = self.backend.get(self._shared_key(key), _MISSING)
+            self._count_shared(key, value)
+        return self._count_miss(default) if value is _MISSING else value
+
+    async def aget(self, key: str, default=None):
+        """Like get, but awaits the shared backend instead of blocking on it.
+
+        Local hits are answered without leaving the event loop.
+        """
+        if not self.max_size:
+            return default
+        await self._acheck_generation()
+        value = self._get_local(key)
+        if value is _MISSING and self.backend is not None:
+            value = await self.backend.aget(self._shared_key(key), _MISSING)
+            self._count_shared(key, value)
+        return self._count_miss(default) if value is _MISSING else value
+
+    def _get_local(self, key: str):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key, _MISSING)
+            if entry is _MISSING:
+                return _MISSING
+            expires_at, value = entry
+            if expires_at > now:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return value
+            del self._entries[key]
+            self.expirations += 1
+            return _MISSING
+
+    def _count_shared(self, key: str, value) -> None:
+        if value is not _MISSING:
+            self._set_local(key, value, self.ttl)
+            with self._lock:
+                self.hits += 1
+                self.shared_hits += 1
+
+    def _count_miss(self, default):
+        with self._lock:
+            self.misses += 1
+        return default
+
+    def set(self, key: str, value, ttl: Optional[int] = None) -> None:
+        """Cache value under key for ttl seconds (defaults to the cache TTL)."""
+        if not self.max_size:
+            return
+        ttl = self.ttl if ttl is None else ttl
+        self._check_generation()
+        self._set_local(key, value, ttl)
+        if self.backend is not None:
+            self.backend.set(self._shared_key(key), value, ttl)
+
+    async def aset(self, key: str, value, ttl: Optional[int] = None) -> None:
+        """Like set, but awaits the shared backend instead of blocking on it."""
+        if not self.max_size:
+            return
+        ttl = self.ttl if ttl is None else ttl
+        await self._acheck_generation()
+        self._set_local(key, value, ttl)
+        if self.backend is not None:
+            await self.backend.aset(self._shared_key(key), value, ttl)
+
+    def _set_local(self, key: str, value, ttl: int) -> None:
+        if self.local_ttl is not None:
+            ttl = min(ttl, self.local_ttl)
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key: str) -> None:
+        self.delete_many([key])
+
+    def delete_many(self, keys) -> None:
+        """Drop keys from the local cache and from the shared backend, if any."""
+        if not self.max_size:
+            return
+        keys = list(keys)
+        self._check_generation()
+        with self._lock:
+            for key in keys:
+                self._entries.pop(key, None)
+        if self.backend is not None and keys:
+            self.backend.delete_many([self._shared_key(key) for key in keys])
+
+    def clear(self) -> None:
+        """Drop every entry, in this process and, if shared, in all the others.
+
+        The shared backend may hold entries for other caches, so it is not flushed.
+        The generation is bumped instead, which orphans the shared entries until they
+        expire, and makes other processes drop their local entries within
+        GENERATION_CHECK_INTERVAL seconds.
+        """
+        with self._lock:
+            self._entries.clear()
+        if self.backend is None or not self.max_size:
+            return
+        try:
+            generation = self.backend.incr(self._generation_key)
+        except ValueError:
+            # First clear: the counter must outlive the entries it versions
+            self.backend.add(self._generation_key, 0, timeout=None)
+            generation = self.backend.incr(self._generation_key)
+        self._set_generation(generation)
+
+    def stats(self) -> dict:
+        """Counters for sizing the cache. These are per-process."""
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "shared_hits": self.shared_hits,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
+
+
+_resolver_cache = None
+
+
+def get_resolver_cache() -> LRUCache:
+    """Return this process's cache of resolve_ark redirect targets.
+
+    Keys are ARK strings as requested, e.g. "13960/t5n960f7n". Values are Resolution
+    tuples (see resolution.py): the redirect target, or "" for an ARK that exists but
+    has no URL bound to it yet, plus what its caching headers need.
+    """
+    global _resolver_cache
+    if _resolver_cache is None:
+        _resolver_cache = LRUCache(
+            max_size=getattr(settings, "ARKLET_RESOLVER_CACHE_SIZE", 10000),
+            ttl=getattr(settings, "ARKLET_RESOLVER_CACHE_TTL", 300),
+            backend=getattr(settings, "ARKLET_RESOLVER_CACHE_BACKEND", ""),
+            prefix="arklet:resolution:",
+            local_ttl=getattr(settings, "ARKLET_RESOLVER_CACHE_LOCAL_TTL", 1),
+        )
+    return _resolver_cache
+
+
+_auth_cache = None
+
+
+def get_auth_cache() -> LRUCache:
+    """Return this process's cache of authorized NAANs.
+
+    Keys are SHA256 hashed bearer tokens (see APIKeyManager.hash_key). Values are the
+    Naan the token authorizes, or None for a token that authorizes nothing. Rejected
+    tokens are cached for ARKLET_AUTH_CACHE_NEGATIVE_TTL seconds.
+    """
+    global _auth_cache
+    if _auth_cache is None:
+        _auth_cache = LRUCache(
+            max_size=getattr(settings, "ARKLET_AUTH_CACHE_SIZE", 1000),
+            ttl=getattr(settings, "ARKLET_AUTH_CACHE_TTL", 60),
+            backend=getattr(settings, "ARKLET_AUTH_CACHE_BACKEND", ""),
+            prefix="arklet:auth:",
+        )
+    return _auth_cache
+
+
+@receiver(setting_changed)
+def reset_caches(*, setting, **kwargs):
+    """Rebuild caches when their settings change, e.g. under override_settings."""
+    global _auth_cache, _resolver_cache
+    if setting.startswith("ARKLET_RESOLVER_CACHE_") or setting == "CACHES":
+        _resolver_cache = None
+    if setting.startswith("ARKLET_AUTH_CACHE_") or setting == "CACHES":
+        _auth_cache = None
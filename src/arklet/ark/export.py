@@ -0,0 +1,169 @@
+"""Read the ARKs of a NAAN out of the database, for /export, exportarks and /changes.
+
+ARKs are read with keyset pagination: each batch is a query for the next rows after
+the last one seen, by primary key for exports and by (updated_at, ark) for the change
+feed. Unlike OFFSET, every batch is as cheap as the first, and unlike a long-running
+cursor, no transaction is held open. Memory use is bounded by the batch size, however
+many rows are exported.
+"""
+
+import base64
+import binascii
+import csv
+import json
+from collections.abc import AsyncIterator, Iterable, Iterator
+from datetime import datetime, timedelta
+from itertools import islice
+from typing import Optional
+
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.db.models import Q
+from django.utils import timezone
+
+from arklet.ark.models import Ark, Naan
+
+EXPORT_FIELDS = ["ark", "url", "metadata", "commitment", "created_at", "updated_at"]
+EXPORT_FORMATS = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+}
+
+
+def iter_arks(
+    naan: Naan,
+    shoulder: Optional[str] = None,
+    since: Optional[datetime] = None,
+    batch_size: int = 5000,
+) -> Iterator[tuple]:
+    """Yield a tuple of EXPORT_FIELDS for every ARK of naan, in ark order.
+
+    Optionally only ARKs of one shoulder, or updated at or after since.
+    """
+    arks = Ark.objects.filter(naan=naan)
+    if shoulder:
+        arks = arks.filter(shoulder=shoulder)
+    if since:
+        arks = arks.filter(updated_at__gte=since)
+    arks = arks.order_by("ark").values_list(*EXPORT_FIELDS)
+
+    last_ark = None
+    while True:
+        batch = arks if last_ark is None else arks.filter(ark__gt=last_ark)
+        rows = list(batch[:batch_size])
+        yield from rows
+        if len(rows) < batch_size:
+            return
+        last_ark = rows[-1][0]
+
+
+def _as_text(value) -> str:
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return "" if value is None else value
+
+
+def as_dict(row: tuple) -> dict:
+    """A row of EXPORT_FIELDS as a JSON serializable dict."""
+    return dict(zip(EXPORT_FIELDS, map(_as_text, row)))
+
+
+def ndjson_lines(rows: Iterable[tuple]) -> Iterator[str]:
+    for row in rows:
+        yield json.dumps(as_dict(row)) + "\n"
+
+
+class _Echo:
+    """A file-like object whose write returns what was written, for csv.writer."""
+
+    def write(self, value: str) -> str:
+        return value
+
+
+def csv_lines(rows: Iterable[tuple]) -> Iterator[str]:
+    writer = csv.writer(_Echo())
+    yield writer.writerow(EXPORT_FIELDS)
+    for row in rows:
+        yield writer.writerow(map(_as_text, row))
+
+
+def export_chunks(
+    rows: Iterable[tuple], format: str, lines_per_chunk: int = 1000
+) -> Iterator[str]:
+    """Format rows from iter_arks in one of the EXPORT_FORMATS.
+
+    Lines are joined into chunks, as writing every line on its own to a streaming
+    response would cost a system call per line.
+    """
+    lines = csv_lines(rows) if format == "csv" else ndjson_lines(rows)
+    while chunk := "".join(islice(lines, lines_per_chunk)):
+        yield chunk
+
+
+def streaming_content(request, chunks: Iterator[str]):
+    """chunks, ready for a StreamingHttpResponse to the request.
+
+    Under ASGI, Django consumes sync iterators with sync_to_async(list), holding the
+    whole response in memory. There the chunks are handed over as an async iterator
+    instead, one chunk, and so one batch of queries, per trip to a thread.
+    """
+    if isinstance(request, ASGIRequest):
+        return _aiter_in_thread(chunks)
+    return chunks
+
+
+async def _aiter_in_thread(chunks: Iterator[str]) -> AsyncIterator[str]:
+    # thread_sensitive, so every query runs on the request's database connection
+    next_chunk = sync_to_async(lambda: next(chunks, None))
+    while (chunk := await next_chunk()) is not None:
+        yield chunk
+
+
+def encode_cursor(updated_at: datetime, ark: str) -> str:
+    """Encode a change feed position as an opaque, URL safe string."""
+    position = json.dumps([updated_at.isoformat(), ark])
+    return base64.urlsafe_b64encode(position.encode()).decode()
+
+
+def decode_cursor(cursor: str) -> tuple[datetime, str]:
+    """Decode a cursor made by encode_cursor. Raises ValueError if it's invalid."""
+    try:
+        updated_at, ark = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return datetime.fromisoformat(updated_at), str(ark)
+    except (binascii.Error, UnicodeDecodeError, TypeError, ValueError):
+        raise ValueError("Invalid cursor")
+
+
+def changes(
+    naan: Naan,
+    cursor: Optional[str] = None,
+    since: Optional[datetime] = None,
+    limit: int = 1000,
+    delay: int = 5,
+) -> tuple[list[tuple], Optional[str]]:
+    """Return up to limit ARKs of naan changed after cursor, and the next cursor.
+
+    Rows are tuples of EXPORT_FIELDS, ordered by (updated_at, ark). Without a cursor,
+    the feed starts at since, or at the beginning. Passing the returned cursor back
+    continues after the last row returned; it is the given cursor if there were none.
+
+    Rows changed in the last delay seconds are held back: a transaction still in
+    flight may yet commit a row with an updated_at earlier than theirs, which the
+    feed would otherwise skip past. Rows without an updated_at (last saved before it
+    was added) and deleted ARKs are not in the feed; see iter_arks for a full export.
+    """
+    arks = Ark.objects.filter(
+        naan=naan, updated_at__lte=timezone.now() - timedelta(seconds=delay)
+    )
+    if cursor:
+        updated_at, ark = decode_cursor(cursor)
+        arks = arks.filter(
+            Q(updated_at__gt=updated_at) | Q(updated_at=updated_at, ark__gt=ark)
+        )
+    elif since:
+        arks = arks.filter(updated_at__gte=since)
+    rows = list(arks.order_by("updated_at", "ark").values_list(*EXPORT_FIELDS)[:limit])
+    if rows:
+        last = dict(zip(EXPORT_FIELDS, rows[-1]))
+        cursor = encode_cursor(last["updated_at"], last["ark"])
+    return rows, cursor
@@ -1,7 +1,10 @@
 from django import forms
+from django.conf import settings
 from django.core.exceptions import ValidationError
 
+from arklet.ark.export import EXPORT_FORMATS, decode_cursor
 from arklet.ark.models import Ark, Naan
+from arklet.ark.shoulders import get_shoulder_registry
 from arklet.ark.utils import parse_ark
 
 
@@ -10,6 +13,16 @@ def validate_shoulder(shoulder: str):
         raise ValidationError("Shoulders must start with a forward slash")
 
 
+def validate_registered_shoulder(naan: int, shoulder: str):
+    """Refuse shoulders missing from the Shoulder table, if that is turned on."""
+    if not getattr(settings, "ARKLET_REQUIRE_REGISTERED_SHOULDERS", False):
+        return
+    if (naan, shoulder) not in get_shoulder_registry():
+        raise ValidationError(
+            {"shoulder": f"{shoulder} is not a registered shoulder of NAAN {naan}"}
+        )
+
+
 def validate_ark(ark: str):
     try:
         parse_ark(ark)
@@ -32,6 +45,48 @@ class UpdateArkForm(forms.Form):
     commitment = forms.CharField(required=False)
 
 
+class MintArkBatchForm(forms.Form):
+    """The NAAN and shoulder shared by every ARK in a batch mint request."""
+
+    naan = forms.IntegerField()
+    shoulder = forms.CharField(validators=[validate_shoulder])
+
+
+class BindArkForm(forms.Form):
+    """The binding for one ARK in a batch mint request."""
+
+    url = forms.URLField(required=False)
+    metadata = forms.CharField(required=False)
+    commitment = forms.CharField(required=False)
+
+
+class ExportArksForm(forms.Form):
+    """The query string of an export request."""
+
+    naan = forms.IntegerField()
+    shoulder = forms.CharField(required=False, validators=[validate_shoulder])
+    since = forms.DateTimeField(required=False)
+    format = forms.ChoiceField(choices=[(f, f) for f in EXPORT_FORMATS], required=False)
+
+
+class ArkChangesForm(forms.Form):
+    """The query string of a change feed request."""
+
+    naan = forms.IntegerField()
+    cursor = forms.CharField(required=False)
+    since = forms.DateTimeField(required=False)
+    limit = forms.IntegerField(required=False, min_value=1)
+
+    def clean_cursor(self):
+        cursor = self.cleaned_data["cursor"]
+        if cursor:
+            try:
+                decode_cursor(cursor)
+            except ValueError as e:
+                raise ValidationError(str(e))
+        return cursor
+
+
 class MintArkAdminForm(forms.ModelForm):
     """Form used in the Django admin to mint a new ARK.
 
@@ -52,6 +107,13 @@ class MintArkAdminForm(forms.ModelForm):
         super().__init__(*args, **kwargs)
         self.fields["naan"].queryset = Naan.objects.all()
 
+    def clean(self):
+        cleaned_data = super().clean()
+        naan, shoulder = cleaned_data.get("naan"), cleaned_data.get("shoulder")
+        if naan is not None and shoulder is not None:
+            validate_registered_shoulder(naan.naan, shoulder)
+        return cleaned_data
+
     class Meta:
         model = Ark
         fields = ["url", "metadata", "commitment"]
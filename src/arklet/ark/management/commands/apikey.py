@@ -1,21 +1,40 @@
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
 
 from arklet.ark.models import APIKey, Naan
 
 
 class Command(BaseCommand):
-    """Create APIKey object and return the plaintext key before hashing to DB."""
+    """Create APIKey object and return the plaintext key before hashing to DB.
 
-    help = "Mint ARKs in bulk"
+    With --deactivate, deactivate the NAAN's active APIKey of the given name instead.
+    """
+
+    help = "Create or deactivate an APIKey"
 
     def add_arguments(self, parser):
         parser.add_argument("naan", type=int)
         parser.add_argument("name", type=str)
+        parser.add_argument(
+            "--deactivate",
+            action="store_true",
+            help="Deactivate the named APIKey instead of creating one.",
+        )
 
     def handle(self, *args, **options):
         naan = Naan.objects.get(pk=options["naan"])
         name = options["name"]
 
+        if options["deactivate"]:
+            try:
+                api_key = APIKey.objects.get(naan=naan, name=name, is_active=True)
+            except APIKey.DoesNotExist:
+                raise CommandError(f"No active APIKey named {name} for {naan}")
+            # save() rather than update() so cached authorizations are invalidated
+            api_key.is_active = False
+            api_key.save()
+            self.stdout.write(self.style.SUCCESS(f"Deactivated APIKey {name}"))
+            return
+
         plain_key = APIKey.objects.create_key(naan, name)
         self.stdout.write(
             self.style.SUCCESS(f"Successfully created APIKey {plain_key}")
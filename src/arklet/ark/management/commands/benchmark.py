@@ -0,0 +1,72 @@
+"""Django Admin command to benchmark the hot paths of arklet.
+
+The benchmarks run in a throwaway test database created next to the configured one,
+so they are safe to point at a development PostgreSQL. To benchmark against SQLite,
+set ARKLET_SQLITE_PATH. Results are written as JSON.
+
+Example call:
+python manage.py benchmark --arks 100000 --iterations 2000 --output bench.json
+"""
+
+from pathlib import Path
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from arklet.ark.benchmark import SCENARIOS, dumps, run_benchmarks
+
+
+class Command(BaseCommand):
+    """Seed a test database and measure throughput and latency of each scenario."""
+
+    help = "Benchmark mint, update, resolve and the admin in a test database"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--arks", type=int, default=10000, help="Number of ARKs to seed."
+        )
+        parser.add_argument(
+            "--iterations", type=int, default=1000, help="Requests per scenario."
+        )
+        parser.add_argument(
+            "--scenario",
+            action="append",
+            dest="scenarios",
+            choices=sorted(SCENARIOS),
+            help="Scenario to run. Repeatable. Defaults to all of them.",
+        )
+        parser.add_argument(
+            "--no-cache",
+            action="store_true",
+            help="Disable the resolver cache, to measure the database path.",
+        )
+        parser.add_argument(
+            "--allocations",
+            action="store_true",
+            help="Also measure the memory allocated per request, with tracemalloc.",
+        )
+        parser.add_argument(
+            "--output", type=Path, help="Write JSON results here instead of stdout."
+        )
+
+    def handle(self, *args, **options):
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            results = run_benchmarks(
+                options["scenarios"] or sorted(SCENARIOS),
+                options["arks"],
+                options["iterations"],
+                use_cache=not options["no_cache"],
+                allocations=options["allocations"],
+            )
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+        if options["output"]:
+            options["output"].write_text(dumps(results))
+            self.stdout.write(self.style.SUCCESS(f"Wrote {options['output']}"))
+        else:
+            self.stdout.write(dumps(results))
@@ -0,0 +1,77 @@
+"""Django Admin command to compile ARK redirects into a memory-mapped snapshot.
+
+The snapshot is read by resolve_ark when ARKLET_RESOLVER_SNAPSHOT points at it, and
+can be turned into an nginx map so that the web server answers without Python at all.
+With --incremental, only ARKs updated since the last build are read from the database.
+
+Example calls:
+python manage.py compileredirects /srv/arklet/redirects.snapshot --naan 13960
+python manage.py compileredirects redirects.snapshot --incremental --nginx-map ark.map
+"""
+
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from arklet.ark.models import Naan
+from arklet.ark.snapshot import RedirectSnapshot, compile_snapshot, write_nginx_map
+
+
+class Command(BaseCommand):
+    """Compile the ARKs of one NAAN, or of all of them, into a redirect snapshot."""
+
+    help = "Compile ARK redirects into a memory-mapped snapshot or an nginx map"
+
+    def add_arguments(self, parser):
+        parser.add_argument("snapshot", type=Path, help="Snapshot file to write.")
+        parser.add_argument("--naan", type=int, help="Only compile ARKs of this NAAN.")
+        parser.add_argument(
+            "--incremental",
+            action="store_true",
+            help="Merge ARKs updated since the existing snapshot was built into it. "
+            "Deleted ARKs are only dropped by a full build.",
+        )
+        parser.add_argument(
+            "--nginx-map",
+            type=Path,
+            help="Also write the bound ARKs of the snapshot as an nginx map here.",
+        )
+        parser.add_argument("--batch-size", type=int, default=5000)
+
+    def handle(self, *args, **options):
+        naan = options["naan"]
+        if naan is not None and not Naan.objects.filter(pk=naan).exists():
+            raise CommandError(f"Unknown NAAN {naan}")
+
+        skipped = []
+        try:
+            totals = compile_snapshot(
+                options["snapshot"],
+                naan,
+                incremental=options["incremental"],
+                batch_size=options["batch_size"],
+                on_skip=skipped.append,
+            )
+        except ValueError as e:
+            raise CommandError(e)
+        for ark in skipped[:10]:
+            self.stderr.write(f"Skipped {ark}, its fields contain tabs or newlines")
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Compiled {totals['arks']} ARKs into {options['snapshot']} "
+                f"({totals['read']} read from the database, {len(skipped)} skipped)"
+            )
+        )
+
+        if options["nginx_map"]:
+            snapshot = RedirectSnapshot(options["snapshot"])
+            tmp_path = options["nginx_map"].with_name(
+                f".{options['nginx_map'].name}.tmp"
+            )
+            try:
+                with tmp_path.open("w") as f:
+                    entries = write_nginx_map(snapshot, f)
+            finally:
+                snapshot.close()
+            tmp_path.replace(options["nginx_map"])
+            self.stdout.write(f"Wrote {entries} redirects to {options['nginx_map']}")
@@ -0,0 +1,60 @@
+"""Django Admin command to export the ARKs of a NAAN as NDJSON or CSV.
+
+Rows are read in keyset-paginated batches and written as they arrive, so the export
+runs in constant memory however many ARKs the NAAN has.
+
+Example call:
+python manage.py exportarks 13960 --shoulder /t --format csv --output t.csv
+"""
+
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from arklet.ark.export import EXPORT_FORMATS, export_chunks, iter_arks
+from arklet.ark.models import Naan
+
+
+class Command(BaseCommand):
+    """Export the ARKs of the given naan, optionally of one shoulder or since."""
+
+    help = "Export the ARKs of a NAAN as NDJSON or CSV"
+
+    def add_arguments(self, parser):
+        parser.add_argument("naan", type=int)
+        parser.add_argument("--shoulder", help="Only export ARKs of this shoulder.")
+        parser.add_argument(
+            "--since",
+            help="Only export ARKs updated at or after this ISO 8601 timestamp.",
+        )
+        parser.add_argument(
+            "--format", choices=sorted(EXPORT_FORMATS), default="ndjson"
+        )
+        parser.add_argument("--batch-size", type=int, default=5000)
+        parser.add_argument(
+            "--output", type=Path, help="Write to this file instead of stdout."
+        )
+
+    def handle(self, *args, **options):
+        try:
+            naan = Naan.objects.get(pk=options["naan"])
+        except Naan.DoesNotExist:
+            raise CommandError(f"Unknown NAAN {options['naan']}")
+        since = None
+        if options["since"]:
+            since = parse_datetime(options["since"])
+            if since is None:
+                raise CommandError(f"Invalid timestamp {options['since']}")
+            if timezone.is_naive(since):
+                since = timezone.make_aware(since)
+
+        rows = iter_arks(naan, options["shoulder"], since, options["batch_size"])
+        chunks = export_chunks(rows, options["format"])
+        if options["output"]:
+            with options["output"].open("w", newline="") as f:
+                f.writelines(chunks)
+        else:
+            for chunk in chunks:
+                self.stdout.write(chunk, ending="")
@@ -0,0 +1,74 @@
+"""Django Admin command to fill the NOID reservoirs that mint claims from.
+
+With ARKLET_NOID_RESERVOIR on, mint and batch mint take their NOIDs from a per-shoulder
+reservoir of NOIDs already checked to be unused. Run this command from cron, or leave
+it running with --interval, to keep the reservoirs topped up.
+
+Example call:
+python manage.py fillreservoir 13960 /t --depth 100000 --interval 60
+"""
+
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from arklet.ark.models import Naan, ReservedNoid
+
+
+class Command(BaseCommand):
+    """Top up the reservoir of the given naan and shoulder, or report depths."""
+
+    help = "Fill the reservoir of pre-generated NOIDs for a NAAN and shoulder"
+
+    def add_arguments(self, parser):
+        parser.add_argument("naan", type=int, nargs="?")
+        parser.add_argument("shoulder", type=str, nargs="?")
+        parser.add_argument(
+            "--depth",
+            type=int,
+            default=10000,
+            help="Number of unused NOIDs to keep in the reservoir.",
+        )
+        parser.add_argument("--batch-size", type=int, default=10000)
+        parser.add_argument(
+            "--interval",
+            type=int,
+            help="Keep running, topping up the reservoir every this many seconds.",
+        )
+        parser.add_argument(
+            "--status",
+            action="store_true",
+            help="Only print the depth of every reservoir.",
+        )
+
+    def handle(self, *args, **options):
+        if options["status"]:
+            for (naan, shoulder), depth in sorted(
+                ReservedNoid.objects.depths().items()
+            ):
+                self.stdout.write(f"{naan}{shoulder}: {depth}")
+            return
+
+        if options["naan"] is None or not options["shoulder"]:
+            raise CommandError("A NAAN and shoulder are required, unless --status")
+        try:
+            naan = Naan.objects.get(pk=options["naan"])
+        except Naan.DoesNotExist:
+            raise CommandError(f"Unknown NAAN {options['naan']}")
+        shoulder = options["shoulder"]
+
+        while True:
+            added = ReservedNoid.objects.fill(
+                naan, shoulder, options["depth"], options["batch_size"]
+            )
+            depth = ReservedNoid.objects.filter(naan=naan, shoulder=shoulder).count()
+            self.stdout.write(
+                self.style.SUCCESS(
+                    f"Reserved {added} NOIDs for {naan.naan}{shoulder}, depth {depth}"
+                )
+            )
+            if depth < options["depth"]:
+                self.stderr.write(f"Could not find {options['depth'] - depth} NOIDs")
+            if not options["interval"]:
+                break
+            time.sleep(options["interval"])
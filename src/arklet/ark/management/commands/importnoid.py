@@ -0,0 +1,237 @@
+"""Django Admin command to import ARK bindings from a Noid/Egg Berkeley DB dump.
+
+The dump is streamed through a generator pipeline and loaded in batches, so memory use
+is bounded by the batch size regardless of the size of the dump. After each batch is
+committed, the byte offset reached in the dump is written to a checkpoint file. Running
+the same command again after a crash resumes from that offset.
+
+With --workers, the dump is split into byte-range shards that are parsed and loaded by
+a pool of processes, each with its own database connection and checkpoint file.
+
+Once the import is done, the resolver cache is cleared, in every process if it is
+shared. Redirect snapshots pick the imported ARKs up on their next incremental build.
+
+Example call:
+python manage.py importnoid noid.dump --shoulder 13960/t --shoulder 13960/fk
+"""
+
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+import django
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from arklet.ark.cache import get_resolver_cache
+from arklet.ark.models import Naan
+from arklet.ark_import.loader import (
+    import_range,
+    plan_shards,
+    read_checkpoint,
+    write_checkpoint,
+)
+from arklet.ark_import.noid import parse_rules
+
+# More shards than workers keeps every worker busy until the end of the import.
+SHARDS_PER_WORKER = 4
+
+
+def sum_checkpoints(checkpoints: list[dict]) -> dict:
+    return {
+        "inserted": sum(checkpoint["inserted"] for checkpoint in checkpoints),
+        "conflicts": sum(checkpoint["conflicts"] for checkpoint in checkpoints),
+        "skipped": sum(checkpoint["skipped"] for checkpoint in checkpoints),
+        "rejected": [
+            key for checkpoint in checkpoints for key in checkpoint.get("rejected", [])
+        ][:10],
+    }
+
+
+class Command(BaseCommand):
+    """Import the "_t" bindings of a Noid dump for the given NAAN/shoulder rules."""
+
+    help = "Import ARK bindings from a Noid/Egg Berkeley DB dump"
+
+    def add_arguments(self, parser):
+        parser.add_argument("dump", type=Path, help="Output of db_dump -p.")
+        parser.add_argument(
+            "--shoulder",
+            action="append",
+            required=True,
+            dest="rules",
+            metavar="NAAN/SHOULDER",
+            help="Import ARKs under this NAAN and shoulder, e.g. 13960/t. Repeatable.",
+        )
+        parser.add_argument(
+            "--blade-length",
+            type=int,
+            help="Skip ARKs whose name after the shoulder isn't this long.",
+        )
+        parser.add_argument("--batch-size", type=int, default=10000)
+        parser.add_argument(
+            "--checkpoint",
+            type=Path,
+            help="Checkpoint file. Defaults to the dump path plus .checkpoint.",
+        )
+        parser.add_argument(
+            "--restart",
+            action="store_true",
+            help="Ignore any checkpoint and import from the start of the dump.",
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=1,
+            help="Import shards of the dump in this many processes.",
+        )
+        parser.add_argument(
+            "--conflicts",
+            type=Path,
+            help="Write the ARKs that were already present to this file.",
+        )
+
+    def handle(self, *args, **options):
+        dump = options["dump"]
+        try:
+            rules = parse_rules(options["rules"])
+        except ValueError as e:
+            raise CommandError(e)
+        naans = {rule.naan for rule in rules}
+        missing = naans - set(
+            Naan.objects.filter(naan__in=naans).values_list("naan", flat=True)
+        )
+        if missing:
+            raise CommandError(f"Unknown NAAN(s): {sorted(missing)}")
+
+        checkpoint_path = options["checkpoint"] or dump.with_name(
+            f"{dump.name}.checkpoint"
+        )
+        if options["restart"]:
+            checkpoint_path.unlink(missing_ok=True)
+            for path in checkpoint_path.parent.glob(f"{checkpoint_path.name}.shard-*"):
+                path.unlink()
+
+        range_options = {
+            "blade_length": options["blade_length"],
+            "batch_size": options["batch_size"],
+        }
+        checkpoint = read_checkpoint(checkpoint_path)
+        if options["workers"] > 1:
+            if connections["default"].vendor == "sqlite":
+                raise CommandError("SQLite can't take concurrent writes from --workers")
+            if checkpoint.get("offset"):
+                raise CommandError("Resume without --workers, or use --restart")
+        elif "shards" in checkpoint:
+            raise CommandError("Resume with --workers, or use --restart")
+
+        self.started = time.monotonic()
+        if options["workers"] > 1:
+            totals = self.import_shards(
+                dump,
+                rules,
+                checkpoint_path,
+                options["conflicts"],
+                options["workers"],
+                range_options,
+            )
+        else:
+            if checkpoint["offset"]:
+                self.stdout.write(f"Resuming from byte {checkpoint['offset']}")
+            self.initially_inserted = checkpoint["inserted"]
+            totals = import_range(
+                dump,
+                rules,
+                checkpoint_path,
+                conflict_log=options["conflicts"],
+                on_batch=self.report,
+                **range_options,
+            )
+
+        # Bulk inserts skip Ark.save, so drop the fallbacks cached for imported ARKs
+        if totals["inserted"]:
+            get_resolver_cache().clear()
+
+        for key in totals["rejected"]:
+            self.stderr.write(f"Skipped {key}")
+        if totals["skipped"] > len(totals["rejected"]):
+            more = totals["skipped"] - len(totals["rejected"])
+            self.stderr.write(f"...and {more} more")
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Imported {totals['inserted']} ARKs ({self.rate(totals)} this run), "
+                f"{totals['conflicts']} already present, {totals['skipped']} skipped"
+            )
+        )
+        if options["conflicts"] and totals["conflicts"]:
+            self.stdout.write(f"ARKs already present are in {options['conflicts']}")
+
+    def rate(self, totals: dict) -> str:
+        inserted = totals["inserted"] - self.initially_inserted
+        return f"{inserted / max(time.monotonic() - self.started, 1e-9):.0f} rows/s"
+
+    def report(self, totals: dict) -> None:
+        self.stdout.write(
+            f"{totals['inserted']} ARKs imported, "
+            f"{totals['conflicts']} already present ({self.rate(totals)})"
+        )
+
+    def import_shards(
+        self, dump, rules, checkpoint_path, conflict_log, workers, range_options
+    ) -> dict:
+        """Import the dump's shards in a process pool and sum up their checkpoints.
+
+        The shard layout is kept in the main checkpoint, so a resumed import reuses it
+        even when run with a different number of workers. Each shard has a checkpoint
+        and conflict log of its own; the logs are merged once every shard is done.
+        """
+        shards = read_checkpoint(checkpoint_path).get("shards")
+        if shards:
+            self.stdout.write(f"Resuming {len(shards)} shards")
+        else:
+            shards = plan_shards(dump, workers * SHARDS_PER_WORKER)
+            write_checkpoint(checkpoint_path, {"shards": shards})
+
+        shard_paths = [
+            checkpoint_path.with_name(f"{checkpoint_path.name}.shard-{i}")
+            for i in range(len(shards))
+        ]
+        shard_logs = [
+            conflict_log.with_name(f"{conflict_log.name}.shard-{i}")
+            if conflict_log
+            else None
+            for i in range(len(shards))
+        ]
+        checkpoints = [
+            read_checkpoint(path, start)
+            for path, (start, _) in zip(shard_paths, shards)
+        ]
+        self.initially_inserted = sum_checkpoints(checkpoints)["inserted"]
+
+        # Worker processes must open database connections of their own
+        connections.close_all()
+        with ProcessPoolExecutor(workers, initializer=django.setup) as pool:
+            futures = {
+                pool.submit(
+                    import_range,
+                    dump,
+                    rules,
+                    shard_paths[i],
+                    start=start,
+                    end=end,
+                    conflict_log=shard_logs[i],
+                    **range_options,
+                ): i
+                for i, (start, end) in enumerate(shards)
+            }
+            for future in as_completed(futures):
+                checkpoints[futures[future]] = future.result()
+                self.report(sum_checkpoints(checkpoints))
+
+        if conflict_log:
+            with conflict_log.open("a") as log:
+                for shard_log in shard_logs:
+                    if shard_log.exists():
+                        log.write(shard_log.read_text())
+                        shard_log.unlink()
+        return sum_checkpoints(checkpoints)
@@ -7,7 +7,7 @@ ARKs, it doesn't bind URLs to them.
 from django.core.management.base import BaseCommand
 
 from arklet.ark.models import Ark, Naan
-from arklet.ark.utils import generate_noid
+from arklet.ark.utils import generate_noids
 
 
 class Command(BaseCommand):
@@ -28,10 +28,10 @@ class Command(BaseCommand):
 
         Ark.objects.bulk_create(
             Ark(
-                ark=f"{naan_id}{shoulder}{generate_noid(20)}",
+                ark=f"{naan_id}{shoulder}{noid}",
                 naan=naan,
                 shoulder=shoulder,
             )
-            for _ in range(ark_count)
+            for noid in generate_noids(ark_count, 20)
         )
         self.stdout.write(self.style.SUCCESS(f"Successfully minted {ark_count} ARKs"))
@@ -0,0 +1,42 @@
+# Generated by Django 5.2.18 on 2026-10-18 07:38
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("ark", "0006_alter_ark_created_at_alter_ark_updated_at"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ReservedNoid",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("shoulder", models.CharField(max_length=50)),
+                ("noid", models.CharField(max_length=100)),
+                (
+                    "naan",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE, to="ark.naan"
+                    ),
+                ),
+            ],
+            options={
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("naan", "shoulder", "noid"), name="unique_reserved_noid"
+                    )
+                ],
+            },
+        ),
+    ]
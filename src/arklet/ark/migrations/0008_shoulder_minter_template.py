@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-18 07:40
+
+import arklet.ark.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("ark", "0007_reservednoid"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="shoulder",
+            name="minter_counter",
+            field=models.PositiveBigIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name="shoulder",
+            name="minter_template",
+            field=models.CharField(
+                blank=True,
+                default="",
+                help_text="Noid template such as .reedeek or .sdddd to mint from a counter. Leave blank to mint random 8 character NOIDs.",
+                max_length=50,
+                validators=[arklet.ark.models.validate_minter_template],
+            ),
+        ),
+    ]
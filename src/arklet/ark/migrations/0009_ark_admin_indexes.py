@@ -0,0 +1,26 @@
+# Generated by Django 5.2.18 on 2026-10-18 07:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("ark", "0008_shoulder_minter_template"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="ark",
+            index=models.Index(
+                fields=["naan", "shoulder", "ark"], name="ark_naan_shoulder_ark_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="ark",
+            index=models.Index(
+                fields=["ark"],
+                name="ark_ark_prefix_idx",
+                opclasses=["varchar_pattern_ops"],
+            ),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.2.18 on 2026-10-18 07:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("ark", "0009_ark_admin_indexes"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="ark",
+            index=models.Index(fields=["naan", "ark"], name="ark_naan_ark_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="ark",
+            index=models.Index(
+                fields=["naan", "updated_at", "ark"], name="ark_naan_updated_at_ark_idx"
+            ),
+        ),
+    ]
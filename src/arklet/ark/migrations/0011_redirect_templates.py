@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:07
+
+import arklet.ark.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("ark", "0010_ark_composite_indexes"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="naan",
+            name="redirect_template",
+            field=models.CharField(
+                blank=True,
+                default="",
+                help_text="URL to redirect ARKs missing from the database to, such as https://example.org/items/{blade}. Placeholders: {ark}, {naan}, {shoulder}, {blade} and {name}. Shoulders may override it.",
+                max_length=500,
+                validators=[arklet.ark.models.validate_redirect_template],
+            ),
+        ),
+        migrations.AddField(
+            model_name="shoulder",
+            name="redirect_template",
+            field=models.CharField(
+                blank=True,
+                default="",
+                help_text="URL to redirect ARKs missing from the database to, such as https://example.org/items/{blade}. Placeholders: {ark}, {naan}, {shoulder}, {blade} and {name}. Leave blank to use the NAAN's.",
+                max_length=500,
+                validators=[arklet.ark.models.validate_redirect_template],
+            ),
+        ),
+    ]
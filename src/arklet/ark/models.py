@@ -2,12 +2,54 @@ import hashlib
 import uuid
 from typing import Union
 
+from django.conf import settings
 from django.contrib.auth.models import AbstractUser
 from django.core.exceptions import ValidationError
-from django.db import IntegrityError, models
-from django.db.models import Q, UniqueConstraint
-
-from arklet.ark.utils import generate_noid, noid_check_digit
+from django.db import IntegrityError, models, transaction
+from django.db.models import Count, Q, UniqueConstraint
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from arklet.ark.cache import get_auth_cache, get_resolver_cache
+from arklet.ark.utils import (
+    NoidTemplate,
+    RedirectTemplate,
+    generate_noid,
+    generate_noids,
+    noid_check_digit,
+    noid_check_digits,
+    normalize_ark,
+)
+
+
+def invalidate_resolutions(*arks: str):
+    """Drop cached resolve_ark results for the given ARK strings.
+
+    The ARKs are dropped as stored and without hyphens, the spellings resolve_ark
+    finds them by. Passthrough redirects through them are left to expire, see
+    resolve_ark. The entries are dropped immediately and again once the surrounding
+    transaction commits, so a concurrent resolve can't re-cache the row as it was
+    before the write.
+    """
+    arks = list({key for ark in arks for key in (ark, normalize_ark(ark))})
+    get_resolver_cache().delete_many(arks)
+    transaction.on_commit(lambda: get_resolver_cache().delete_many(arks))
+
+
+def validate_redirect_template(template: str):
+    try:
+        RedirectTemplate(template)
+    except ValueError as e:
+        raise ValidationError(f"Invalid redirect template: {e}")
+
+
+# Shared by Naan and Shoulder; see ShoulderRegistry.route for which one applies
+REDIRECT_TEMPLATE_HELP = (
+    "URL to redirect ARKs missing from the database to, such as "
+    "https://example.org/items/{blade}. Placeholders: {ark}, {naan}, {shoulder}, "
+    "{blade} and {name}."
+)
 
 
 class Naan(models.Model):
@@ -15,10 +57,27 @@ class Naan(models.Model):
     name = models.CharField(max_length=200)
     description = models.TextField()
     url = models.URLField()
+    redirect_template = models.CharField(
+        max_length=500,
+        blank=True,
+        default="",
+        validators=[validate_redirect_template],
+        help_text=REDIRECT_TEMPLATE_HELP + " Shoulders may override it.",
+    )
 
     def __str__(self):
         return f"{self.name} - {self.naan}"
 
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        # Cached resolutions are dropped by shoulders.invalidate_shoulders
+        get_auth_cache().clear()
+
+    def delete(self, *args, **kwargs):
+        result = super().delete(*args, **kwargs)
+        get_auth_cache().clear()
+        return result
+
 
 class User(AbstractUser):
     naan = models.ForeignKey(Naan, on_delete=models.PROTECT, null=True)
@@ -102,42 +161,255 @@ class Key(models.Model):
         return f"Key-{self.naan.naan}-{self.key.hex[:8]}..."
 
 
+@receiver([post_save, post_delete], sender=Key)
+@receiver([post_save, post_delete], sender=APIKey)
+def invalidate_authorizations(sender, instance, **kwargs):
+    """Drop cached authorizations whenever a key is changed, deactivated or deleted.
+
+    Signals rather than save() overrides, so that bulk deletes in the admin are seen.
+    This process's cache is cleared outright, as legacy Keys may be presented in more
+    than one spelling. Other processes only see the change in a shared cache backend;
+    their local entries expire within ARKLET_AUTH_CACHE_TTL seconds.
+    """
+    if sender is APIKey:
+        hashed_keys = [instance.key]
+    else:
+        hashed_keys = [
+            APIKey.objects.hash_key(str(instance.key)),
+            APIKey.objects.hash_key(instance.key.hex),
+        ]
+    cache = get_auth_cache()
+    cache.clear()
+    cache.delete_many(hashed_keys)
+
+
+def validate_minter_template(template: str):
+    try:
+        NoidTemplate(template)
+    except ValueError as e:
+        raise ValidationError(f"Invalid minter template: {e}")
+
+
 class Shoulder(models.Model):
     shoulder = models.CharField(max_length=50)
     naan = models.ForeignKey(Naan, on_delete=models.DO_NOTHING)
     name = models.CharField(max_length=200)
     description = models.TextField()
+    minter_template = models.CharField(
+        max_length=50,
+        blank=True,
+        default="",
+        validators=[validate_minter_template],
+        help_text=(
+            "Noid template such as .reedeek or .sdddd to mint from a counter. "
+            "Leave blank to mint random 8 character NOIDs."
+        ),
+    )
+    minter_counter = models.PositiveBigIntegerField(default=0, editable=False)
+    redirect_template = models.CharField(
+        max_length=500,
+        blank=True,
+        default="",
+        validators=[validate_redirect_template],
+        help_text=REDIRECT_TEMPLATE_HELP + " Leave blank to use the NAAN's.",
+    )
 
     def __str__(self):
         return f"{self.naan.naan}{self.shoulder}"
 
+    def take_names(self, count: int) -> list[str]:
+        """Advance the minter counter by up to count and return the names it passed.
+
+        The counter row is locked only for its own short transaction. Names taken by a
+        mint that then fails are skipped, never reused. Fewer than count names are
+        returned once the template is exhausted.
+        """
+        template = NoidTemplate(self.minter_template)
+        with transaction.atomic():
+            counter = (
+                Shoulder.objects.select_for_update()
+                .values_list("minter_counter", flat=True)
+                .get(pk=self.pk)
+            )
+            if template.capacity is not None:
+                count = max(0, min(count, template.capacity - counter))
+            Shoulder.objects.filter(pk=self.pk).update(minter_counter=counter + count)
+        ark_prefix = f"{self.naan_id}{self.shoulder}"
+        return [template.name(n, ark_prefix) for n in range(counter, counter + count)]
+
 
 class ArkManager(models.Manager):
+    @staticmethod
+    def _ark_strings(naan, shoulder, noid):
+        """Return the ark and assigned_name strings for a new NOID."""
+        base_ark_string = f"{naan.naan}{shoulder}{noid}"
+        check_digit = noid_check_digit(base_ark_string)
+        return f"{base_ark_string}{check_digit}", f"{noid}{check_digit}"
+
+    @staticmethod
+    def _many_ark_strings(naan, shoulder, noids):
+        """_ark_strings for many NOIDs, with the check digits computed in bulk."""
+        base_ark_strings = [f"{naan.naan}{shoulder}{noid}" for noid in noids]
+        return [
+            (f"{base_ark_string}{check_digit}", f"{noid}{check_digit}")
+            for base_ark_string, noid, check_digit in zip(
+                base_ark_strings, noids, noid_check_digits(base_ark_strings)
+            )
+        ]
+
+    @staticmethod
+    def _templated_shoulder(naan, shoulder):
+        """Return the Shoulder if it mints from a template, else None."""
+        return (
+            Shoulder.objects.filter(naan=naan, shoulder=shoulder)
+            .exclude(minter_template="")
+            .first()
+        )
+
+    def _candidates(self, naan, shoulder, count, templated, reserved):
+        """Return up to count (ark, assigned_name) pairs to try minting.
+
+        Names come from the templated Shoulder's counter if there is one, otherwise
+        from the reserved NOIDs and then random ones.
+        """
+        if templated is not None:
+            return [
+                (f"{naan.naan}{shoulder}{name}", name)
+                for name in templated.take_names(count)
+            ]
+        if count == 1:  # not worth a buffer of random bytes
+            noid = reserved.pop() if reserved else generate_noid(8)
+            return [self._ark_strings(naan, shoulder, noid)]
+        noids = [reserved.pop() for _ in range(min(count, len(reserved)))]
+        noids += generate_noids(count - len(noids), 8)
+        return self._many_ark_strings(naan, shoulder, noids)
+
     def mint(self, naan, shoulder, url, metadata, commitment):
+        """Mint one ARK, trying up to 10 names.
+
+        A shoulder with a minter template mints the next name of its counter, which
+        only collides with ARKs minted on it some other way. Otherwise, with
+        ARKLET_NOID_RESERVOIR on, the first NOID is claimed from the shoulder's
+        reservoir (see ReservedNoid), so the INSERT doesn't collide in practice.
+        """
         ark, collisions = None, 0
+        templated = self._templated_shoulder(naan, shoulder)
+        reserved = [] if templated else claim_reserved_noids(naan, shoulder, 1)
         for _ in range(10):
-            noid = generate_noid(8)
-            base_ark_string = f"{naan.naan}{shoulder}{noid}"
-            check_digit = noid_check_digit(base_ark_string)
-            ark_string = f"{base_ark_string}{check_digit}"
+            candidates = self._candidates(naan, shoulder, 1, templated, reserved)
+            if not candidates:
+                break
+            [(ark_string, assigned_name)] = candidates
             try:
-                ark = self.create(
+                # A savepoint, so a collision doesn't break an enclosing transaction
+                with transaction.atomic():
+                    ark = self.create(
+                        ark=ark_string,
+                        naan=naan,
+                        shoulder=shoulder,
+                        assigned_name=assigned_name,
+                        url=url,
+                        metadata=metadata,
+                        commitment=commitment,
+                    )
+                break
+            except IntegrityError:
+                collisions += 1
+                continue
+        return ark, collisions
+
+    def mint_many(self, naan, shoulder, bindings, batch_size=1000):
+        """Mint one ARK per binding, a dict with url, metadata and commitment keys.
+
+        Each round generates NOIDs for every binding still pending, looks up which of
+        them are already taken with one query and inserts the rest with one multi-row
+        INSERT per batch_size rows. Only the bindings whose NOIDs collided get new NOIDs
+        in the next round. A concurrent mint can still win a race for a NOID between the
+        lookup and the INSERT; the INSERT is then rolled back and the round retried.
+
+        Returns (arks, collisions) where arks[i] is the ARK minted for bindings[i], or
+        None if we gave up after 10 rounds. Names come from the shoulder's minter
+        template, if it has one, as in mint. Otherwise, with ARKLET_NOID_RESERVOIR on,
+        the first round uses NOIDs claimed from the shoulder's reservoir.
+        """
+        arks = [None] * len(bindings)
+        pending = list(range(len(bindings)))
+        collisions = 0
+        templated = self._templated_shoulder(naan, shoulder)
+        reserved = (
+            [] if templated else claim_reserved_noids(naan, shoulder, len(bindings))
+        )
+        for _ in range(10):
+            if not pending:
+                break
+            candidates = {}
+            names = self._candidates(naan, shoulder, len(pending), templated, reserved)
+            if not names:
+                break
+            for i, (ark_string, assigned_name) in zip(pending, names):
+                if ark_string in candidates:
+                    collisions += 1
+                    continue
+                candidates[ark_string] = (i, assigned_name)
+
+            taken = self.in_bulk(list(candidates))
+            collisions += len(taken)
+            new_arks = {
+                i: self.model(
                     ark=ark_string,
                     naan=naan,
                     shoulder=shoulder,
-                    assigned_name=f"{noid}{check_digit}",
-                    url=url,
-                    metadata=metadata,
-                    commitment=commitment,
+                    assigned_name=assigned_name,
+                    url=bindings[i].get("url", ""),
+                    metadata=bindings[i].get("metadata", ""),
+                    commitment=bindings[i].get("commitment", ""),
                 )
-                break
+                for ark_string, (i, assigned_name) in candidates.items()
+                if ark_string not in taken
+            }
+            try:
+                with transaction.atomic():
+                    self.bulk_create(new_arks.values(), batch_size=batch_size)
             except IntegrityError:
                 collisions += 1
                 continue
-        return ark, collisions
+            for i, ark in new_arks.items():
+                arks[i] = ark
+            pending = [i for i in pending if arks[i] is None]
+
+        invalidate_resolutions(*(ark.ark for ark in arks if ark))
+        return arks, collisions
+
+    def bind_many(self, bindings, batch_size=1000):
+        """Update many existing ARKs in one transaction.
+
+        bindings maps ark strings, as stored in Ark.ark, to a dict with url, metadata
+        and commitment keys. The rows are locked and fetched with one IN query and
+        written back with bulk_update, batch_size rows per UPDATE statement.
+
+        Returns the set of ark strings that were found and updated.
+        """
+        bound_fields = ["url", "metadata", "commitment"]
+        with transaction.atomic():
+            arks = self.select_for_update().in_bulk(list(bindings))
+            # bulk_update() skips save(), so auto_now must be applied by hand
+            now = timezone.now()
+            for ark_string, ark in arks.items():
+                for field in bound_fields:
+                    setattr(ark, field, bindings[ark_string].get(field, ""))
+                ark.updated_at = now
+            self.bulk_update(
+                arks.values(), [*bound_fields, "updated_at"], batch_size=batch_size
+            )
+        invalidate_resolutions(*arks)
+        return set(arks)
 
 
 class Ark(models.Model):
+    # The full ARK stays the primary key. Keying the table on (naan, shoulder,
+    # blade) needs a composite primary key, which Django 4.2 lacks and the admin
+    # can't use, and imported names such as C0X-SPWFRSGR-N have no compact
+    # encoding. A varchar key only stores the ARK's actual length anyway.
     ark = models.CharField(primary_key=True, max_length=200, editable=False)
     naan = models.ForeignKey(Naan, on_delete=models.DO_NOTHING, editable=False)
     shoulder = models.CharField(max_length=50, editable=False)
@@ -154,8 +426,33 @@ class Ark(models.Model):
         indexes = [
             models.Index(fields=["created_at"]),
             models.Index(fields=["updated_at"]),
+            # Per NAAN and per shoulder scans in ark order: exports and admin filters
+            models.Index(fields=["naan", "ark"], name="ark_naan_ark_idx"),
+            models.Index(
+                fields=["naan", "shoulder", "ark"], name="ark_naan_shoulder_ark_idx"
+            ),
+            # The change feed of a NAAN, in (updated_at, ark) order
+            models.Index(
+                fields=["naan", "updated_at", "ark"], name="ark_naan_updated_at_ark_idx"
+            ),
+            # Outside the C locale, PostgreSQL can't use the primary key index for
+            # LIKE 'prefix%', which admin searches on ark compile to. This one can.
+            models.Index(
+                fields=["ark"],
+                name="ark_ark_prefix_idx",
+                opclasses=["varchar_pattern_ops"],
+            ),
         ]
 
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        invalidate_resolutions(self.ark)
+
+    def delete(self, *args, **kwargs):
+        result = super().delete(*args, **kwargs)
+        invalidate_resolutions(self.ark)
+        return result
+
     def clean(self):
         if not self.ark:
             # New instance — ark string hasn't been generated yet; nothing to check.
@@ -166,3 +463,93 @@ class Ark(models.Model):
 
     def __str__(self):
         return f"ark:/{self.ark}"
+
+
+def claim_reserved_noids(naan, shoulder: str, count: int) -> list[str]:
+    """Claim up to count reserved NOIDs for minting, if ARKLET_NOID_RESERVOIR is on."""
+    if not getattr(settings, "ARKLET_NOID_RESERVOIR", False):
+        return []
+    return ReservedNoid.objects.claim(naan, shoulder, count)
+
+
+class ReservedNoidManager(models.Manager):
+    def claim(self, naan, shoulder: str, count: int = 1) -> list[str]:
+        """Remove and return up to count NOIDs from the reservoir of naan and shoulder.
+
+        Rows locked by concurrent claims are skipped rather than waited for, so
+        concurrent mints never contend for the same NOID. The claim commits at once: a
+        claimed NOID that ends up unused is simply never minted.
+        """
+        with transaction.atomic():
+            claimed = list(
+                self.select_for_update(skip_locked=True)
+                .filter(naan=naan, shoulder=shoulder)
+                .values_list("id", "noid")[:count]
+            )
+            self.filter(id__in=[id for id, _ in claimed]).delete()
+        return [noid for _, noid in claimed]
+
+    def fill(self, naan, shoulder: str, depth: int, batch_size: int = 1000) -> int:
+        """Top up the reservoir of naan and shoulder to depth unused NOIDs.
+
+        Candidates already minted as ARKs are dropped, as are duplicates of NOIDs
+        already in the reservoir. Returns the number of NOIDs added.
+        """
+        added = 0
+        reservoir = self.filter(naan=naan, shoulder=shoulder)
+        missing = depth - reservoir.count()
+        while missing > 0:
+            noids = generate_noids(min(missing, batch_size), 8)
+            candidates = {
+                ark_string: noid
+                for noid, (ark_string, _) in zip(
+                    noids, Ark.objects._many_ark_strings(naan, shoulder, noids)
+                )
+            }
+            minted = Ark.objects.in_bulk(list(candidates))
+            self.bulk_create(
+                (
+                    self.model(naan=naan, shoulder=shoulder, noid=noid)
+                    for ark_string, noid in candidates.items()
+                    if ark_string not in minted
+                ),
+                ignore_conflicts=True,
+            )
+            # ignore_conflicts hides which rows were skipped, so count again
+            previously_missing, missing = missing, depth - reservoir.count()
+            if missing >= previously_missing:
+                # Every candidate was taken: the shoulder's NOID space is exhausted
+                break
+            added += previously_missing - missing
+        return added
+
+    def depths(self) -> dict[tuple[int, str], int]:
+        """The number of unused NOIDs per (naan, shoulder) reservoir."""
+        return {
+            (row["naan"], row["shoulder"]): row["depth"]
+            for row in self.values("naan", "shoulder").annotate(depth=Count("id"))
+        }
+
+
+class ReservedNoid(models.Model):
+    """A pre-generated NOID, verified unused when reserved, waiting to be minted.
+
+    Filled in bulk by the fillreservoir command and claimed by ArkManager.mint and
+    mint_many when ARKLET_NOID_RESERVOIR is on.
+    """
+
+    naan = models.ForeignKey(Naan, on_delete=models.CASCADE)
+    shoulder = models.CharField(max_length=50)
+    noid = models.CharField(max_length=100)
+
+    objects = ReservedNoidManager()
+
+    class Meta:
+        constraints = [
+            UniqueConstraint(
+                fields=["naan", "shoulder", "noid"], name="unique_reserved_noid"
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.naan_id}{self.shoulder}{self.noid}"
@@ -0,0 +1,333 @@
+"""How resolve_ark answers: the redirect for an ARK and its HTTP caching headers.
+
+A Resolution is what the resolver needs to redirect an ARK. It is cached by the
+resolver cache, stored in redirect snapshots and otherwise found in the database.
+
+An ARK with qualifiers, such as ark:/13960/t5n960f7n/page/3 or .../t5n960f7n.pdf, that
+isn't itself in the database resolves through its nearest bound ancestor, with the
+rest of the ARK appended to the ancestor's URL. Hyphens are insignificant in ARKs,
+so ark:/13960/t5-n960f7n resolves like ark:/13960/t5n960f7n. Inflections, ?info and
+??, ask about an ARK rather than for it and are answered with its record.
+"""
+
+import hashlib
+from collections.abc import Callable
+from datetime import datetime
+from typing import NamedTuple, Optional
+from urllib.parse import quote, urlsplit, urlunsplit
+
+from django.conf import settings
+from django.http import (
+    Http404,
+    HttpResponse,
+    HttpResponseNotModified,
+    HttpResponsePermanentRedirect,
+    HttpResponseRedirect,
+    JsonResponse,
+)
+from django.utils.cache import patch_cache_control
+from django.utils.http import http_date, parse_etags, parse_http_date_safe
+
+from arklet.ark.export import EXPORT_FIELDS, as_dict
+from arklet.ark.models import Ark
+from arklet.ark.shoulders import (
+    ShoulderRegistry,
+    aget_shoulder_registry,
+    get_shoulder_registry,
+)
+from arklet.ark.utils import normalize_ark
+
+
+class Resolution(NamedTuple):
+    """Where an ARK redirects to, as cached by the resolver.
+
+    target is "" for an ARK that exists but has no URL bound to it yet. ARKs missing
+    from the database fall back to another resolver and have no updated_at.
+    templated is true for fallbacks to a redirect template.
+    """
+
+    target: str
+    updated_at: Optional[datetime] = None
+    shoulder: str = ""
+    permanent: bool = False
+    templated: bool = False
+
+
+def bound_resolution(url, updated_at, shoulder, commitment) -> Resolution:
+    permanent_commitment = getattr(settings, "ARKLET_PERMANENT_COMMITMENT", "")
+    return Resolution(
+        url,
+        updated_at,
+        shoulder,
+        bool(permanent_commitment)
+        and commitment.strip().lower() == permanent_commitment.lower(),
+    )
+
+
+_RESOLUTION_FIELDS = ["url", "updated_at", "shoulder", "commitment"]
+
+
+# Ancestors of a qualified ARK looked up for suffix passthrough, at most
+MAX_ANCESTORS = 10
+
+
+def ark_candidates(naan: int, name: str) -> list[tuple[str, str]]:
+    """naan/name and then its ancestors, nearest first, as stored in Ark.ark.
+
+    Each candidate comes with the rest of the name, "" for the ARK itself.
+    Ancestors end before a hierarchy ("/") or variant (".") qualifier: those of
+    13960/x.v2/page are 13960/x.v2 and 13960/x. Hyphens are insignificant, so where
+    the name has some, each candidate is followed by its form without them.
+    ARKs imported with hyphens are still found as written.
+    """
+    if "/" not in name and "." not in name and "-" not in name:
+        return [(f"{naan}/{name}", "")]
+    cuts = [i for i in range(len(name) - 1, 0, -1) if name[i] in "/."]
+    candidates = []
+    for i in [len(name), *cuts[:MAX_ANCESTORS]]:
+        ark = f"{naan}/{name[:i]}"
+        candidates.append((ark, name[i:]))
+        if "-" in ark:
+            candidates.append((normalize_ark(ark), name[i:]))
+    return candidates
+
+
+def append_suffix(target: str, suffix: str) -> str:
+    """Append the qualifiers of an ARK to the path of its ancestor's URL.
+
+    Appended as plain text, a variant qualifier would extend the host of a URL
+    without a path: https://example.org and ".evil.com/x" would make
+    https://example.org.evil.com/x. The suffix is quoted, so it can't start a query
+    or fragment of its own either.
+    """
+    parts = urlsplit(target)
+    path = parts.path if parts.path.startswith("/") else f"/{parts.path}"
+    return urlunsplit(parts._replace(path=path + quote(suffix, safe="/%:@!$&'()*+,;=")))
+
+
+def passthrough_resolution(
+    candidates: list[tuple[str, str]],
+    lookup: Callable[[str], Optional[Resolution]],
+) -> Optional[Resolution]:
+    """The Resolution of the ARK itself, else suffix passthrough from an ancestor.
+
+    candidates are from ark_candidates. The ARK itself wins even if it is unbound.
+    Otherwise the nearest ancestor bound to a URL wins, and the rest of the ARK is
+    appended to the path of that URL, see append_suffix. lookup returns the
+    Resolution of an ARK, or None if it is missing.
+    """
+    for ark, suffix in candidates:
+        resolution = lookup(ark)
+        if resolution is None:
+            continue
+        if not suffix:
+            return resolution
+        if resolution.target:
+            target = append_suffix(resolution.target, suffix)
+            return resolution._replace(target=target)
+    return None
+
+
+def resolution_query(candidates: list[tuple[str, str]]):
+    """The query for the rows resolution_from_rows needs, from ark_candidates.
+
+    Only the needed columns are fetched, without building Ark or Naan instances. An
+    ARK with qualifiers or hyphens is looked up together with its other candidates
+    in one query. Any other ARK is sliced rather than first(), which keeps the query
+    free of an ORDER BY and a queryset clone.
+    """
+    if len(candidates) == 1:
+        arks = Ark.objects.filter(ark=candidates[0][0])
+        return arks.values_list(*_RESOLUTION_FIELDS)[:1]
+    arks = Ark.objects.filter(ark__in=[ark for ark, _ in candidates])
+    return arks.values_list("ark", *_RESOLUTION_FIELDS)
+
+
+def resolution_from_rows(
+    candidates: list[tuple[str, str]], rows
+) -> Optional[Resolution]:
+    """The Resolution of the rows of resolution_query, or None if none applies."""
+    if len(candidates) == 1:
+        # The ark column isn't selected for a single candidate, see resolution_query
+        rows = [(candidates[0][0], *row) for row in rows]
+    found = {ark: bound_resolution(*row) for ark, *row in rows}
+    return passthrough_resolution(candidates, found.get)
+
+
+def find_resolution(naan: int, assigned_name: str) -> Resolution:
+    """Find where an ARK should redirect to, with one query.
+
+    ARKs missing from the database cost no further query, see fallback_resolution.
+    """
+    candidates = ark_candidates(naan, assigned_name)
+    resolution = resolution_from_rows(candidates, resolution_query(candidates))
+    if resolution is None:
+        resolution = fallback_resolution(naan, assigned_name, get_shoulder_registry())
+    return resolution
+
+
+async def afind_resolution(naan: int, assigned_name: str) -> Resolution:
+    """The async ORM counterpart of find_resolution."""
+    candidates = ark_candidates(naan, assigned_name)
+    rows = [row async for row in resolution_query(candidates)]
+    resolution = resolution_from_rows(candidates, rows)
+    if resolution is None:
+        registry = await aget_shoulder_registry()
+        resolution = fallback_resolution(naan, assigned_name, registry)
+    return resolution
+
+
+def fallback_resolution(
+    naan: int, assigned_name: str, registry: ShoulderRegistry
+) -> Resolution:
+    """Redirect an ARK missing from the database without another query.
+
+    The redirect template of the shoulder that owns the ARK, or else of its NAAN, is
+    filled in. Without one, the ARK is sent to its NAAN's resolver.
+    """
+    shoulder, template = registry.route(naan, f"/{assigned_name}")
+    if template is not None:
+        target = template.expand(naan, shoulder, assigned_name)
+        return Resolution(target, shoulder=shoulder, templated=True)
+    naan_url = registry.naan_url(naan)
+    if naan_url is not None:
+        return Resolution(f"{naan_url}/ark:/{naan}/{assigned_name}", shoulder=shoulder)
+    resolver = "https://n2t.net"
+    # TODO: more robust resolver URL creation
+    return Resolution(f"{resolver}/ark:/{naan}/{assigned_name}", shoulder=shoulder)
+
+
+# Query strings of ?info and ??, which ask about an ARK rather than for it
+INFLECTIONS = frozenset(["info", "?"])
+
+
+def is_inflection(request) -> bool:
+    """Whether the request is for an ARK's record rather than a redirect.
+
+    A bare "?" leaves no query string behind, but servers such as gunicorn keep the
+    raw request URI.
+    """
+    query = request.META.get("QUERY_STRING", "")
+    if query:
+        return query in INFLECTIONS
+    return request.META.get("RAW_URI", "").endswith("?")
+
+
+def record_query(candidates: list[tuple[str, str]]):
+    """The query for the rows record_from_rows needs, from ark_candidates."""
+    arks = Ark.objects.filter(ark__in=[ark for ark, _ in candidates])
+    return arks.values_list(*EXPORT_FIELDS)
+
+
+def record_from_rows(candidates: list[tuple[str, str]], rows) -> Optional[dict]:
+    """The record of the ARK, or of its nearest ancestor, as export_arks has it."""
+    found = {row[0]: row for row in rows}
+    return next((as_dict(found[ark]) for ark, _ in candidates if ark in found), None)
+
+
+def find_inflection(naan: int, assigned_name: str) -> tuple[Optional[dict], Resolution]:
+    """The record and fallback inflection_response answers an inflection with."""
+    candidates = ark_candidates(naan, assigned_name)
+    record = record_from_rows(candidates, record_query(candidates))
+    return record, fallback_resolution(naan, assigned_name, get_shoulder_registry())
+
+
+async def afind_inflection(
+    naan: int, assigned_name: str
+) -> tuple[Optional[dict], Resolution]:
+    """The async ORM counterpart of find_inflection."""
+    candidates = ark_candidates(naan, assigned_name)
+    record = record_from_rows(
+        candidates, [row async for row in record_query(candidates)]
+    )
+    registry = await aget_shoulder_registry()
+    return record, fallback_resolution(naan, assigned_name, registry)
+
+
+def inflection_response(
+    request, record: Optional[dict], fallback: Resolution
+) -> HttpResponse:
+    """Answer an inflection with the ARK's record, as JSON.
+
+    Inflections of ARKs missing from the database are passed on to the fallback, as
+    the resolver that knows the ARK can answer them. Neither answer is cached.
+    """
+    if record is not None:
+        response = JsonResponse(record)
+    else:
+        query = request.META.get("QUERY_STRING", "")
+        response = HttpResponseRedirect(f"{fallback.target}?{query}")
+    patch_cache_control(response, no_cache=True)
+    return response
+
+
+def resolver_max_age(naan: int, shoulder: str) -> int:
+    """Seconds shared caches may serve a redirect for an ARK of naan and shoulder.
+
+    ARKLET_RESOLVER_MAX_AGES overrides ARKLET_RESOLVER_MAX_AGE per shoulder, e.g. for
+    "13960/t", or per NAAN, e.g. for "13960". The shoulder wins.
+    """
+    max_ages = getattr(settings, "ARKLET_RESOLVER_MAX_AGES", {})
+    for key in (f"{naan}{shoulder}", str(naan)):
+        if key in max_ages:
+            return max_ages[key]
+    return getattr(settings, "ARKLET_RESOLVER_MAX_AGE", 0)
+
+
+def _not_modified(request, etag: str, last_modified: int) -> bool:
+    """Whether the request's validators match, as in RFC 9110 section 13.2.2.
+
+    Django's get_conditional_response only applies to 2xx responses, so the resolver
+    checks If-None-Match and If-Modified-Since itself.
+    """
+    if request.method not in ("GET", "HEAD"):
+        return False
+    if_none_match = request.headers.get("If-None-Match")
+    if if_none_match:
+        etags = [tag.removeprefix("W/") for tag in parse_etags(if_none_match)]
+        return "*" in etags or etag in etags
+    if_modified_since = parse_http_date_safe(
+        request.headers.get("If-Modified-Since", "")
+    )
+    return if_modified_since is not None and last_modified <= if_modified_since
+
+
+def resolution_response(request, naan: int, resolution: Resolution) -> HttpResponse:
+    """Redirect to the resolution's target, with caching headers.
+
+    Bound ARKs get an ETag and Last-Modified from their updated_at, and may be cached
+    for resolver_max_age seconds; a conditional GET that matches gets a 304. ARKs
+    whose commitment is ARKLET_PERMANENT_COMMITMENT get a 301. Redirect templates are
+    the rule for their shoulder, so their redirects may be cached as long as its bound
+    ARKs. Other fallback redirects must be revalidated, as the ARK may be minted here
+    at any moment.
+    """
+    if not resolution.target:
+        # TODO: return a template page for an ARK in progress
+        raise Http404
+    if resolution.permanent:
+        response = HttpResponsePermanentRedirect(resolution.target)
+    else:
+        response = HttpResponseRedirect(resolution.target)
+    if resolution.templated:
+        max_age = resolver_max_age(naan, resolution.shoulder)
+        patch_cache_control(response, public=True, max_age=max_age)
+        return response
+    if resolution.updated_at is None:
+        patch_cache_control(response, no_cache=True)
+        return response
+
+    last_modified = int(resolution.updated_at.timestamp())
+    digest = hashlib.sha256(f"{response.status_code} {resolution.target}".encode())
+    etag = f'"{digest.hexdigest()[:32]}"'
+    patch_cache_control(
+        response, public=True, max_age=resolver_max_age(naan, resolution.shoulder)
+    )
+    response.headers["ETag"] = etag
+    response.headers["Last-Modified"] = http_date(last_modified)
+    if _not_modified(request, etag, last_modified):
+        not_modified = HttpResponseNotModified()
+        for header in ("Cache-Control", "ETag", "Last-Modified"):
+            not_modified.headers[header] = response.headers[header]
+        return not_modified
+    return response
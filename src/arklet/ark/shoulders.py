@@ -0,0 +1,180 @@
+"""An in-memory registry of the NAANs and shoulders in the database.
+
+The registry is a trie per NAAN over shoulder strings, so the shoulder that owns an
+ARK, the longest registered shoulder its name starts with, is found in one walk over
+the name without a query. It validates mint requests, and sends ARKs missing from the
+database to the redirect template of their shoulder or NAAN, or to their NAAN's URL.
+
+Each process loads the registry once and reloads it when a Naan or Shoulder is saved
+or deleted in that process. Other processes see the change within
+ARKLET_SHOULDER_REGISTRY_TTL seconds.
+"""
+
+import logging
+import threading
+import time
+from collections.abc import Iterable
+from typing import Optional
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from arklet.ark.cache import get_resolver_cache
+from arklet.ark.models import Naan, Shoulder
+from arklet.ark.utils import RedirectTemplate
+
+logger = logging.getLogger(__name__)
+
+# Marks the trie node at the end of a shoulder; shoulder characters are never None
+_END = None
+
+
+class ShoulderRegistry:
+    """The URL and redirect template of every NAAN, and its shoulders as a trie.
+
+    The trie is nested dicts keyed by shoulder characters. The node at the end of a
+    shoulder maps _END to the shoulder and its RedirectTemplate, or None.
+    """
+
+    def __init__(
+        self,
+        shoulders: Iterable[tuple] = (),
+        naans: Iterable[tuple[int, str, str]] = (),
+    ):
+        self._tries: dict[int, dict] = {}
+        self._naans: dict[int, tuple[str, Optional[RedirectTemplate]]] = {}
+        self.size = 0
+        for shoulder in shoulders:
+            self.add(*shoulder)
+        for naan in naans:
+            self.add_naan(*naan)
+
+    @classmethod
+    def load(cls) -> "ShoulderRegistry":
+        """Build a registry from the Naan and Shoulder tables."""
+        return cls(
+            Shoulder.objects.values_list(
+                "naan_id", "shoulder", "redirect_template"
+            ).iterator(),
+            Naan.objects.values_list("naan", "url", "redirect_template").iterator(),
+        )
+
+    def add(self, naan: int, shoulder: str, redirect_template: str = "") -> None:
+        node = self._tries.setdefault(naan, {})
+        for char in shoulder:
+            node = node.setdefault(char, {})
+        if _END not in node:
+            self.size += 1
+        node[_END] = (shoulder, _template(redirect_template))
+
+    def add_naan(self, naan: int, url: str, redirect_template: str = "") -> None:
+        self._naans[naan] = (url, _template(redirect_template))
+
+    def _owner(self, naan: int, path: str) -> Optional[tuple]:
+        node = self._tries.get(naan)
+        if node is None:
+            return None
+        owner = node.get(_END)
+        for char in path:
+            node = node.get(char)
+            if node is None:
+                break
+            owner = node.get(_END, owner)
+        return owner
+
+    def route(self, naan: int, path: str) -> tuple[str, Optional[RedirectTemplate]]:
+        """The shoulder owning path, or "", and the redirect template that applies.
+
+        path is an ARK string without its NAAN, e.g. "/t5n960f7n" for 13960/t5n960f7n.
+        Its owner is the longest shoulder of naan that it starts with. The template of
+        the owning shoulder wins over the NAAN's. Shorter shoulders don't lend theirs.
+        """
+        shoulder, template = self._owner(naan, path) or ("", None)
+        if template is None:
+            template = self._naans.get(naan, ("", None))[1]
+        return shoulder, template
+
+    def naan_url(self, naan: int) -> Optional[str]:
+        """The URL of naan, or None if it isn't registered."""
+        return self._naans[naan][0] if naan in self._naans else None
+
+    def __contains__(self, naan_shoulder: tuple[int, str]) -> bool:
+        naan, shoulder = naan_shoulder
+        node = self._tries.get(naan)
+        for char in shoulder:
+            if node is None:
+                return False
+            node = node.get(char)
+        return node is not None and _END in node
+
+    def __len__(self) -> int:
+        return self.size
+
+
+def _template(redirect_template: str) -> Optional[RedirectTemplate]:
+    if not redirect_template:
+        return None
+    try:
+        return RedirectTemplate(redirect_template)
+    except ValueError as e:
+        # Saved without validation, e.g. by update(): ignore it rather than fail
+        logger.error("Ignoring redirect template %r: %s", redirect_template, e)
+        return None
+
+
+_shoulder_registry = None
+_shoulder_registry_loaded_at = 0.0
+_shoulder_registry_lock = threading.Lock()
+
+
+def get_shoulder_registry() -> ShoulderRegistry:
+    """Return this process's registry, reloading it once it is older than the TTL."""
+    global _shoulder_registry, _shoulder_registry_loaded_at
+    ttl = getattr(settings, "ARKLET_SHOULDER_REGISTRY_TTL", 60)
+    registry = _shoulder_registry
+    if registry is not None and time.monotonic() - _shoulder_registry_loaded_at < ttl:
+        return registry
+    with _shoulder_registry_lock:
+        # Another thread may have reloaded it while this one waited for the lock
+        if _shoulder_registry is not registry and _shoulder_registry is not None:
+            return _shoulder_registry
+        _shoulder_registry = ShoulderRegistry.load()
+        _shoulder_registry_loaded_at = time.monotonic()
+        return _shoulder_registry
+
+
+async def aget_shoulder_registry() -> ShoulderRegistry:
+    """Like get_shoulder_registry, only leaving the event loop to reload it."""
+    registry = _shoulder_registry
+    ttl = getattr(settings, "ARKLET_SHOULDER_REGISTRY_TTL", 60)
+    if registry is not None and time.monotonic() - _shoulder_registry_loaded_at < ttl:
+        return registry
+    return await sync_to_async(get_shoulder_registry)()
+
+
+def reset_shoulder_registry() -> None:
+    """Drop this process's registry, so the next lookup reloads it."""
+    global _shoulder_registry
+    _shoulder_registry = None
+
+
+@receiver([post_save, post_delete], sender=Naan)
+@receiver([post_save, post_delete], sender=Shoulder)
+def invalidate_shoulders(sender, instance, **kwargs):
+    """Reload the registry after a NAAN or shoulder changes, and drop resolutions.
+
+    Unbound ARKs fall back to the URL or redirect template of their NAAN or shoulder,
+    so any cached fallback may be stale. Saves that only advance a minter counter
+    (see Shoulder.take_names) use update() and don't get here.
+    """
+    reset_shoulder_registry()
+    get_resolver_cache().clear()
+
+
+@receiver(setting_changed)
+def reset_on_setting_changed(*, setting, **kwargs):
+    if setting.startswith("ARKLET_SHOULDER_REGISTRY_"):
+        reset_shoulder_registry()
@@ -0,0 +1,466 @@
+"""Sorted, memory-mapped snapshots of ARK redirects.
+
+A snapshot maps ARKs to their Resolution, so resolve_ark can answer without asking the
+database. The compileredirects command builds one, from scratch or by merging in the
+ARKs updated since the previous build. Snapshots are written to a temporary file and
+renamed into place, so readers never see half a file.
+
+A snapshot file is a fixed header, a JSON metadata block, the data lines and an index:
+
+    header    magic, line count, data offset, data end and index offset (5 x 8 bytes)
+    metadata  JSON: when the snapshot was built, the NAAN it is limited to, if any, the
+              URL and redirect template of every NAAN and its shoulders
+    data      one line per ARK, sorted by ARK bytes, tab separated:
+              ark, url, shoulder, updated_at in epoch microseconds, "1" if permanent
+    index     the offset of every data line, as 8 byte integers
+
+Lookups are a binary search of the index, reading the mmap directly. Pages of the file
+are shared through the OS page cache by every process that maps it, so gunicorn workers
+on one host hold a single copy. Workers notice a rebuilt file and swap it in, which lets
+read-only replicas resolve from a snapshot shipped to them, without a database.
+"""
+
+import heapq
+import json
+import logging
+import mmap
+import os
+import struct
+import sys
+import tempfile
+import threading
+import time
+from array import array
+from bisect import bisect_left
+from collections.abc import Iterable, Iterator
+from contextlib import ExitStack
+from datetime import datetime, timedelta, timezone
+from itertools import islice
+from pathlib import Path
+from typing import Optional
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.utils import timezone as django_timezone
+
+from arklet.ark.models import Ark, Naan, Shoulder
+from arklet.ark.resolution import (
+    Resolution,
+    ark_candidates,
+    bound_resolution,
+    fallback_resolution,
+    passthrough_resolution,
+)
+from arklet.ark.shoulders import ShoulderRegistry
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"ARKSNAP1"
+_HEADER = struct.Struct("<8sQQQQ")
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+# Lines sorted in memory at once while compiling; larger runs are merged from disk
+RUN_SIZE = 500000
+
+_RESOLUTION_FIELDS = ["ark", "url", "updated_at", "shoulder", "commitment"]
+
+
+def snapshot_line(ark: str, resolution: Resolution) -> Optional[bytes]:
+    """Encode one data line, or None if a field would break the line format."""
+    updated_at = resolution.updated_at
+    fields = [
+        ark,
+        resolution.target,
+        resolution.shoulder,
+        str((updated_at - _EPOCH) // timedelta(microseconds=1)) if updated_at else "",
+        "1" if resolution.permanent else "",
+    ]
+    if any("\t" in field or "\n" in field for field in fields):
+        return None
+    return "\t".join(fields).encode() + b"\n"
+
+
+def parse_line(line: bytes) -> tuple[str, Resolution]:
+    """Decode a data line into the ARK and its Resolution."""
+    ark, url, shoulder, updated_at, permanent = line.decode().rstrip("\n").split("\t")
+    return ark, Resolution(
+        url,
+        _EPOCH + timedelta(microseconds=int(updated_at)) if updated_at else None,
+        shoulder,
+        permanent == "1",
+    )
+
+
+def _line_key(line: bytes) -> bytes:
+    return line[: line.index(b"\t")]
+
+
+def resolution_lines(
+    naan: Optional[int] = None,
+    since: Optional[datetime] = None,
+    batch_size: int = 5000,
+    on_skip=None,
+) -> Iterator[bytes]:
+    """Yield a data line for every ARK, in database order.
+
+    Optionally only ARKs of naan, or updated at or after since. ARKs whose fields
+    can't be encoded are passed to on_skip instead; they are resolved from the
+    database.
+    """
+    arks = Ark.objects.all()
+    if naan is not None:
+        arks = arks.filter(naan=naan)
+    if since is not None:
+        arks = arks.filter(updated_at__gte=since)
+    arks = arks.order_by("ark").values_list(*_RESOLUTION_FIELDS)
+
+    last_ark = None
+    while True:
+        batch = arks if last_ark is None else arks.filter(ark__gt=last_ark)
+        rows = list(batch[:batch_size])
+        for ark, *fields in rows:
+            line = snapshot_line(ark, bound_resolution(*fields))
+            if line is not None:
+                yield line
+            elif on_skip is not None:
+                on_skip(ark)
+        if len(rows) < batch_size:
+            return
+        last_ark = rows[-1][0]
+
+
+def sorted_lines(lines: Iterable[bytes], run_size: int = RUN_SIZE) -> Iterator[bytes]:
+    """Sort lines by bytes, spilling sorted runs to temporary files as needed.
+
+    The database sorts ARKs by its collation, which needn't be byte order. A tab sorts
+    before every character of an ARK, so sorting whole lines sorts them by ARK.
+    """
+    iterator = iter(lines)
+    runs = []
+    with ExitStack() as stack:
+        while run := list(islice(iterator, run_size)):
+            run.sort()
+            if not runs and len(run) < run_size:
+                yield from run
+                return
+            f = stack.enter_context(tempfile.TemporaryFile())
+            f.writelines(run)
+            f.seek(0)
+            runs.append(f)
+        yield from heapq.merge(*runs)
+
+
+def merge_lines(old: Iterable[bytes], new: Iterable[bytes]) -> Iterator[bytes]:
+    """Merge two sorted streams of lines, keeping the new line for a repeated ARK."""
+    pending = None
+    # heapq.merge is stable, so an old line comes before a new line for the same ARK
+    for line in heapq.merge(old, new, key=_line_key):
+        if pending is not None and _line_key(pending) != _line_key(line):
+            yield pending
+        pending = line
+    if pending is not None:
+        yield pending
+
+
+def write_snapshot(path: Path, lines: Iterable[bytes], meta: dict) -> int:
+    """Write sorted lines to a snapshot at path, atomically. Returns the line count."""
+    meta = {**meta, "byteorder": sys.byteorder}
+    meta_bytes = json.dumps(meta).encode()
+    offsets = array("Q")
+    tmp_path = path.with_name(f".{path.name}.tmp")
+    with tmp_path.open("wb") as f:
+        f.write(_HEADER.pack(MAGIC, 0, 0, 0, 0))
+        f.write(meta_bytes)
+        data_offset = position = f.tell()
+        for line in lines:
+            offsets.append(position)
+            f.write(line)
+            position += len(line)
+        # Align the index, so it can be cast to 8 byte integers in place
+        padding = -position % 8
+        f.write(b"\0" * padding)
+        offsets.tofile(f)
+        f.seek(0)
+        f.write(
+            _HEADER.pack(MAGIC, len(offsets), data_offset, position, position + padding)
+        )
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    return len(offsets)
+
+
+class _Keys:
+    """The ARKs of a snapshot, as a sequence of bytes for bisect."""
+
+    def __init__(self, data: mmap.mmap, offsets: memoryview):
+        self.data = data
+        self.offsets = offsets
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def __getitem__(self, i: int) -> bytes:
+        start = self.offsets[i]
+        return self.data[start : self.data.find(b"\t", start)]
+
+
+class RedirectSnapshot:
+    """A read-only, memory-mapped snapshot file.
+
+    The mapping stays valid after the file is replaced or deleted; file_id tells
+    whether the path still names the file that was opened.
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        with self.path.open("rb") as f:
+            self.file_id = _file_id(os.fstat(f.fileno()))
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, count, data_offset, data_end, index_offset = _HEADER.unpack_from(
+            self._mmap
+        )
+        if magic != MAGIC:
+            self._mmap.close()
+            raise ValueError(f"{path} is not an ARK redirect snapshot")
+        self.meta = json.loads(self._mmap[_HEADER.size : data_offset])
+        if self.meta["byteorder"] != sys.byteorder:
+            self._mmap.close()
+            raise ValueError(f"{path} was written on a {self.meta['byteorder']} host")
+        self._data_end = data_end
+        self._offsets = memoryview(self._mmap)[
+            index_offset : index_offset + 8 * count
+        ].cast("Q")
+        self._keys = _Keys(self._mmap, self._offsets)
+        templates = self.meta.get("naan_templates", {})
+        self.registry = ShoulderRegistry(
+            self.meta.get("shoulders", []),
+            (
+                (int(naan), url, templates.get(naan, ""))
+                for naan, url in self.meta.get("naans", {}).items()
+            ),
+        )
+
+    @property
+    def built_at(self) -> datetime:
+        return datetime.fromisoformat(self.meta["built_at"])
+
+    def __len__(self):
+        return len(self._offsets)
+
+    def _line(self, i: int) -> bytes:
+        end = self._offsets[i + 1] if i + 1 < len(self) else self._data_end
+        return self._mmap[self._offsets[i] : end]
+
+    def get(self, ark: str) -> Optional[Resolution]:
+        """The Resolution of ark, as stored in Ark.ark, or None if it isn't here."""
+        key = ark.encode()
+        i = bisect_left(self._keys, key)
+        if i == len(self) or self._keys[i] != key:
+            return None
+        return parse_line(self._line(i))[1]
+
+    def lines(self) -> Iterator[bytes]:
+        """Every data line, in order."""
+        for i in range(len(self)):
+            yield self._line(i)
+
+    def close(self) -> None:
+        self._offsets.release()
+        self._mmap.close()
+
+
+def _file_id(stat: os.stat_result) -> tuple:
+    return (stat.st_dev, stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+
+def compile_snapshot(
+    path: Path,
+    naan: Optional[int] = None,
+    incremental: bool = False,
+    batch_size: int = 5000,
+    on_skip=None,
+) -> dict:
+    """Compile the ARKs of naan, or of every NAAN, into a snapshot at path.
+
+    With incremental=True and a snapshot already at path, only ARKs updated since it
+    was built are read from the database and merged into it. ARKs deleted since then
+    stay in the snapshot until the next full build.
+
+    Returns the number of ARKs in the snapshot and the number read from the database.
+    """
+    built_at = django_timezone.now()
+    old = None
+    since = None
+    if incremental and path.exists():
+        old = RedirectSnapshot(path)
+        if old.meta.get("naan") != naan:
+            old.close()
+            raise ValueError(f"{path} is a snapshot of NAAN {old.meta.get('naan')}")
+        # Take in writes that were still in flight when the old snapshot was built
+        delay = getattr(settings, "ARKLET_CHANGES_DELAY", 5)
+        since = old.built_at - timedelta(seconds=delay)
+
+    read = 0
+
+    def count_read(lines):
+        nonlocal read
+        for line in lines:
+            read += 1
+            yield line
+
+    lines = sorted_lines(
+        count_read(resolution_lines(naan, since, batch_size, on_skip=on_skip))
+    )
+    if old is not None:
+        lines = merge_lines(old.lines(), lines)
+    try:
+        count = write_snapshot(path, lines, _snapshot_meta(built_at, naan))
+    finally:
+        if old is not None:
+            old.close()
+    return {"arks": count, "read": read}
+
+
+def _snapshot_meta(built_at: datetime, naan: Optional[int]) -> dict:
+    # NAANs and shoulders let replicas redirect ARKs missing from the snapshot as
+    # fallback_resolution does, without the database. See the registry attribute of
+    # RedirectSnapshot and ARKLET_RESOLVER_SNAPSHOT_DB_FALLBACK.
+    naans = Naan.objects.all() if naan is None else Naan.objects.filter(naan=naan)
+    shoulders = Shoulder.objects.filter(naan__in=naans)
+    naans = naans.values_list("naan", "url", "redirect_template")
+    return {
+        "built_at": built_at.isoformat(),
+        "naan": naan,
+        "naans": {str(number): url for number, url, _ in naans},
+        "naan_templates": {str(number): template for number, _, template in naans},
+        "shoulders": list(
+            shoulders.values_list("naan_id", "shoulder", "redirect_template")
+        ),
+    }
+
+
+def write_nginx_map(snapshot: RedirectSnapshot, f, variable: str = "$ark_redirect"):
+    """Write an nginx map of ARK paths to the URLs they redirect to.
+
+    Unbound ARKs, and URLs nginx would interpolate variables in, are left out for
+    arklet to answer. Returns the number of entries written.
+    """
+    entries = 0
+    f.write(f'map $uri {variable} {{\n    default "";\n')
+    for line in snapshot.lines():
+        ark, resolution = parse_line(line)
+        url = resolution.target
+        if not url or "$" in url:
+            continue
+        url = url.replace("\\", "\\\\").replace('"', '\\"')
+        f.write(f'    "/ark:/{ark}" "{url}";\n')
+        entries += 1
+    f.write("}\n")
+    return entries
+
+
+_resolver_snapshot = None
+_resolver_snapshot_checked_at = None
+_resolver_snapshot_error = None
+_resolver_snapshot_lock = threading.Lock()
+
+
+def get_resolver_snapshot() -> Optional[RedirectSnapshot]:
+    """Return this process's snapshot at ARKLET_RESOLVER_SNAPSHOT, if there is one.
+
+    Every ARKLET_RESOLVER_SNAPSHOT_CHECK_INTERVAL seconds, the path is checked for a
+    new file, as compileredirects leaves when it renames a build into place. The new
+    snapshot is then opened and swapped in; lookups already running finish on the old
+    one, whose mapping is released once the last of them is done. While the path is
+    missing or unreadable, the last good snapshot, if any, is kept.
+    """
+    global _resolver_snapshot, _resolver_snapshot_checked_at, _resolver_snapshot_error
+    path = getattr(settings, "ARKLET_RESOLVER_SNAPSHOT", "")
+    if not path:
+        return None
+    interval = getattr(settings, "ARKLET_RESOLVER_SNAPSHOT_CHECK_INTERVAL", 5)
+    checked_at = _resolver_snapshot_checked_at
+    if checked_at is not None and time.monotonic() - checked_at < interval:
+        return _resolver_snapshot
+    with _resolver_snapshot_lock:
+        # Another thread may have checked while this one waited for the lock
+        if _resolver_snapshot_checked_at is not checked_at:
+            return _resolver_snapshot
+        try:
+            current = _resolver_snapshot
+            if current is None or _file_id(os.stat(path)) != current.file_id:
+                _resolver_snapshot = RedirectSnapshot(path)
+                logger.info(
+                    "Resolving from snapshot built at %s", _resolver_snapshot.built_at
+                )
+            _resolver_snapshot_error = None
+        except (OSError, ValueError) as e:
+            # Log each distinct error once, not at every check
+            if str(e) != _resolver_snapshot_error:
+                logger.error("Can't open the resolver snapshot: %s", e)
+                _resolver_snapshot_error = str(e)
+        _resolver_snapshot_checked_at = time.monotonic()
+    return _resolver_snapshot
+
+
+def snapshot_resolution(naan: int, assigned_name: str) -> Optional[Resolution]:
+    """The Resolution of an ARK from the resolver snapshot, or None to ask the database.
+
+    With ARKLET_RESOLVER_SNAPSHOT_DB_FALLBACK off, ARKs missing from the snapshot are
+    redirected by the templates and NAAN URLs recorded in it, so that replicas never
+    touch the database. ARKs minted since the snapshot was built then resolve only
+    once it is rebuilt.
+    """
+    snapshot = get_resolver_snapshot()
+    if snapshot is None:
+        return None
+    resolution = passthrough_resolution(
+        ark_candidates(naan, assigned_name), snapshot.get
+    )
+    if resolution is None and not getattr(
+        settings, "ARKLET_RESOLVER_SNAPSHOT_DB_FALLBACK", True
+    ):
+        return fallback_resolution(naan, assigned_name, snapshot.registry)
+    return resolution
+
+
+def snapshot_inflection(
+    naan: int, assigned_name: str
+) -> Optional[tuple[Optional[dict], Resolution]]:
+    """The record and fallback for an inflection, on replicas without the database.
+
+    None, to ask the database, unless ARKLET_RESOLVER_SNAPSHOT_DB_FALLBACK is off and
+    there is a snapshot. Snapshots hold no metadata or commitments, so records read
+    from them only have the ark, url and updated_at of the ARK or its nearest
+    ancestor, as find_record would pick it.
+    """
+    if getattr(settings, "ARKLET_RESOLVER_SNAPSHOT_DB_FALLBACK", True):
+        return None
+    snapshot = get_resolver_snapshot()
+    if snapshot is None:
+        return None
+    record = None
+    for ark, _ in ark_candidates(naan, assigned_name):
+        resolution = snapshot.get(ark)
+        if resolution is not None:
+            updated_at = resolution.updated_at
+            record = {
+                "ark": ark,
+                "url": resolution.target,
+                "updated_at": updated_at.isoformat() if updated_at else "",
+            }
+            break
+    return record, fallback_resolution(naan, assigned_name, snapshot.registry)
+
+
+@receiver(setting_changed)
+def reset_snapshot(*, setting, **kwargs):
+    """Reopen the snapshot when its settings change, e.g. under override_settings."""
+    global _resolver_snapshot, _resolver_snapshot_checked_at, _resolver_snapshot_error
+    if setting.startswith("ARKLET_RESOLVER_SNAPSHOT"):
+        with _resolver_snapshot_lock:
+            _resolver_snapshot = None
+            _resolver_snapshot_checked_at = None
+            _resolver_snapshot_error = None
@@ -1,40 +1,300 @@
-from typing import Tuple
+import math
+import operator
+import re
+from collections import defaultdict
+from functools import lru_cache
+from typing import Optional, Tuple
+from urllib.parse import quote
 
 import secrets
 
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
 BETANUMERIC = "0123456789bcdfghjkmnpqrstvwxz"
 
+# The check digit score of every character, and of every byte for ASCII strings.
+# Characters outside BETANUMERIC score 0, like "0".
+_SCORES = {char: score for score, char in enumerate(BETANUMERIC)}
+_BYTE_SCORES = bytes(_SCORES.get(chr(byte), 0) for byte in range(256))
+
+# Random bytes are mapped onto BETANUMERIC modulo 29. Bytes from 232 up are rejected,
+# as keeping them would make the first 24 characters more likely than the rest.
+_ACCEPTED_BYTES = 256 - 256 % len(BETANUMERIC)
+_NOID_CHARS = bytes(
+    ord(BETANUMERIC[byte % len(BETANUMERIC)]) for byte in range(_ACCEPTED_BYTES)
+) + bytes(256 - _ACCEPTED_BYTES)
+_REJECTED_BYTES = bytes(range(_ACCEPTED_BYTES, 256))
+
+# Below this many strings, NumPy's setup costs more than it saves
+NUMPY_MIN_BATCH = 1000
+
 
 def noid_check_digit(noid: str) -> str:
     """Calculate the check digit for an ARK.
 
     See: https://metacpan.org/dist/Noid/view/noid#NOID-CHECK-DIGIT-ALGORITHM
     """
-    total = 0
-    for pos, char in enumerate(noid, start=1):
-        score = BETANUMERIC.find(char)
-        if score > 0:
-            total += pos * score
+    if noid.isascii():
+        scores = noid.encode("ascii").translate(_BYTE_SCORES)
+    else:
+        scores = [_SCORES.get(char, 0) for char in noid]
+    total = sum(map(operator.mul, scores, range(1, len(noid) + 1)))
     remainder = total % 29  # 29 == len(BETANUMERIC)
-    return BETANUMERIC[remainder]  # IndexError may be long ARK
+    return BETANUMERIC[remainder]
+
+
+def noid_check_digits(noids: list[str]) -> list[str]:
+    """Calculate the check digits of many ARKs at once, see noid_check_digit.
+
+    Large batches of ASCII strings are computed with NumPy, when it is installed.
+    """
+    if (
+        numpy is not None
+        and len(noids) >= NUMPY_MIN_BATCH
+        and all(noid.isascii() for noid in noids)
+    ):
+        return _numpy_check_digits(noids)
+    return [noid_check_digit(noid) for noid in noids]
+
+
+def _numpy_check_digits(noids: list[str]) -> list[str]:
+    scores = numpy.frombuffer(_BYTE_SCORES, dtype=numpy.uint8).astype(numpy.int64)
+    check_digits = [""] * len(noids)
+    # Strings of one length form a matrix, with one row per string
+    indexes_by_length = defaultdict(list)
+    for i, noid in enumerate(noids):
+        indexes_by_length[len(noid)].append(i)
+    for length, indexes in indexes_by_length.items():
+        chars = "".join(noids[i] for i in indexes).encode("ascii")
+        matrix = numpy.frombuffer(chars, dtype=numpy.uint8).reshape(
+            len(indexes), length
+        )
+        totals = scores[matrix] @ numpy.arange(1, length + 1, dtype=numpy.int64)
+        for i, remainder in zip(indexes, (totals % 29).tolist()):
+            check_digits[i] = BETANUMERIC[remainder]
+    return check_digits
 
 
 def generate_noid(length: int) -> str:
     return "".join(secrets.choice(BETANUMERIC) for _ in range(length))
 
 
-def parse_ark(ark: str) -> Tuple[str, int, str]:
-    parts = ark.split("ark:")
-    if len(parts) != 2:
+def generate_noids(count: int, length: int) -> list[str]:
+    """Generate count random NOIDs of the given length, see generate_noid.
+
+    The NOIDs are cut from one buffer of secrets.token_bytes, mapped onto BETANUMERIC
+    by rejection sampling with bytes.translate.
+    """
+    if length <= 0:
+        return [""] * count
+    needed = count * length
+    chars = b""
+    while len(chars) < needed:
+        missing = needed - len(chars)
+        # Enough bytes to cover the expected rejections, with a margin
+        size = missing * 256 // _ACCEPTED_BYTES + missing // 20 + 16
+        chars += secrets.token_bytes(size).translate(_NOID_CHARS, _REJECTED_BYTES)
+    text = chars[:needed].decode("ascii")
+    return [text[i : i + length] for i in range(0, needed, length)]
+
+
+class NoidTemplate:
+    """A Noid minter template such as ".reedeek" or ".sdddd".
+
+    The first character is the generation mode: "s" mints in sequential order, "r" in
+    a quasi-random order, both without replacement until the template is exhausted, and
+    "z" mints sequentially without limit, widening the blade when it runs out. The
+    rest is the mask: "d" for a digit, "e" for a betanumeric character, and an optional
+    final "k" for a check character.
+
+    See: https://metacpan.org/dist/Noid/view/noid#TEMPLATES
+    """
+
+    def __init__(self, template: str):
+        mask = template.removeprefix(".")
+        if not mask or mask[0] not in "rsz":
+            raise ValueError("Template must start with a mode of r, s or z")
+        self.mode, mask = mask[0], mask[1:]
+        self.check = mask.endswith("k")
+        self.mask = mask.removesuffix("k")
+        if not self.mask or set(self.mask) - {"d", "e"}:
+            raise ValueError("Template mask must be made of d and e, then maybe k")
+        self.radices = [10 if char == "d" else len(BETANUMERIC) for char in self.mask]
+        self.capacity: Optional[int] = (
+            None if self.mode == "z" else math.prod(self.radices)
+        )
+        if self.mode == "r":
+            # Any multiplier coprime with the capacity permutes [0, capacity).
+            # One near capacity / golden ratio scatters consecutive counters widely.
+            self.multiplier = int(self.capacity * 0.6180339887) | 1
+            while math.gcd(self.multiplier, self.capacity) != 1:
+                self.multiplier += 2
+
+    def blade(self, counter: int) -> str:
+        """Return the counter-th blade of the template, without a check character."""
+        if self.capacity is not None and not 0 <= counter < self.capacity:
+            raise ValueError("Template is exhausted")
+        if self.mode == "r":
+            counter = (counter + 1) * self.multiplier % self.capacity
+        chars = []
+        for radix in reversed(self.radices):
+            counter, digit = divmod(counter, radix)
+            chars.append(BETANUMERIC[digit])
+        while counter:
+            counter, digit = divmod(counter, self.radices[0])
+            chars.append(BETANUMERIC[digit])
+        return "".join(reversed(chars))
+
+    def name(self, counter: int, ark_prefix: str) -> str:
+        """Return the counter-th name, with a check character computed over the whole
+        ARK if the template calls for one. ark_prefix is the NAAN and shoulder."""
+        blade = self.blade(counter)
+        if self.check:
+            blade += noid_check_digit(f"{ark_prefix}{blade}")
+        return blade
+
+
+class RedirectTemplate:
+    """A URL template such as "https://archive.org/details/{blade}".
+
+    Placeholders are filled from the ARK, e.g. for 13960/t5n960f7n on shoulder /t5:
+    {ark} "13960/t5n960f7n", {naan} "13960", {shoulder} "t5", {blade} "n960f7n" and
+    {name} "t5n960f7n". ARKs on no shoulder have an empty {shoulder} and their whole
+    name as {blade}. Values are URL-quoted, all but "/", as names may carry
+    qualifiers from the request.
+    """
+
+    PLACEHOLDERS = frozenset(["ark", "naan", "shoulder", "blade", "name"])
+
+    def __init__(self, template: str):
+        if not template.startswith(("http://", "https://")):
+            raise ValueError("Template must be an http or https URL")
+        # Literal text at even indexes, placeholder names at odd ones
+        self.parts = re.split(r"\{([^{}]*)\}", template)
+        unknown = set(self.parts[1::2]) - self.PLACEHOLDERS
+        if unknown:
+            raise ValueError(f"Unknown placeholder {{{min(unknown)}}}")
+        self.template = template
+
+    def expand(self, naan: int, shoulder: str, name: str) -> str:
+        """The URL for the ARK naan/name, which is on shoulder, e.g. "/t5", or ""."""
+        shoulder = shoulder.removeprefix("/")
+        values = {
+            "ark": f"{naan}/{name}",
+            "naan": str(naan),
+            "shoulder": shoulder,
+            "blade": name[len(shoulder) :],
+            "name": name,
+        }
+        parts = self.parts.copy()
+        parts[1::2] = [quote(values[placeholder]) for placeholder in parts[1::2]]
+        return "".join(parts)
+
+
+# What follows the NAAN: Name[Qualifier][Inflection]. The shoulder follows the
+# first-digit convention: one or more letters and the digit after them.
+_NAME_PATTERN = re.compile(
+    r"((?:[a-z]+[0-9])?)([^/.?]*)([/.][^?]*)?(\?.*)?",
+    re.DOTALL,
+)
+
+# Distinct ARKs whose parses are kept, so hot identifiers are parsed once
+PARSE_CACHE_SIZE = 4096
+
+
+class ParsedArk:
+    """The parts of an ARK, e.g. https://n2t.net/ark:/13960/t5n960f7n/p1.pdf?info:
+
+    nma          "https://n2t.net/", the Name Mapping Authority, or ""
+    naan         13960
+    shoulder     "t5", by the first-digit convention, or "" if the name has none
+    blade        "n960f7n", the rest of the name
+    qualifier    "/p1.pdf", the hierarchy ("/") and variant (".") qualifiers
+    inflection   "?info", or "?" or "??", asking about the ARK rather than for it
+
+    assigned_name is what parse_ark has always returned: everything between the NAAN
+    and the next slash, verbatim. Instances are shared by the parse cache, so treat
+    them as read only.
+    """
+
+    __slots__ = (
+        "nma",
+        "naan",
+        "shoulder",
+        "blade",
+        "qualifier",
+        "inflection",
+        "assigned_name",
+    )
+
+    def __init__(
+        self,
+        nma: str,
+        naan: int,
+        shoulder: str,
+        blade: str,
+        qualifier: str = "",
+        inflection: str = "",
+        assigned_name: Optional[str] = None,
+    ):
+        self.nma = nma
+        self.naan = naan
+        self.shoulder = shoulder
+        self.blade = blade
+        self.qualifier = qualifier
+        self.inflection = inflection
+        self.assigned_name = (
+            shoulder + blade if assigned_name is None else assigned_name
+        )
+
+    @property
+    def name(self) -> str:
+        """The shoulder and blade, without qualifiers."""
+        return self.shoulder + self.blade
+
+    @property
+    def check_digit(self) -> str:
+        """The name's last character if it is a valid NOID check digit, else ""."""
+        name = self.name
+        if name and noid_check_digit(f"{self.naan}/{name[:-1]}") == name[-1]:
+            return name[-1]
+        return ""
+
+    def __eq__(self, other):
+        if not isinstance(other, ParsedArk):
+            return NotImplemented
+        return all(
+            getattr(self, slot) == getattr(other, slot) for slot in self.__slots__
+        )
+
+    def __hash__(self):
+        return hash(tuple(getattr(self, slot) for slot in self.__slots__))
+
+    def __repr__(self):
+        return f"ParsedArk({self.nma}ark:/{self.naan}/{self.assigned_name})"
+
+
+def parse_ark_parts(ark: str) -> ParsedArk:
+    """Parse [NMA]ark:[/]NAAN/Name[Qualifier][Inflection], with parse_ark's errors."""
+    try:
+        return _parse_ark(ark)
+    except (TypeError, AttributeError):
+        # e.g. a number or a list in a JSON request body
+        raise ValueError("Not a valid ARK")
+
+
+@lru_cache(maxsize=PARSE_CACHE_SIZE)
+def _parse_ark(ark: str) -> ParsedArk:
+    # Everything before the one and only "ark:" is the NMA
+    start = ark.find("ark:")
+    if start == -1 or ark.find("ark:", start + 4) != -1:
         raise ValueError("Not a valid ARK")
-    nma, ark = parts
-    ark = ark.lstrip("/")
-    parts = ark.split("/")
-    if len(parts) < 2:
+    naan, found, rest = ark[start + 4 :].lstrip("/").partition("/")
+    if not found:
         raise ValueError("Not a valid ARK")
-    # TODO: assigned_name definition here conflicts with models.Ark.assigned_name
-    # parse_ark here doesn't attempt to parse out the shoulder of the ARK.
-    naan, assigned_name = parts[:2]
     if len(naan) > 10:
         # Limit the size of input to int(naan)
         raise ValueError("Not a valid NAAN")
@@ -42,5 +302,28 @@ def parse_ark(ark: str) -> Tuple[str, int, str]:
         naan_int = int(naan)
     except ValueError:
         raise ValueError("ARK NAAN must be an integer")
+    shoulder, blade, qualifier, inflection = _NAME_PATTERN.match(rest).groups()
+    return ParsedArk(
+        ark[:start],
+        naan_int,
+        shoulder,
+        blade,
+        qualifier or "",
+        inflection or "",
+        rest.partition("/")[0],
+    )
 
-    return nma, naan_int, assigned_name
+
+def normalize_ark(ark: str) -> str:
+    """An ARK string, or part of one, without the hyphens the ARK spec ignores."""
+    return ark.replace("-", "")
+
+
+def parse_ark(ark: str) -> Tuple[str, int, str]:
+    """Split an ARK into its NMA, NAAN and assigned name.
+
+    The assigned name is everything between the NAAN and the next slash. See
+    parse_ark_parts for the shoulder, blade, qualifier and inflection.
+    """
+    parsed = parse_ark_parts(ark)
+    return parsed.nma, parsed.naan, parsed.assigned_name
@@ -1,33 +1,96 @@
 import json
 import logging
 
+from django.conf import settings
+from django.core.exceptions import (
+    ObjectDoesNotExist,
+    PermissionDenied,
+    ValidationError,
+)
+from django.db import transaction
 from django.http import (
     Http404,
     HttpResponse,
     HttpResponseBadRequest,
     HttpResponseForbidden,
     HttpResponseNotAllowed,
-    HttpResponseRedirect,
     HttpResponseServerError,
     JsonResponse,
+    StreamingHttpResponse,
 )
 from django.views.decorators.csrf import csrf_exempt
 
-from arklet.ark.forms import MintArkForm, UpdateArkForm
+from arklet.ark.cache import get_auth_cache, get_resolver_cache
+from arklet.ark.export import (
+    EXPORT_FORMATS,
+    as_dict,
+    changes,
+    export_chunks,
+    iter_arks,
+    streaming_content,
+)
+from arklet.ark.forms import (
+    ArkChangesForm,
+    BindArkForm,
+    ExportArksForm,
+    MintArkBatchForm,
+    MintArkForm,
+    UpdateArkForm,
+    validate_registered_shoulder,
+)
 from arklet.ark.models import APIKey, Ark, Naan
-from arklet.ark.utils import parse_ark
+from arklet.ark.resolution import (
+    afind_inflection,
+    afind_resolution,
+    find_inflection,
+    find_resolution,
+    inflection_response,
+    is_inflection,
+    resolution_response,
+)
+from arklet.ark.snapshot import snapshot_inflection, snapshot_resolution
+from arklet.ark.utils import (
+    noid_check_digits,
+    normalize_ark,
+    parse_ark,
+    parse_ark_parts,
+)
 
 logger = logging.getLogger(__name__)
 
+_UNCACHED = object()
 
-def authorize(request) -> Naan:
-    bearer_token = request.headers.get("Authorization")
-    plain_key = bearer_token.split()[-1]
+
+def _authorize_key(plain_key: str) -> Naan:
     try:
-        authorized_naan = Naan.objects.get(key__key=plain_key, key__active=True)
+        return Naan.objects.get(key__key=plain_key, key__active=True)
     except Naan.DoesNotExist:
         api_key = APIKey.objects.get_by_plain_key(plain_key)
-        authorized_naan = api_key.naan
+        return api_key.naan
+
+
+def authorize(request) -> Naan:
+    """Return the NAAN authorized by the request's bearer token.
+
+    Raises PermissionDenied for a token that authorizes nothing. Both outcomes are
+    cached by the hashed token, so repeat calls and brute-force attempts with the same
+    token skip the database.
+    """
+    bearer_token = request.headers.get("Authorization")
+    plain_key = bearer_token.split()[-1]
+    hashed_key = APIKey.objects.hash_key(plain_key)
+    cache = get_auth_cache()
+    authorized_naan = cache.get(hashed_key, _UNCACHED)
+    if authorized_naan is _UNCACHED:
+        try:
+            authorized_naan = _authorize_key(plain_key)
+            cache.set(hashed_key, authorized_naan)
+        except (ObjectDoesNotExist, ValidationError):
+            authorized_naan = None
+            negative_ttl = getattr(settings, "ARKLET_AUTH_CACHE_NEGATIVE_TTL", 10)
+            cache.set(hashed_key, authorized_naan, ttl=negative_ttl)
+    if authorized_naan is None:
+        raise PermissionDenied
     return authorized_naan
 
 
@@ -58,6 +121,10 @@ def mint_ark(request):
 
     # Mint the ARK
     shoulder = mint_request.cleaned_data["shoulder"]
+    try:
+        validate_registered_shoulder(naan, shoulder)
+    except ValidationError as e:
+        return JsonResponse(e.message_dict, status=400)
     url = mint_request.cleaned_data["url"]
     metadata = mint_request.cleaned_data["metadata"]
     commitment = mint_request.cleaned_data["commitment"]
@@ -75,6 +142,87 @@ def mint_ark(request):
     return JsonResponse({"ark": str(ark)})
 
 
+def max_batch_size() -> int:
+    return getattr(settings, "ARKLET_MAX_BATCH_SIZE", 10000)
+
+
+@csrf_exempt
+def batch_mint_ark(request):
+    """Mint many ARKs for one NAAN and shoulder.
+
+    Expects {"naan": ..., "shoulder": ..., "arks": [{"url": ..., ...}, ...]} and
+    responds with {"arks": [...]}, one entry per requested ARK in request order. Each
+    entry is either {"ark": "ark:/..."} or {"errors": {...}}.
+    """
+    if request.method != "POST":
+        return HttpResponseNotAllowed(permitted_methods=["POST"])
+
+    # Check if request has an authorized NAAN
+    try:
+        authorized_naan = authorize(request)
+    except Exception:
+        return HttpResponseForbidden()
+
+    # Validate POST
+    try:
+        unsafe_mint_request = json.loads(request.body.decode("utf-8"))
+        mint_request = MintArkBatchForm(unsafe_mint_request)
+        if not mint_request.is_valid():
+            return JsonResponse(mint_request.errors, status=400)
+        unsafe_bindings = unsafe_mint_request.get("arks")
+    except (json.JSONDecodeError, TypeError, AttributeError):
+        return HttpResponseBadRequest()
+    if not isinstance(unsafe_bindings, list):
+        return JsonResponse({"arks": ["Expected a list of ARKs to mint"]}, status=400)
+    if len(unsafe_bindings) > max_batch_size():
+        msg = f"At most {max_batch_size()} ARKs may be minted per request"
+        return JsonResponse({"arks": [msg]}, status=400)
+
+    # Check NAAN is authorized to mint ARK for NAAN
+    naan = mint_request.cleaned_data["naan"]
+    if authorized_naan.naan != naan:
+        return HttpResponseForbidden()
+    shoulder = mint_request.cleaned_data["shoulder"]
+    try:
+        validate_registered_shoulder(naan, shoulder)
+    except ValidationError as e:
+        return JsonResponse(e.message_dict, status=400)
+
+    results = [None] * len(unsafe_bindings)
+    valid_indexes, bindings = [], []
+    for i, unsafe_binding in enumerate(unsafe_bindings):
+        try:
+            binding = BindArkForm(unsafe_binding)
+            if not binding.is_valid():
+                results[i] = {"errors": binding.errors}
+                continue
+        except (TypeError, AttributeError):
+            results[i] = {"errors": {"__all__": ["Expected an object"]}}
+            continue
+        valid_indexes.append(i)
+        bindings.append(binding.cleaned_data)
+
+    # Mint the ARKs
+    arks, collisions = Ark.objects.mint_many(authorized_naan, shoulder, bindings)
+    if collisions > 0:
+        logger.warning("Arks created after %d collision(s)", collisions)
+
+    failures = 0
+    for i, ark in zip(valid_indexes, arks):
+        if ark:
+            results[i] = {"ark": str(ark)}
+        else:
+            failures += 1
+            msg = f"Gave up creating ark after {collisions} collision(s)"
+            results[i] = {"errors": {"__all__": [msg]}}
+    if failures:
+        logger.error(
+            "Gave up creating %d ark(s) after %d collision(s)", failures, collisions
+        )
+
+    return JsonResponse({"arks": results})
+
+
 @csrf_exempt
 def update_ark(request):
     if request.method != "PUT":
@@ -107,38 +255,284 @@ def update_ark(request):
         return HttpResponseForbidden()
 
     # Update the ARK
-    try:
-        ark = Ark.objects.select_for_update(ark=f"{naan}/{assigned_name}")
-    except Ark.DoesNotExist:
-        raise Http404
+    with transaction.atomic():
+        try:
+            ark = Ark.objects.select_for_update().get(ark=f"{naan}/{assigned_name}")
+        except Ark.DoesNotExist:
+            raise Http404
 
-    ark.url = url
-    ark.metadata = metadata
-    ark.commitment = commitment
-    ark.save()
+        ark.url = url
+        ark.metadata = metadata
+        ark.commitment = commitment
+        ark.save()
 
     return HttpResponse()
 
 
-def resolve_ark(request, ark: str):
+@csrf_exempt
+def batch_update_ark(request):
+    """Update the bindings of many ARKs belonging to one NAAN.
+
+    Expects {"arks": [{"ark": ..., "url": ..., ...}, ...]} and responds with
+    {"arks": [...]}, one entry per requested update in request order. Each entry has
+    the requested "ark" and a "status" of "updated", "not found", "forbidden" or
+    "invalid". Invalid entries also carry the form "errors".
+    """
+    if request.method != "PUT":
+        return HttpResponseNotAllowed(permitted_methods=["PUT"])
+
+    # Check if request has an authorized NAAN
     try:
-        _, naan, assigned_name = parse_ark(ark)
-    except ValueError as e:
-        logger.warning("Failed to parse ark %s with error %s", ark, e, exc_info=True)
-        return HttpResponseBadRequest()
+        authorized_naan = authorize(request)
+    except Exception:
+        return HttpResponseForbidden()
+
+    # Validate PUT
     try:
-        ark_obj = Ark.objects.get(ark=f"{naan}/{assigned_name}")
-        if not ark_obj.url:
-            # TODO: return a template page for an ARK in progress
-            raise Http404
-        return HttpResponseRedirect(ark_obj.url)
-    except Ark.DoesNotExist:
+        unsafe_update_requests = json.loads(request.body.decode("utf-8"))["arks"]
+    except (json.JSONDecodeError, TypeError, KeyError):
+        return HttpResponseBadRequest()
+    if not isinstance(unsafe_update_requests, list):
+        return JsonResponse({"arks": ["Expected a list of ARKs to update"]}, status=400)
+    if len(unsafe_update_requests) > max_batch_size():
+        msg = f"At most {max_batch_size()} ARKs may be updated per request"
+        return JsonResponse({"arks": [msg]}, status=400)
+
+    results, pending, bindings = [], [], {}
+    for unsafe_update_request in unsafe_update_requests:
         try:
-            naan_obj = Naan.objects.get(naan=naan)
-            return HttpResponseRedirect(
-                f"{naan_obj.url}/ark:/{naan_obj.naan}/{assigned_name}"
+            update_request = UpdateArkForm(unsafe_update_request)
+            is_valid = update_request.is_valid()
+        except (TypeError, AttributeError):
+            errors = {"__all__": ["Expected an object"]}
+            results.append({"ark": None, "status": "invalid", "errors": errors})
+            continue
+        result = {"ark": update_request.data.get("ark")}
+        results.append(result)
+        if not is_valid:
+            result.update(status="invalid", errors=update_request.errors)
+            continue
+
+        # Check NAAN is authorized to update this ARK
+        _, naan, assigned_name = parse_ark(update_request.cleaned_data["ark"])
+        if authorized_naan.naan != naan:
+            result["status"] = "forbidden"
+            continue
+
+        # Later updates to the same ARK win, as they would with sequential PUTs
+        ark_string = f"{naan}/{assigned_name}"
+        pending.append((result, ark_string))
+        bindings[ark_string] = update_request.cleaned_data
+
+    # Update the ARKs
+    updated = Ark.objects.bind_many(bindings)
+
+    for result, ark_string in pending:
+        result["status"] = "updated" if ark_string in updated else "not found"
+    return JsonResponse({"arks": results})
+
+
+def max_verify_size() -> int:
+    return getattr(settings, "ARKLET_MAX_VERIFY_SIZE", 50000)
+
+
+def _verification_lines(unsafe_arks: list, chunk_size: int = 1000):
+    """Yield one NDJSON line per ARK, querying the database once per chunk."""
+    for start in range(0, len(unsafe_arks), chunk_size):
+        results, parsed = [], []
+        for unsafe_ark in unsafe_arks[start : start + chunk_size]:
+            result = {"ark": unsafe_ark}
+            results.append(result)
+            try:
+                _, naan, assigned_name = parse_ark(unsafe_ark)
+            except (ValueError, AttributeError):
+                result["status"] = "malformed"
+                continue
+            parsed.append((result, f"{naan}/{assigned_name}"))
+
+        # Hyphens are insignificant, but ARKs imported with them are stored so
+        ark_strings = [ark_string for _, ark_string in parsed]
+        normalized = [normalize_ark(ark_string) for ark_string in ark_strings]
+        check_digits = noid_check_digits([ark[:-1] for ark in normalized])
+        found = set(
+            Ark.objects.filter(ark__in={*ark_strings, *normalized}).values_list(
+                "ark", flat=True
             )
-        except Naan.DoesNotExist:
-            resolver = "https://n2t.net"
-            # TODO: more robust resolver URL creation
-            return HttpResponseRedirect(f"{resolver}/ark:/{naan}/{assigned_name}")
+        )
+        for (result, ark_string), ark, check_digit in zip(
+            parsed, normalized, check_digits
+        ):
+            exists = ark_string in found or ark in found
+            result["status"] = "found" if exists else "not found"
+            result["valid_check_digit"] = ark[-1:] == check_digit
+        yield "".join(json.dumps(result) + "\n" for result in results)
+
+
+@csrf_exempt
+def verify_arks(request):
+    """Check a list of ARKs for typos and for whether they exist.
+
+    Expects {"arks": ["ark:/...", ...]} and streams back NDJSON, one object per ARK in
+    request order, with the requested "ark" and a "status" of "found", "not found" or
+    "malformed". Well-formed ARKs also have "valid_check_digit", which is false when
+    the last character isn't the Noid check character of the rest, e.g. when two
+    characters were transposed. ARKs minted without a check character never have one.
+    """
+    if request.method != "POST":
+        return HttpResponseNotAllowed(permitted_methods=["POST"])
+
+    try:
+        unsafe_arks = json.loads(request.body.decode("utf-8"))["arks"]
+    except (json.JSONDecodeError, UnicodeDecodeError, TypeError, KeyError):
+        return HttpResponseBadRequest()
+    if not isinstance(unsafe_arks, list):
+        return JsonResponse({"arks": ["Expected a list of ARKs to verify"]}, status=400)
+    if len(unsafe_arks) > max_verify_size():
+        msg = f"At most {max_verify_size()} ARKs may be verified per request"
+        return JsonResponse({"arks": [msg]}, status=400)
+
+    return StreamingHttpResponse(
+        streaming_content(request, _verification_lines(unsafe_arks)),
+        content_type="application/x-ndjson",
+    )
+
+
+def export_arks(request):
+    """Stream every ARK of a NAAN, optionally of one shoulder or updated since.
+
+    Takes naan, shoulder, since (an ISO 8601 timestamp) and format ("ndjson", the
+    default, or "csv") query parameters. The NAAN must be the one authorized by the
+    bearer token.
+    """
+    if request.method != "GET":
+        return HttpResponseNotAllowed(permitted_methods=["GET"])
+
+    # Check if request has an authorized NAAN
+    try:
+        authorized_naan = authorize(request)
+    except Exception:
+        return HttpResponseForbidden()
+
+    export_request = ExportArksForm(request.GET)
+    if not export_request.is_valid():
+        return JsonResponse(export_request.errors, status=400)
+
+    # Check NAAN is authorized to export ARKs of NAAN
+    if authorized_naan.naan != export_request.cleaned_data["naan"]:
+        return HttpResponseForbidden()
+
+    format = export_request.cleaned_data["format"] or "ndjson"
+    rows = iter_arks(
+        authorized_naan,
+        shoulder=export_request.cleaned_data["shoulder"],
+        since=export_request.cleaned_data["since"],
+    )
+    return StreamingHttpResponse(
+        streaming_content(request, export_chunks(rows, format)),
+        content_type=EXPORT_FORMATS[format],
+    )
+
+
+def ark_changes(request):
+    """Page through the ARKs of a NAAN in the order they were last changed.
+
+    Takes naan, cursor, since (an ISO 8601 timestamp, used when there is no cursor)
+    and limit query parameters. Responds with {"arks": [...], "cursor": ...}; request
+    again with that cursor for the changes after these. An empty "arks" means the
+    consumer is up to date, and should poll again later with the same cursor.
+    """
+    if request.method != "GET":
+        return HttpResponseNotAllowed(permitted_methods=["GET"])
+
+    # Check if request has an authorized NAAN
+    try:
+        authorized_naan = authorize(request)
+    except Exception:
+        return HttpResponseForbidden()
+
+    changes_request = ArkChangesForm(request.GET)
+    if not changes_request.is_valid():
+        return JsonResponse(changes_request.errors, status=400)
+
+    # Check NAAN is authorized to read ARKs of NAAN
+    if authorized_naan.naan != changes_request.cleaned_data["naan"]:
+        return HttpResponseForbidden()
+
+    rows, cursor = changes(
+        authorized_naan,
+        cursor=changes_request.cleaned_data["cursor"],
+        since=changes_request.cleaned_data["since"],
+        limit=min(changes_request.cleaned_data["limit"] or 1000, max_batch_size()),
+        delay=getattr(settings, "ARKLET_CHANGES_DELAY", 5),
+    )
+    return JsonResponse({"arks": [as_dict(row) for row in rows], "cursor": cursor})
+
+
+def _resolver_name(ark: str):
+    """The NAAN and name (with qualifiers) to resolve ark by, or None if malformed."""
+    try:
+        parsed = parse_ark_parts(ark)
+    except ValueError as e:
+        logger.warning("Failed to parse ark %s with error %s", ark, e, exc_info=True)
+        return None
+    return parsed.naan, parsed.name + parsed.qualifier
+
+
+def resolve_ark(request, ark: str):
+    parsed = _resolver_name(ark)
+    if parsed is None:
+        return HttpResponseBadRequest()
+    naan, assigned_name = parsed
+
+    if is_inflection(request):
+        # Replicas without the database answer from the snapshot
+        answer = snapshot_inflection(naan, assigned_name) or find_inflection(
+            naan, assigned_name
+        )
+        return inflection_response(request, *answer)
+
+    # Both bound ARKs and fallback redirects are cached, keyed by the ARK as
+    # requested, since a name without hyphens doesn't find ARKs stored with them.
+    # Misses are looked up in the redirect snapshot, if any, before the database.
+    # Passthrough redirects are cached under the whole ARK, and saving the ancestor
+    # doesn't drop them: they follow a rebound ancestor once their entries expire,
+    # within ARKLET_RESOLVER_CACHE_TTL seconds with a shared cache backend and
+    # ARKLET_RESOLVER_CACHE_LOCAL_TTL seconds without one.
+    cache = get_resolver_cache()
+    key = f"{naan}/{assigned_name}"
+    resolution = cache.get(key)
+    if resolution is None:
+        resolution = snapshot_resolution(naan, assigned_name) or find_resolution(
+            naan, assigned_name
+        )
+        cache.set(key, resolution)
+    return resolution_response(request, naan, resolution)
+
+
+async def aresolve_ark(request, ark: str):
+    """Async resolve_ark, routed instead of it under ASGI (see ARKLET_ASYNC_RESOLVER).
+
+    Resolver cache hits are answered on the event loop, without the thread hop Django
+    makes for sync views. Only cache misses wait on the database.
+    """
+    parsed = _resolver_name(ark)
+    if parsed is None:
+        return HttpResponseBadRequest()
+    naan, assigned_name = parsed
+
+    if is_inflection(request):
+        answer = snapshot_inflection(naan, assigned_name) or await afind_inflection(
+            naan, assigned_name
+        )
+        return inflection_response(request, *answer)
+
+    cache = get_resolver_cache()
+    key = f"{naan}/{assigned_name}"
+    resolution = await cache.aget(key)
+    if resolution is None:
+        # Snapshot lookups read a memory map and never block for long
+        resolution = snapshot_resolution(naan, assigned_name) or await afind_resolution(
+            naan, assigned_name
+        )
+        await cache.aset(key, resolution)
+    return resolution_response(request, naan, resolution)
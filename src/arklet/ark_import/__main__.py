@@ -3,63 +3,34 @@
 This script formats a Noid/Egg db dump into a series of SQL queries,
 grouped into multiple files, suitable for importing into arklet.
 
-As written, will only work for naan 13960 and shoulders /t, /fk.
-Modify the extract_ark function to work for your DB file.
+To load a dump straight into the database instead, use the importnoid
+management command, which can also resume an interrupted import.
+
+By default, only imports naan 13960 and shoulders /t, /fk, as the
+original Internet Archive dump did. Pass --shoulder for your DB file.
 
 Supply a path to the db dump and a prefix for the query files.
 
 Example call:
-python -m ark_import sample_noid_output.txt output-prefix
+python -m arklet.ark_import sample_noid_output.txt output-prefix
 """
 
-import sys
+import argparse
+
+from arklet.ark_import.noid import batched, noid_bindings, parse_rules, read_records
 
-infile = sys.argv[1]
-out_prefix = sys.argv[2]
 queries_per_file = 10000
 
 
-def signal_line(line):
-    return line.startswith("ark:/") and line.endswith("_t")
-
-
-def extract_ark(line):
-    ark, record_type = line.split("|")
-    proto, naan, number = ark.split("/")
-    naan = int(naan)
-    if naan != 13960:
-        raise ValueError(f"bad naan: {naan}")
-    if number.startswith("t"):
-        shoulder = "/t"
-        number = number[1:]
-    elif number.startswith("fk"):
-        shoulder = "/fk"
-        number = number[2:]
-    else:
-        raise ValueError(number)
-    if len(number) != 8:
-        raise ValueError(f"unexpected number: {number}")
-    return naan, shoulder, number
-
-
-def query_format(naan, shoulder, number, url):
-    ark = f"{naan}{shoulder}{number}"
-    return repr((ark, shoulder, number, url, naan))
-
-
-def ark_input_iter(ark_input_file):
-    with open(ark_input_file, "r") as f:
-        take_next = False
-        for line in f:
-            line = line.strip()
-            if signal_line(line):
-                take_next = True
-                naan, shoulder, number = extract_ark(line)
-            elif take_next:
-                yield query_format(naan, shoulder, number, line)
-                take_next = False
-            else:
-                take_next = False
+def sql_literal(value):
+    if isinstance(value, int):
+        return str(value)
+    return "'{}'".format(value.replace("'", "''"))
+
+
+def query_format(binding):
+    values = (binding.ark, binding.shoulder, binding.assigned_name, binding.url)
+    return f"({', '.join(map(sql_literal, values))}, {binding.naan})"
 
 
 def write_query_values(prefix, file_num, vals):
@@ -71,12 +42,23 @@ def write_query_values(prefix, file_num, vals):
         f.write(query)
 
 
-query_vals = []
-outfile_num = 0
-for query_val in ark_input_iter(infile):
-    query_vals.append(query_val)
-    if len(query_vals) >= queries_per_file:
-        write_query_values(out_prefix, outfile_num, query_vals)
-        query_vals.clear()
-        outfile_num += 1
-write_query_values(out_prefix, outfile_num, query_vals)  # write remaining values
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("infile")
+    parser.add_argument("out_prefix")
+    parser.add_argument(
+        "--shoulder", action="append", dest="rules", metavar="NAAN/SHOULDER"
+    )
+    parser.add_argument("--blade-length", type=int, default=8)
+    args = parser.parse_args()
+    rules = parse_rules(args.rules or ["13960/t", "13960/fk"])
+
+    with open(args.infile, "rb") as f:
+        bindings = noid_bindings(read_records(f), rules, args.blade_length)
+        queries = (query_format(binding) for binding, _ in bindings)
+        for outfile_num, query_vals in enumerate(batched(queries, queries_per_file)):
+            write_query_values(args.out_prefix, outfile_num, query_vals)
+
+
+if __name__ == "__main__":
+    main()
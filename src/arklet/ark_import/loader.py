@@ -0,0 +1,218 @@
+"""Load ARK bindings parsed from a Noid dump into the arklet database.
+
+PostgreSQL databases are loaded with COPY. Other databases fall back to bulk_create.
+Bindings whose ARK is already in the database are never overwritten; they are counted
+as conflicts instead, which also makes re-loading a batch after a crash harmless.
+
+A dump, or a byte range of one, is imported in batches. After each batch commits, the
+offset reached is saved to a checkpoint file so that an interrupted import can resume.
+Byte ranges let a dump be split into shards imported by a pool of processes.
+"""
+
+import json
+import os
+from collections.abc import Callable, Iterable
+from pathlib import Path
+from typing import NamedTuple, Optional
+
+from django.db import IntegrityError, connections, transaction
+from django.utils import timezone
+
+from arklet.ark.models import Ark
+from arklet.ark_import.noid import (
+    NoidBinding,
+    ShoulderRule,
+    batched,
+    noid_bindings,
+    read_records,
+)
+
+
+class LoadResult(NamedTuple):
+    """The ARKs inserted by a load and those skipped as already present."""
+
+    inserted: int
+    conflicts: list[str]
+
+
+def existing_arks(arks: list[str], using: str = "default") -> set[str]:
+    """Return the subset of the given ark strings already in the database."""
+    # Keep well under every backend's limit on query parameters
+    return {
+        ark
+        for chunk in batched(arks, 1000)
+        for ark in Ark.objects.using(using)
+        .filter(ark__in=chunk)
+        .values_list("ark", flat=True)
+    }
+
+
+def copy_supported(using: str = "default") -> bool:
+    """COPY needs PostgreSQL through psycopg 3, whose cursors have a copy() method."""
+    connection = connections[using]
+    if connection.vendor != "postgresql":
+        return False
+    with connection.cursor() as cursor:
+        return hasattr(cursor.cursor, "copy")
+
+
+def _copy_rows(bindings: Iterable[NoidBinding], using: str) -> None:
+    now = timezone.now()
+    columns = [
+        "ark",
+        "naan_id",
+        "shoulder",
+        "assigned_name",
+        "url",
+        "metadata",
+        "commitment",
+        "created_at",
+        "updated_at",
+    ]
+    statement = f"COPY {Ark._meta.db_table} ({', '.join(columns)}) FROM STDIN"
+    connection = connections[using]
+    # The raw psycopg cursor is used, so translate its errors into Django's by hand
+    with connection.cursor() as cursor, connection.wrap_database_errors:
+        with cursor.cursor.copy(statement) as copy:
+            for binding in bindings:
+                copy.write_row(
+                    (
+                        binding.ark,
+                        binding.naan,
+                        binding.shoulder,
+                        binding.assigned_name,
+                        binding.url,
+                        "",
+                        "",
+                        now,
+                        now,
+                    )
+                )
+
+
+def _bulk_create_rows(bindings: Iterable[NoidBinding], using: str) -> None:
+    Ark.objects.using(using).bulk_create(
+        (
+            Ark(
+                ark=binding.ark,
+                naan_id=binding.naan,
+                shoulder=binding.shoulder,
+                assigned_name=binding.assigned_name,
+                url=binding.url,
+            )
+            for binding in bindings
+        ),
+        batch_size=1000,
+    )
+
+
+def load_bindings(
+    bindings: list[NoidBinding], use_copy: bool, using: str = "default"
+) -> LoadResult:
+    """Insert bindings in one transaction, skipping ARKs that already exist.
+
+    Within the batch, the first binding for an ARK wins and later ones are conflicts.
+    Another process may insert one of the ARKs between our check and our insert, e.g.
+    when shards of a dump that contains duplicates are imported concurrently. The
+    batch is then retried, and the ARK becomes a conflict.
+    """
+    for _ in range(2):
+        try:
+            return _load_bindings(bindings, use_copy, using)
+        except IntegrityError:
+            continue
+    return _load_bindings(bindings, use_copy, using)
+
+
+def _load_bindings(bindings, use_copy, using):
+    with transaction.atomic(using=using):
+        existing = existing_arks([binding.ark for binding in bindings], using)
+        new_bindings, conflicts = [], []
+        for binding in bindings:
+            if binding.ark in existing:
+                conflicts.append(binding.ark)
+            else:
+                existing.add(binding.ark)
+                new_bindings.append(binding)
+        if use_copy:
+            _copy_rows(new_bindings, using)
+        else:
+            _bulk_create_rows(new_bindings, using)
+    return LoadResult(len(new_bindings), conflicts)
+
+
+def read_checkpoint(path: Path, start: int = 0) -> dict:
+    try:
+        return json.loads(path.read_text())
+    except FileNotFoundError:
+        return {"offset": start, "inserted": 0, "conflicts": 0, "skipped": 0}
+
+
+def write_checkpoint(path: Path, checkpoint: dict) -> None:
+    """Replace the checkpoint atomically, so a crash never leaves half a file."""
+    tmp_path = path.with_name(f"{path.name}.tmp")
+    tmp_path.write_text(json.dumps(checkpoint))
+    os.replace(tmp_path, path)
+
+
+def import_range(
+    dump: Path,
+    rules: list[ShoulderRule],
+    checkpoint_path: Path,
+    start: int = 0,
+    end: Optional[int] = None,
+    blade_length: Optional[int] = None,
+    batch_size: int = 10000,
+    conflict_log: Optional[Path] = None,
+    on_batch: Optional[Callable[[dict], None]] = None,
+) -> dict:
+    """Import the records of dump whose key line starts within [start, end).
+
+    Resumes from checkpoint_path if it exists, and keeps it up to date. ARKs that were
+    already present are appended to conflict_log, if given. on_batch is called with
+    the checkpoint after each batch commits.
+
+    Returns the final checkpoint: the offset reached and the running totals of ARKs
+    inserted, conflicts and skipped records, plus up to 10 "rejected" sample keys.
+    """
+    checkpoint = read_checkpoint(checkpoint_path, start)
+    checkpoint["rejected"] = []
+    if end is None:
+        end = dump.stat().st_size
+
+    def on_reject(key):
+        checkpoint["skipped"] += 1
+        if len(checkpoint["rejected"]) < 10:
+            checkpoint["rejected"].append(key)
+
+    use_copy = copy_supported()
+    with dump.open("rb") as f:
+        records = read_records(f, start=checkpoint["offset"], end=end)
+        bindings = noid_bindings(records, rules, blade_length, on_reject)
+        for batch in batched(bindings, batch_size):
+            result = load_bindings([binding for binding, _ in batch], use_copy)
+            if conflict_log and result.conflicts:
+                with conflict_log.open("a") as log:
+                    log.writelines(f"{ark}\n" for ark in result.conflicts)
+            checkpoint["offset"] = batch[-1][1]
+            checkpoint["inserted"] += result.inserted
+            checkpoint["conflicts"] += len(result.conflicts)
+            write_checkpoint(checkpoint_path, checkpoint)
+            if on_batch:
+                on_batch(checkpoint)
+
+    # Mark the range as done, even if its last records were all skipped
+    checkpoint["offset"] = max(checkpoint["offset"], end)
+    write_checkpoint(checkpoint_path, checkpoint)
+    return checkpoint
+
+
+def plan_shards(dump: Path, count: int) -> list[tuple[int, int]]:
+    """Split dump into count byte ranges of about equal size.
+
+    The ranges needn't fall on record boundaries: read_records gives each record to
+    the range its key line starts in.
+    """
+    size = dump.stat().st_size
+    bounds = [size * i // count for i in range(count + 1)]
+    return [(start, end) for start, end in zip(bounds, bounds[1:]) if start < end]
@@ -0,0 +1,147 @@
+"""Parse ARK bindings out of a Noid/Egg Berkeley DB dump.
+
+A dump made with `db_dump -p` alternates key and value lines, each indented by one
+space. The bindings we import are the "_t" (target) elements:
+
+     ark:/13960/t00000018|_t
+     http://www.archive.org/details/intronational00greerich
+
+The functions here form a generator pipeline over the dump file, read in binary so the
+byte offset of each record is known. Offsets let an import checkpoint its progress and
+resume, or split a dump into shards, on record boundaries.
+"""
+
+from collections.abc import Callable, Iterable, Iterator
+from itertools import islice
+from typing import BinaryIO, NamedTuple, Optional
+
+
+class ShoulderRule(NamedTuple):
+    """A NAAN and shoulder (with its leading slash) to import ARKs for."""
+
+    naan: int
+    shoulder: str
+
+
+class NoidBinding(NamedTuple):
+    """One ARK binding parsed from the dump, in the shape of an arklet Ark row."""
+
+    ark: str
+    naan: int
+    shoulder: str
+    assigned_name: str
+    url: str
+
+
+class NoidRecord(NamedTuple):
+    """The raw key and value lines of a "_t" record, and the offset just past it."""
+
+    key: str
+    value: str
+    end_offset: int
+
+
+def parse_rules(specs: Iterable[str]) -> list[ShoulderRule]:
+    """Parse rules like "13960/t" or "ark:/13960/fk" into ShoulderRules.
+
+    The rules are returned longest shoulder first, so that a blade is matched against
+    the most specific shoulder it starts with.
+    """
+    rules = []
+    for spec in specs:
+        naan, sep, shoulder = spec.removeprefix("ark:").strip("/").partition("/")
+        if not sep or not shoulder:
+            raise ValueError(f"Expected NAAN/shoulder, got {spec}")
+        try:
+            rules.append(ShoulderRule(int(naan), f"/{shoulder}"))
+        except ValueError:
+            raise ValueError(f"ARK NAAN must be an integer, got {spec}")
+    return sorted(rules, key=lambda rule: len(rule.shoulder), reverse=True)
+
+
+def signal_line(line: str) -> bool:
+    return line.startswith("ark:/") and line.endswith("_t")
+
+
+def read_records(
+    f: BinaryIO, start: int = 0, end: Optional[int] = None
+) -> Iterator[NoidRecord]:
+    """Yield the "_t" records whose key line starts within [start, end).
+
+    start need not fall on a line boundary: reading begins at the first line that
+    starts at or after it. A record whose key line is before end is read in full, even
+    when its value line runs past end.
+    """
+    offset = start
+    if start > 0:
+        f.seek(start - 1)
+        offset += len(f.readline()) - 1
+    else:
+        f.seek(0)
+    while end is None or offset < end:
+        line = f.readline()
+        if not line:
+            break
+        offset += len(line)
+        key = line.strip().decode("utf-8", errors="replace")
+        if not signal_line(key):
+            continue
+        value = f.readline()
+        offset += len(value)
+        yield NoidRecord(key, value.strip().decode("utf-8", errors="replace"), offset)
+
+
+def extract_ark(
+    key: str, rules: list[ShoulderRule], blade_length: Optional[int] = None
+) -> tuple[int, str, str]:
+    """Split a record key like "ark:/13960/t00000018|_t" into naan, shoulder, blade.
+
+    Raises ValueError if no rule matches the ARK or its blade has the wrong length.
+    """
+    ark, _ = key.split("|", 1)
+    _, naan, number = ark.split("/", 2)
+    naan = int(naan)
+    for rule in rules:
+        shoulder = rule.shoulder[1:]
+        if rule.naan == naan and number.startswith(shoulder):
+            number = number[len(shoulder) :]
+            break
+    else:
+        raise ValueError(f"no shoulder rule for ark:/{naan}/{number}")
+    if blade_length is not None and len(number) != blade_length:
+        raise ValueError(f"unexpected number: {number}")
+    return naan, rule.shoulder, number
+
+
+def noid_bindings(
+    records: Iterable[NoidRecord],
+    rules: list[ShoulderRule],
+    blade_length: Optional[int] = None,
+    on_reject: Optional[Callable[[str], None]] = None,
+) -> Iterator[tuple[NoidBinding, int]]:
+    """Turn records into (binding, end_offset) pairs.
+
+    Records that no rule accepts are skipped, and their key passed to on_reject.
+    """
+    for record in records:
+        try:
+            naan, shoulder, number = extract_ark(record.key, rules, blade_length)
+        except ValueError:
+            if on_reject is not None:
+                on_reject(record.key)
+            continue
+        binding = NoidBinding(
+            ark=f"{naan}{shoulder}{number}",
+            naan=naan,
+            shoulder=shoulder,
+            assigned_name=number,
+            url=record.value,
+        )
+        yield binding, record.end_offset
+
+
+def batched(iterable: Iterable, n: int) -> Iterator[list]:
+    """Yield lists of up to n items from iterable."""
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, n)):
+        yield batch
@@ -12,5 +12,7 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "arklet.entrypoints.settings")
+# Serve resolutions with the async view, see ARKLET_ASYNC_RESOLVER in settings.py
+os.environ.setdefault("ARKLET_ASYNC_RESOLVER", "true")
 
 application = get_asgi_application()
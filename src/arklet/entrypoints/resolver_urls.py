@@ -0,0 +1,19 @@
+"""URL configuration for ARK resolution alone, see ARKLET_RESOLVER_ONLY in settings.py.
+
+The full URLconf in urls.py includes these patterns.
+"""
+
+from django.conf import settings
+from django.urls import re_path
+
+from arklet.ark import views
+
+resolve_view = (
+    views.aresolve_ark
+    if getattr(settings, "ARKLET_ASYNC_RESOLVER", False)
+    else views.resolve_ark
+)
+
+urlpatterns = [
+    re_path(r"^(resolve/)?(?P<ark>ark:/?.*$)", resolve_view, name="resolve_ark"),
+]
@@ -0,0 +1,16 @@
+"""
+WSGI config for resolver-only arklet processes.
+
+It exposes the WSGI callable as a module-level variable named ``application``. Only
+ARK resolution is served, through a minimal middleware stack; see ARKLET_RESOLVER_ONLY
+in settings.py. Run the full entrypoint in wsgi.py for minting and the admin.
+"""
+
+import os
+
+from django.core.wsgi import get_wsgi_application
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "arklet.entrypoints.settings")
+os.environ.setdefault("ARKLET_RESOLVER_ONLY", "true")
+
+application = get_wsgi_application()
@@ -27,6 +27,18 @@ def get_int(name: str, default: int) -> int:
         return default
 
 
+def get_int_map(name: str) -> dict[str, int]:
+    """Parse "key=1,other=2" into a dict, skipping entries that aren't key=int."""
+    result = {}
+    for item in os.environ.get(name, "").split(","):
+        key, _, value = item.partition("=")
+        try:
+            result[key.strip()] = int(value)
+        except ValueError:
+            continue
+    return result
+
+
 # Quick-start development settings - unsuitable for production
 # See https://docs.djangoproject.com/en/3.2/howto/deployment/checklist/
 
@@ -106,6 +118,19 @@ DATABASES = {
     }
 }
 
+# Use a SQLite database instead, e.g. for local development and benchmarks.
+ARKLET_SQLITE_PATH = os.environ.get("ARKLET_SQLITE_PATH", "")
+if ARKLET_SQLITE_PATH:
+    DATABASES = {
+        "default": {
+            "ENGINE": "django.db.backends.sqlite3",
+            "NAME": ARKLET_SQLITE_PATH,
+        }
+    }
+    # Migration 0003 sets column defaults with PostgreSQL's ALTER syntax, so SQLite
+    # tables are created straight from the models: migrate with --run-syncdb.
+    MIGRATION_MODULES = {"ark": None}
+
 
 AUTH_USER_MODEL = "ark.User"
 
@@ -155,6 +180,94 @@ MEDIA_ROOT = os.environ.get("ARKLET_MEDIA_ROOT", "media")
 
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
+# Maximum number of ARKs accepted by a single batch API request.
+ARKLET_MAX_BATCH_SIZE = get_int("ARKLET_MAX_BATCH_SIZE", 10000)
+
+# Maximum number of ARKs accepted by a single /verify request.
+ARKLET_MAX_VERIFY_SIZE = get_int("ARKLET_MAX_VERIFY_SIZE", 50000)
+
+# Seconds the /changes feed holds back recent changes, so that a slow transaction
+# can't commit a change behind a consumer's cursor. Keep it above the longest write.
+ARKLET_CHANGES_DELAY = get_int("ARKLET_CHANGES_DELAY", 5)
+
+# Resolver cache: a per-process LRU of resolve_ark redirect targets.
+# Set ARKLET_RESOLVER_CACHE_SIZE=0 to disable it. ARKLET_RESOLVER_CACHE_BACKEND may name
+# an alias from CACHES (e.g. a Redis cache) to share entries between processes.
+# Processes keep their own copies for ARKLET_RESOLVER_CACHE_LOCAL_TTL seconds at most,
+# so updates and mints made through one process reach the others within that long.
+ARKLET_RESOLVER_CACHE_SIZE = get_int("ARKLET_RESOLVER_CACHE_SIZE", 10000)
+ARKLET_RESOLVER_CACHE_TTL = get_int("ARKLET_RESOLVER_CACHE_TTL", 300)
+ARKLET_RESOLVER_CACHE_LOCAL_TTL = get_int("ARKLET_RESOLVER_CACHE_LOCAL_TTL", 1)
+ARKLET_RESOLVER_CACHE_BACKEND = os.environ.get("ARKLET_RESOLVER_CACHE_BACKEND", "")
+
+# Authorization cache: a per-process LRU of bearer token hashes to authorized NAANs.
+# Deactivated keys stop working in other processes within ARKLET_AUTH_CACHE_TTL seconds.
+ARKLET_AUTH_CACHE_SIZE = get_int("ARKLET_AUTH_CACHE_SIZE", 1000)
+ARKLET_AUTH_CACHE_TTL = get_int("ARKLET_AUTH_CACHE_TTL", 60)
+ARKLET_AUTH_CACHE_NEGATIVE_TTL = get_int("ARKLET_AUTH_CACHE_NEGATIVE_TTL", 10)
+ARKLET_AUTH_CACHE_BACKEND = os.environ.get("ARKLET_AUTH_CACHE_BACKEND", "")
+
+# Cache-Control max-age, in seconds, of redirects to bound ARKs. Browsers and CDNs may
+# serve a redirect this long after the ARK is rebound, so keep it low or purge on
+# update. Any age may be overridden per shoulder or per NAAN, e.g.
+# ARKLET_RESOLVER_MAX_AGES="13960/t=86400,13960=3600".
+ARKLET_RESOLVER_MAX_AGE = get_int("ARKLET_RESOLVER_MAX_AGE", 0)
+ARKLET_RESOLVER_MAX_AGES = get_int_map("ARKLET_RESOLVER_MAX_AGES")
+
+# ARKs whose commitment is this text, ignoring case and surrounding whitespace, are
+# redirected with a 301 rather than a 302. Clients cache 301s indefinitely, so only
+# set this for ARKs whose URL will never change. Empty disables it.
+ARKLET_PERMANENT_COMMITMENT = os.environ.get("ARKLET_PERMANENT_COMMITMENT", "").strip()
+
+# Path of a redirect snapshot built by the compileredirects command. ARKs found in it
+# are resolved without the database, as they were when it was built, so rebuild it
+# often. Workers check for a rebuilt file every ..._CHECK_INTERVAL seconds. Empty
+# disables it.
+ARKLET_RESOLVER_SNAPSHOT = os.environ.get("ARKLET_RESOLVER_SNAPSHOT", "")
+ARKLET_RESOLVER_SNAPSHOT_CHECK_INTERVAL = get_int(
+    "ARKLET_RESOLVER_SNAPSHOT_CHECK_INTERVAL", 5
+)
+# Look up ARKs missing from the snapshot, i.e. minted since it was built, in the
+# database. Turn this off on replicas without a database: such ARKs are then sent to
+# their NAAN's resolver until the snapshot is rebuilt.
+ARKLET_RESOLVER_SNAPSHOT_DB_FALLBACK = get_bool(
+    "ARKLET_RESOLVER_SNAPSHOT_DB_FALLBACK", True
+)
+
+# Route ARK resolution to the async view. The ASGI entrypoint turns this on by default;
+# under WSGI the sync view avoids starting an event loop for every request.
+ARKLET_ASYNC_RESOLVER = get_bool("ARKLET_ASYNC_RESOLVER", False)
+
+# Serve nothing but ARK resolution, e.g. from a fleet of resolver-only processes behind
+# the same database. Resolution is anonymous and read only, so the session, CSRF, auth
+# and messages middleware, and the admin that needs them, are left out. The
+# arklet.entrypoints.resolver_wsgi entrypoint turns this on.
+ARKLET_RESOLVER_ONLY = get_bool("ARKLET_RESOLVER_ONLY", False)
+ARKLET_RESOLVER_MIDDLEWARE = [
+    "django.middleware.security.SecurityMiddleware",
+    "django.middleware.common.CommonMiddleware",
+]
+if ARKLET_RESOLVER_ONLY:
+    INSTALLED_APPS = [
+        app
+        for app in INSTALLED_APPS
+        if app not in {"django.contrib.admin", "django.contrib.messages"}
+    ]
+    MIDDLEWARE = ARKLET_RESOLVER_MIDDLEWARE
+    ROOT_URLCONF = "arklet.entrypoints.resolver_urls"
+
+# Mint from per-shoulder reservoirs of NOIDs known to be unused, filled by the
+# fillreservoir command. Minting falls back to random NOIDs when a reservoir is empty.
+ARKLET_NOID_RESERVOIR = get_bool("ARKLET_NOID_RESERVOIR", False)
+
+# Opt in to refuse minting on shoulders missing from the Shoulder table. Each process
+# keeps the registered shoulders in memory; changes made by other processes are picked
+# up within ARKLET_SHOULDER_REGISTRY_TTL seconds.
+ARKLET_REQUIRE_REGISTERED_SHOULDERS = get_bool(
+    "ARKLET_REQUIRE_REGISTERED_SHOULDERS", False
+)
+ARKLET_SHOULDER_REGISTRY_TTL = get_int("ARKLET_SHOULDER_REGISTRY_TTL", 60)
+
 SENTRY_DSN = os.environ.get("ARKLET_SENTRY_DSN", "")
 SENTRY_SAMPLE_RATE = 1 / get_int("ARKLET_SENTRY_TRANSACTIONS_PER_TRACE", 1)
 if SENTRY_DSN:
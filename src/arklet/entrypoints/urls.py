@@ -15,13 +15,19 @@ Including another URLconf
 """
 
 from django.contrib import admin
-from django.urls import path, re_path
+from django.urls import path
 
 from arklet.ark import views
+from arklet.entrypoints import resolver_urls
 
 urlpatterns = [
     path("mint", views.mint_ark, name="mint_ark"),
+    path("mint/batch", views.batch_mint_ark, name="batch_mint_ark"),
     path("update", views.update_ark, name="update_ark"),
-    re_path(r"^(resolve/)?(?P<ark>ark:/?.*$)", views.resolve_ark, name="resolve_ark"),
+    path("update/batch", views.batch_update_ark, name="batch_update_ark"),
+    path("verify", views.verify_arks, name="verify_arks"),
+    path("export", views.export_arks, name="export_arks"),
+    path("changes", views.ark_changes, name="ark_changes"),
+    *resolver_urls.urlpatterns,
     path("admin/", admin.site.urls),
 ]
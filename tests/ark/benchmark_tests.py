@@ -0,0 +1,32 @@
+"""Tests for ark/benchmark.py, the benchmark harness."""
+
+import pytest
+
+from arklet.ark.benchmark import SCENARIOS, run_benchmarks, summarize
+from arklet.ark.models import Ark
+
+
+def test_summarize() -> None:
+    """Percentiles and throughput are computed from the samples."""
+    summary = summarize([0.001] * 99 + [0.1])
+    assert summary["iterations"] == 100
+    assert summary["p50_ms"] == pytest.approx(1)
+    assert summary["max_ms"] == pytest.approx(100)
+    assert summary["ops_per_sec"] == pytest.approx(100 / 0.199)
+
+
+@pytest.mark.django_db
+def test_run_benchmarks() -> None:
+    """Every scenario runs against the seeded data and reports its latencies."""
+    results = run_benchmarks(sorted(SCENARIOS), ark_count=20, iterations=5)
+    assert set(results["results"]) == set(SCENARIOS)
+    assert all(r["iterations"] == 5 for r in results["results"].values())
+    assert results["results"]["resolve"]["resolver_cache"]["misses"] > 0
+    assert Ark.objects.count() == 25
+
+
+@pytest.mark.django_db
+def test_run_benchmarks_without_cache() -> None:
+    """The resolver cache can be disabled to measure the database path."""
+    results = run_benchmarks(["resolve"], ark_count=20, iterations=5, use_cache=False)
+    assert results["results"]["resolve"]["resolver_cache"]["max_size"] == 0
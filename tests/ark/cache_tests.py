@@ -0,0 +1,121 @@
+"""Tests for ark/cache.py, the in-process LRU caches."""
+
+from unittest.mock import patch
+
+from asgiref.sync import async_to_sync
+
+from arklet.ark.cache import LRUCache
+
+
+class TestLRUCache:
+    """Test the bounded, TTL'd LRUCache."""
+
+    def test_get_and_set(self) -> None:
+        """Values round-trip and hits/misses are counted."""
+        cache = LRUCache(max_size=2, ttl=60)
+        assert cache.get("a") is None
+        cache.set("a", "1")
+        assert cache.get("a") == "1"
+        assert cache.stats()["hits"] == 1
+        assert cache.stats()["misses"] == 1
+
+    def test_caches_falsy_values(self) -> None:
+        """Negative results such as "" are cached like any other value."""
+        cache = LRUCache(max_size=2, ttl=60)
+        cache.set("a", "")
+        assert cache.get("a") == ""
+
+    def test_evicts_least_recently_used(self) -> None:
+        """The least recently used entry is evicted once max_size is exceeded."""
+        cache = LRUCache(max_size=2, ttl=60)
+        cache.set("a", "1")
+        cache.set("b", "2")
+        cache.get("a")
+        cache.set("c", "3")
+        assert cache.get("b") is None
+        assert cache.get("a") == "1"
+        assert cache.get("c") == "3"
+        assert cache.stats()["evictions"] == 1
+
+    def test_entries_expire(self) -> None:
+        """Entries are dropped once their TTL has passed."""
+        cache = LRUCache(max_size=2, ttl=60)
+        with patch("arklet.ark.cache.time.monotonic", return_value=0):
+            cache.set("a", "1")
+        with patch("arklet.ark.cache.time.monotonic", return_value=61):
+            assert cache.get("a") is None
+        assert cache.stats()["expirations"] == 1
+
+    def test_zero_size_disables_cache(self) -> None:
+        """A max_size of 0 caches nothing."""
+        cache = LRUCache(max_size=0, ttl=60)
+        cache.set("a", "1")
+        assert cache.get("a") is None
+
+    def test_shared_backend(self, settings) -> None:
+        """Local misses are filled from the shared Django cache."""
+        settings.CACHES = {
+            "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}
+        }
+        writer = LRUCache(max_size=2, ttl=60, backend="default", prefix="t:")
+        reader = LRUCache(max_size=2, ttl=60, backend="default", prefix="t:")
+        writer.set("a b", "1")
+        assert reader.get("a b") == "1"
+        assert reader.stats()["shared_hits"] == 1
+        writer.delete("a b")
+        reader.clear()
+        assert reader.get("a b") is None
+
+    def test_delete_reaches_other_processes(self, settings) -> None:
+        """With local_ttl, deletes reach the local entries of other caches."""
+        settings.CACHES = {
+            "default": {
+                "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+                "LOCATION": "deletes",
+            }
+        }
+        writer = LRUCache(2, ttl=60, backend="default", prefix="d:", local_ttl=1)
+        reader = LRUCache(2, ttl=60, backend="default", prefix="d:", local_ttl=1)
+        with patch("arklet.ark.cache.time.monotonic", return_value=0):
+            writer.set("a", "1")
+            assert reader.get("a") == "1"
+            writer.delete("a")
+            assert reader.get("a") == "1"
+        with patch("arklet.ark.cache.time.monotonic", return_value=1):
+            assert reader.get("a") is None
+
+    def test_clear_reaches_other_processes(self, settings) -> None:
+        """A clear bumps the shared generation, which other caches pick up."""
+        settings.CACHES = {
+            "default": {
+                "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+                "LOCATION": "generations",
+            }
+        }
+        writer = LRUCache(max_size=2, ttl=60, backend="default", prefix="g:")
+        reader = LRUCache(max_size=2, ttl=60, backend="default", prefix="g:")
+        writer.set("a", "1")
+        assert reader.get("a") == "1"
+        writer.clear()
+        # Until the next check, the reader still answers from its local entries
+        assert reader.get("a") == "1"
+        with patch("arklet.ark.cache.GENERATION_CHECK_INTERVAL", 0):
+            assert reader.get("a") is None
+            reader.set("a", "2")
+            assert async_to_sync(writer.aget)("a") == "2"
+            reader.clear()
+            assert async_to_sync(writer.aget)("a") is None
+
+    def test_async_shared_backend(self, settings) -> None:
+        """aget and aset behave like get and set, through the shared cache too."""
+        settings.CACHES = {
+            "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}
+        }
+        writer = LRUCache(max_size=2, ttl=60, backend="default", prefix="t:")
+        reader = LRUCache(max_size=2, ttl=60, backend="default", prefix="t:")
+        async_to_sync(writer.aset)("a", "1")
+        assert async_to_sync(writer.aget)("a") == "1"
+        assert async_to_sync(reader.aget)("a") == "1"
+        assert async_to_sync(reader.aget)("b", "default") == "default"
+        assert reader.stats()["shared_hits"] == 1
+        assert reader.stats()["misses"] == 1
@@ -0,0 +1,114 @@
+"""Tests for minting from Noid templates, see NoidTemplate and Shoulder."""
+
+import pytest
+from django.core.exceptions import ValidationError
+
+from arklet.ark.models import Ark, Shoulder, validate_minter_template
+from arklet.ark.utils import NoidTemplate, noid_check_digit
+
+
+class TestNoidTemplate:
+    """Test the generation of names from Noid templates."""
+
+    def test_sequential(self) -> None:
+        """s templates count up through the mask in order."""
+        template = NoidTemplate(".sedd")
+        assert [template.blade(n) for n in (0, 1, 10, 100)] == [
+            "000",
+            "001",
+            "010",
+            "100",
+        ]
+        assert template.blade(template.capacity - 1) == "z99"
+
+    def test_random_is_a_permutation(self) -> None:
+        """r templates visit every name once, out of order."""
+        template = NoidTemplate(".rde")
+        blades = [template.blade(n) for n in range(template.capacity)]
+        assert len(set(blades)) == template.capacity == 290
+        assert blades[:3] != sorted(blades)[:3]
+
+    def test_exhaustion(self) -> None:
+        """s and r templates refuse counters past their capacity."""
+        with pytest.raises(ValueError):
+            NoidTemplate(".sd").blade(10)
+
+    def test_unbounded(self) -> None:
+        """z templates widen the blade instead of running out."""
+        template = NoidTemplate(".zd")
+        blades = [template.blade(n) for n in range(200)]
+        assert blades[9:12] == ["9", "10", "11"]
+        assert len(set(blades)) == 200
+
+    def test_check_character(self) -> None:
+        """A final k appends the check character of the whole ARK."""
+        name = NoidTemplate(".sdek").name(5, "1/t2")
+        assert name == f"05{noid_check_digit('1/t205')}"
+
+    @pytest.mark.parametrize("template", ["", ".", ".x", ".r", ".rk", ".rdxk"])
+    def test_invalid_templates(self, template) -> None:
+        """Templates need a mode and a mask of d and e."""
+        with pytest.raises(ValueError):
+            NoidTemplate(template)
+        with pytest.raises(ValidationError):
+            validate_minter_template(template)
+
+
+@pytest.fixture
+def shoulder(naan):
+    """Create a shoulder that mints from a sequential template."""
+    return Shoulder.objects.create(
+        shoulder="/t2",
+        naan=naan,
+        name="Test",
+        description="A Shoulder",
+        minter_template=".sddk",
+    )
+
+
+@pytest.mark.django_db
+class TestTemplateMinting:
+    """Test that mint and mint_many follow the shoulder's template."""
+
+    def test_mint_follows_counter(self, naan, shoulder) -> None:
+        """mint takes the next name of the counter, without collisions."""
+        first, collisions = Ark.objects.mint(naan, "/t2", "", "", "")
+        second, _ = Ark.objects.mint(naan, "/t2", "", "", "")
+        assert collisions == 0
+        assert first.assigned_name == f"00{noid_check_digit('1/t200')}"
+        assert second.assigned_name.startswith("01")
+        shoulder.refresh_from_db()
+        assert shoulder.minter_counter == 2
+
+    def test_mint_skips_taken_names(self, naan, shoulder) -> None:
+        """Names already minted some other way count as collisions."""
+        name = f"00{noid_check_digit('1/t200')}"
+        Ark.objects.create(
+            ark=f"1/t2{name}", naan=naan, shoulder="/t2", assigned_name=name
+        )
+        ark, collisions = Ark.objects.mint(naan, "/t2", "", "", "")
+        assert collisions == 1
+        assert ark.assigned_name.startswith("01")
+
+    def test_mint_many_follows_counter(self, naan, shoulder) -> None:
+        """mint_many takes one counter range for the whole batch."""
+        arks, collisions = Ark.objects.mint_many(naan, "/t2", [{}] * 3)
+        assert collisions == 0
+        assert [ark.assigned_name[:2] for ark in arks] == ["00", "01", "02"]
+
+    def test_exhausted_template(self, naan, shoulder) -> None:
+        """Minting stops once the template has no names left."""
+        Shoulder.objects.filter(pk=shoulder.pk).update(minter_counter=99)
+        arks, _ = Ark.objects.mint_many(naan, "/t2", [{}] * 2)
+        assert arks[0].assigned_name.startswith("99")
+        assert arks[1] is None
+        ark, _ = Ark.objects.mint(naan, "/t2", "", "", "")
+        assert ark is None
+
+    def test_random_mode_is_the_default(self, naan) -> None:
+        """Shoulders without a template still mint random 8 character NOIDs."""
+        Shoulder.objects.create(
+            shoulder="/t2", naan=naan, name="Test", description="A Shoulder"
+        )
+        ark, _ = Ark.objects.mint(naan, "/t2", "", "", "")
+        assert len(ark.assigned_name) == 9
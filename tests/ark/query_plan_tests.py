@@ -0,0 +1,133 @@
+"""Query plan tests for the queries that must stay fast on huge Ark tables.
+
+Each test runs the real query through arklet's code, captures its SQL, and checks
+PostgreSQL's EXPLAIN of it: the query must be answered by an index scan of ark_ark,
+never a sequential scan. A dropped or reordered index, or a query change that no
+longer matches its index, fails here before it reaches production.
+
+The plans are PostgreSQL's, so these tests are skipped on other databases. They run
+under the default settings, against the Postgres of docker-compose.yml.
+"""
+
+import json
+from datetime import timedelta
+
+import pytest
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from arklet.ark.export import changes, encode_cursor, iter_arks
+from arklet.ark.models import Ark
+
+pytestmark = [
+    pytest.mark.django_db,
+    pytest.mark.skipif(
+        connection.vendor != "postgresql", reason="query plans are PostgreSQL's"
+    ),
+]
+
+# Enough rows, a tenth of them in the NAAN under test, that a sequential scan
+# costs more than any plan using a suitable index
+ARKS = 20000
+
+
+@pytest.fixture
+def naan(naans, create_arks):
+    """Seed ARKS ARKs over two NAANs and three shoulders; return the smaller NAAN."""
+    now = timezone.now()
+    for start, shoulder in enumerate(["/t1", "/u1", "/v1"]):
+        names = [f"{i:06}" for i in range(start, ARKS, 3)]
+        create_arks(naans[0], shoulder, [name for name in names if int(name) % 10])
+        create_arks(naans[1], shoulder, [name for name in names if int(name) % 10 == 0])
+    # Spread updated_at out, as edits over time would
+    Ark.objects.update(updated_at=now - timedelta(days=1))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "UPDATE ark_ark SET updated_at = updated_at + "
+            "(right(assigned_name, 4)::int * interval '1 second')"
+        )
+        cursor.execute("ANALYZE ark_ark")
+    return naans[1]
+
+
+def plan_nodes(sql: str) -> list[dict]:
+    """EXPLAIN sql and return every node of its plan."""
+    with connection.cursor() as cursor:
+        cursor.execute(f"EXPLAIN (FORMAT JSON) {sql}")
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    nodes, pending = [], [plan[0]["Plan"]]
+    while pending:
+        node = pending.pop()
+        nodes.append(node)
+        pending.extend(node.get("Plans", []))
+    return nodes
+
+
+def ark_scans(fn) -> list[dict]:
+    """Call fn and return the scan nodes of ark_ark in the plans of its queries."""
+    with CaptureQueriesContext(connection) as queries:
+        fn()
+    return [
+        node
+        for query in queries.captured_queries
+        if "ark_ark" in query["sql"] and query["sql"].startswith("SELECT")
+        for node in plan_nodes(query["sql"])
+        if node.get("Relation Name") == "ark_ark"
+    ]
+
+
+def assert_index_scans(scans: list[dict], index: str = "") -> None:
+    assert scans, "no query of ark_ark was run"
+    for scan in scans:
+        assert scan["Node Type"] in ("Index Scan", "Index Only Scan"), scan
+        if index:
+            assert scan["Index Name"] == index, scan
+
+
+def test_resolve(naan) -> None:
+    """Resolving looks up the ARK by primary key."""
+    client = Client()
+    assert_index_scans(
+        ark_scans(lambda: client.get("/ark:/1/u1000001")), "ark_ark_pkey"
+    )
+
+
+def test_export(naan) -> None:
+    """Exports of a NAAN are read in ark order from the (naan, ark) index."""
+    assert_index_scans(
+        ark_scans(lambda: list(iter_arks(naan, batch_size=500))), "ark_naan_ark_idx"
+    )
+
+
+def test_export_shoulder(naan) -> None:
+    """Exports of a shoulder use the (naan, shoulder, ark) index."""
+    assert_index_scans(
+        ark_scans(lambda: list(iter_arks(naan, "/t1", batch_size=500))),
+        "ark_naan_shoulder_ark_idx",
+    )
+
+
+def test_export_since(naan) -> None:
+    """Exports of recent changes don't scan the whole table."""
+    since = timezone.now() - timedelta(hours=1)
+    assert_index_scans(ark_scans(lambda: list(iter_arks(naan, since=since))))
+
+
+def test_changes(naan) -> None:
+    """The change feed is read in order from the (naan, updated_at, ark) index."""
+    cursor = encode_cursor(timezone.now() - timedelta(hours=23), "2/t1000000")
+    for kwargs in [{}, {"cursor": cursor}]:
+        assert_index_scans(
+            ark_scans(lambda: changes(naan, limit=100, **kwargs)),
+            "ark_naan_updated_at_ark_idx",
+        )
+
+
+def test_admin_shoulder_filter(naan, admin_client) -> None:
+    """The admin's shoulder filter pages through the (naan, shoulder, ark) index."""
+    scans = ark_scans(lambda: admin_client.get("/admin/ark/ark/", {"shoulder": "2/t1"}))
+    assert_index_scans(scans)
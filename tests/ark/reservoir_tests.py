@@ -0,0 +1,104 @@
+"""Tests for the NOID reservoir that mint claims from."""
+
+from itertools import chain, repeat
+from unittest.mock import patch
+
+import pytest
+from django.core.management import call_command
+
+from arklet.ark.models import Ark, ReservedNoid
+
+
+def reserve(naan, *noids):
+    ReservedNoid.objects.bulk_create(
+        ReservedNoid(naan=naan, shoulder="/t2", noid=noid) for noid in noids
+    )
+
+
+@pytest.mark.django_db
+class TestReservoir:
+    """Test filling and claiming reservoirs."""
+
+    def test_fill_tops_up_to_depth(self, naan) -> None:
+        """fill adds NOIDs until the reservoir holds depth of them."""
+        assert ReservedNoid.objects.fill(naan, "/t2", 50, batch_size=20) == 50
+        assert ReservedNoid.objects.fill(naan, "/t2", 60) == 10
+        assert ReservedNoid.objects.depths() == {(1, "/t2"): 60}
+
+    def test_fill_skips_minted_noids(self, naan) -> None:
+        """NOIDs already minted as ARKs, or already reserved, are not reserved."""
+        Ark.objects.mint(naan, "/t2", "", "", "")
+        minted = Ark.objects.get().assigned_name[:-1]
+        reserve(naan, "bcd")
+        noids = chain([minted, "bcd", "fgh"], repeat("bcd"))
+        with patch(
+            "arklet.ark.models.generate_noids",
+            lambda count, length: [next(noids) for _ in range(count)],
+        ):
+            assert ReservedNoid.objects.fill(naan, "/t2", 4) == 1
+        assert set(ReservedNoid.objects.values_list("noid", flat=True)) == {
+            "bcd",
+            "fgh",
+        }
+
+    def test_fill_gives_up_when_exhausted(self, naan) -> None:
+        """fill stops once a round finds no unused NOID."""
+        reserve(naan, "bcd")
+        with patch(
+            "arklet.ark.models.generate_noids",
+            lambda count, length: ["bcd"] * count,
+        ):
+            assert ReservedNoid.objects.fill(naan, "/t2", 5) == 0
+
+    def test_claim_removes_noids(self, naan) -> None:
+        """Claimed NOIDs are removed from the reservoir."""
+        reserve(naan, "bcd", "fgh")
+        claimed = ReservedNoid.objects.claim(naan, "/t2", 5)
+        assert sorted(claimed) == ["bcd", "fgh"]
+        assert ReservedNoid.objects.claim(naan, "/t2") == []
+
+
+@pytest.mark.django_db
+class TestMintFromReservoir:
+    """Test that mint and mint_many use the reservoir when it's turned on."""
+
+    def test_mint_claims_reserved_noid(self, naan, settings) -> None:
+        """mint uses a reserved NOID without generating one."""
+        settings.ARKLET_NOID_RESERVOIR = True
+        reserve(naan, "bcd")
+        with patch("arklet.ark.models.generate_noid") as generate_noid:
+            ark, collisions = Ark.objects.mint(naan, "/t2", "", "", "")
+        generate_noid.assert_not_called()
+        assert ark.assigned_name.startswith("bcd")
+        assert collisions == 0
+        assert not ReservedNoid.objects.exists()
+
+    def test_mint_falls_back_when_empty(self, naan, settings) -> None:
+        """mint generates NOIDs when the reservoir is empty."""
+        settings.ARKLET_NOID_RESERVOIR = True
+        ark, collisions = Ark.objects.mint(naan, "/t2", "", "", "")
+        assert ark is not None
+
+    def test_reservoir_is_off_by_default(self, naan) -> None:
+        """Without ARKLET_NOID_RESERVOIR, the reservoir is left alone."""
+        reserve(naan, "bcd")
+        Ark.objects.mint(naan, "/t2", "", "", "")
+        assert ReservedNoid.objects.count() == 1
+
+    def test_mint_many_claims_reserved_noids(self, naan, settings) -> None:
+        """mint_many uses reserved NOIDs first, then generates the rest."""
+        settings.ARKLET_NOID_RESERVOIR = True
+        reserve(naan, "bcd", "fgh")
+        arks, collisions = Ark.objects.mint_many(naan, "/t2", [{}, {}, {}])
+        assert all(arks)
+        names = {ark.assigned_name[:-1] for ark in arks}
+        assert {"bcd", "fgh"} <= names
+        assert not ReservedNoid.objects.exists()
+
+
+@pytest.mark.django_db
+def test_fillreservoir_command(naan, capsys) -> None:
+    """fillreservoir tops up a reservoir and reports the depths."""
+    call_command("fillreservoir", "1", "/t2", "--depth", "5")
+    call_command("fillreservoir", "--status")
+    assert "1/t2: 5" in capsys.readouterr().out
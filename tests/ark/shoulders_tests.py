@@ -0,0 +1,99 @@
+"""Tests for ark/shoulders.py, the shoulder registry."""
+
+from unittest.mock import patch
+
+import pytest
+
+from arklet.ark.cache import get_resolver_cache
+from arklet.ark.models import Shoulder
+from arklet.ark.resolution import find_resolution
+from arklet.ark.shoulders import ShoulderRegistry, get_shoulder_registry
+
+
+def test_owner_is_longest_prefix() -> None:
+    """The owner of an ARK is the longest shoulder of its NAAN that it starts with."""
+    registry = ShoulderRegistry([(1, "/t"), (1, "/t5"), (1, "/x"), (2, "/t55")])
+    assert len(registry) == 4
+    assert registry.route(1, "/t5n960f7n")[0] == "/t5"
+    assert registry.route(1, "/t6abc")[0] == "/t"
+    assert registry.route(1, "/x")[0] == "/x"
+    assert registry.route(1, "/y1")[0] == ""
+    assert registry.route(2, "/t5")[0] == ""
+    assert registry.route(3, "/t5")[0] == ""
+    assert registry.route(1, "")[0] == ""
+
+
+def test_route() -> None:
+    """The owning shoulder's redirect template wins over its NAAN's."""
+    registry = ShoulderRegistry(
+        [(1, "/t", "https://example.org/t/{blade}"), (1, "/t5"), (2, "/x")],
+        [(1, "https://example.com", "https://example.org/{ark}"), (2, "", "")],
+    )
+    shoulder, template = registry.route(1, "/tab")
+    assert (shoulder, template.template) == ("/t", "https://example.org/t/{blade}")
+    shoulder, template = registry.route(1, "/t5ab")
+    assert (shoulder, template.template) == ("/t5", "https://example.org/{ark}")
+    shoulder, template = registry.route(1, "/y")
+    assert (shoulder, template.template) == ("", "https://example.org/{ark}")
+    assert registry.route(2, "/xy") == ("/x", None)
+    assert registry.route(3, "/xy") == ("", None)
+    assert registry.naan_url(1) == "https://example.com"
+    assert registry.naan_url(3) is None
+
+
+def test_invalid_template_is_ignored() -> None:
+    """Templates saved without validation don't break the registry."""
+    registry = ShoulderRegistry([(1, "/t", "https://example.org/{nope}")])
+    assert registry.route(1, "/tx") == ("/t", None)
+
+
+def test_contains() -> None:
+    """Only the registered (naan, shoulder) pairs themselves are in the registry."""
+    registry = ShoulderRegistry([(1, "/t5"), (1, "/t5")])
+    assert len(registry) == 1
+    assert (1, "/t5") in registry
+    assert (1, "/t") not in registry
+    assert (1, "/t55") not in registry
+    assert (2, "/t5") not in registry
+
+
+@pytest.mark.django_db
+class TestShoulderRegistry:
+    """Test loading the registry from the Shoulder table."""
+
+    def test_reloads_on_change(self, naan, django_assert_num_queries) -> None:
+        """The registry is loaded once and reloaded when a Shoulder changes."""
+        shoulder = Shoulder.objects.create(
+            naan=naan, shoulder="/t5", name="t5", description=""
+        )
+        with django_assert_num_queries(2):
+            assert (1, "/t5") in get_shoulder_registry()
+            assert (1, "/t5") in get_shoulder_registry()
+        shoulder.shoulder = "/b2"
+        shoulder.save()
+        assert get_shoulder_registry().route(1, "/b2xyz")[0] == "/b2"
+        shoulder.delete()
+        assert len(get_shoulder_registry()) == 0
+
+    def test_naan_change_clears_resolutions_once(self, naan) -> None:
+        """Saving or deleting a NAAN clears the resolver cache once."""
+        with patch.object(get_resolver_cache(), "clear") as clear:
+            naan.save()
+            assert clear.call_count == 1
+            naan.delete()
+            assert clear.call_count == 2
+
+    def test_ttl(self, naan, settings) -> None:
+        """Shoulders changed by other processes are seen once the TTL has passed."""
+        settings.ARKLET_SHOULDER_REGISTRY_TTL = 0
+        assert len(get_shoulder_registry()) == 0
+        Shoulder.objects.bulk_create(
+            [Shoulder(naan=naan, shoulder="/t5", name="t5", description="")]
+        )
+        assert (1, "/t5") in get_shoulder_registry()
+
+    def test_fallback_shoulder(self, naan) -> None:
+        """ARKs missing from the database still resolve with their shoulder."""
+        Shoulder.objects.create(naan=naan, shoulder="/t5", name="t5", description="")
+        assert find_resolution(1, "t5missing").shoulder == "/t5"
+        assert find_resolution(1, "x9missing").shoulder == ""
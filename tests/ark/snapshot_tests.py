@@ -0,0 +1,246 @@
+"""Tests for redirect snapshots and the compileredirects command."""
+
+import io
+from datetime import timedelta
+
+import pytest
+from django.core.management import call_command
+from django.utils import timezone
+
+from arklet.ark.models import Ark, Shoulder
+from arklet.ark.resolution import Resolution
+from arklet.ark.snapshot import (
+    RedirectSnapshot,
+    compile_snapshot,
+    get_resolver_snapshot,
+    merge_lines,
+    parse_line,
+    snapshot_line,
+    sorted_lines,
+    write_nginx_map,
+)
+
+
+@pytest.fixture
+def naans(naans, create_arks):
+    """Give both NAANs a few ARKs each, one of them unbound."""
+    for naan in naans:
+        create_arks(naan, "/t", ["b", "a", "c10"])
+        create_arks(naan, "/t", ["c9"], url="")
+    return naans
+
+
+def test_line_round_trip() -> None:
+    """Lines decode to the ARK and Resolution they were encoded from."""
+    now = timezone.now()
+    resolution = Resolution("https://example.com/x", now, "/t", True)
+    assert parse_line(snapshot_line("1/tx", resolution)) == ("1/tx", resolution)
+    assert parse_line(snapshot_line("1/ty", Resolution(""))) == ("1/ty", Resolution(""))
+    assert snapshot_line("1/tz", Resolution("https://example.com/\tx")) is None
+
+
+def test_sorted_lines_spill_to_disk() -> None:
+    """Runs larger than run_size are sorted on disk and merged."""
+    lines = [f"1/t{i}\tu\t\t\t\n".encode() for i in range(100)]
+    assert list(sorted_lines(reversed(lines), run_size=7)) == sorted(lines)
+
+
+def test_merge_lines_prefers_new() -> None:
+    """Merged lines are sorted, and the new line wins for a repeated ARK."""
+    old = [b"1/a\told\n", b"1/b\told\n", b"1/d\told\n"]
+    new = [b"1/b\tnew\n", b"1/c\tnew\n"]
+    assert list(merge_lines(old, new)) == [
+        b"1/a\told\n",
+        b"1/b\tnew\n",
+        b"1/c\tnew\n",
+        b"1/d\told\n",
+    ]
+
+
+@pytest.mark.django_db
+class TestRedirectSnapshot:
+    """Test compiling and reading snapshots."""
+
+    def test_lookups(self, naans, tmp_path) -> None:
+        """Every ARK is found by binary search, unbound ones with an empty target."""
+        path = tmp_path / "redirects.snapshot"
+        assert compile_snapshot(path) == {"arks": 8, "read": 8}
+        snapshot = RedirectSnapshot(path)
+        assert len(snapshot) == 8
+        for ark in Ark.objects.all():
+            resolution = snapshot.get(ark.ark)
+            assert resolution.target == ark.url
+            assert resolution.updated_at == ark.updated_at
+            assert resolution.shoulder == "/t"
+        for missing in ["1/t", "1/ta0", "1/tz", "0/ta", "3/ta"]:
+            assert snapshot.get(missing) is None
+        snapshot.close()
+
+    def test_naan(self, naans, tmp_path) -> None:
+        """A snapshot may be limited to one NAAN."""
+        path = tmp_path / "redirects.snapshot"
+        compile_snapshot(path, naan=2)
+        snapshot = RedirectSnapshot(path)
+        assert snapshot.get("1/ta") is None
+        assert snapshot.get("2/ta").target == "https://example.com/2/a"
+        assert snapshot.meta["naan"] == 2
+        snapshot.close()
+
+    def test_incremental(self, naans, tmp_path, settings) -> None:
+        """Incremental builds read only the ARKs updated since the last build."""
+        settings.ARKLET_CHANGES_DELAY = 0
+        path = tmp_path / "redirects.snapshot"
+        compile_snapshot(path, naan=1)
+        later = timezone.now() + timedelta(minutes=1)
+        Ark.objects.filter(ark="1/ta").update(url="https://example.com/new")
+        Ark.objects.filter(ark="1/ta").update(updated_at=later)
+        Ark.objects.create(
+            ark="1/td", naan=naans[0], shoulder="/t", assigned_name="d", url=""
+        )
+        Ark.objects.filter(ark="1/td").update(updated_at=later)
+
+        assert compile_snapshot(path, naan=1, incremental=True) == {
+            "arks": 5,
+            "read": 2,
+        }
+        snapshot = RedirectSnapshot(path)
+        assert snapshot.get("1/ta").target == "https://example.com/new"
+        assert snapshot.get("1/tb").target == "https://example.com/1/b"
+        assert snapshot.get("1/td").target == ""
+        snapshot.close()
+
+        with pytest.raises(ValueError):
+            compile_snapshot(path, naan=2, incremental=True)
+
+    def test_not_a_snapshot(self, tmp_path) -> None:
+        """Other files are refused."""
+        path = tmp_path / "redirects.snapshot"
+        path.write_bytes(b"\0" * 64)
+        with pytest.raises(ValueError):
+            RedirectSnapshot(path)
+
+    def test_nginx_map(self, naans, tmp_path) -> None:
+        """The nginx map has the bound ARKs of the snapshot."""
+        path = tmp_path / "redirects.snapshot"
+        compile_snapshot(path, naan=1)
+        f = io.StringIO()
+        snapshot = RedirectSnapshot(path)
+        assert write_nginx_map(snapshot, f) == 3
+        snapshot.close()
+        assert '    "/ark:/1/ta" "https://example.com/1/a";\n' in f.getvalue()
+        assert "1/tc9" not in f.getvalue()
+
+    def test_command(self, naans, tmp_path) -> None:
+        """compileredirects writes the snapshot and, optionally, the nginx map."""
+        path = tmp_path / "redirects.snapshot"
+        nginx_map = tmp_path / "ark.map"
+        out = io.StringIO()
+        call_command(
+            "compileredirects",
+            path,
+            "--naan",
+            "1",
+            "--nginx-map",
+            nginx_map,
+            stdout=out,
+        )
+        assert "Compiled 4 ARKs" in out.getvalue()
+        assert nginx_map.read_text().startswith("map $uri $ark_redirect {")
+
+
+@pytest.mark.django_db
+class TestResolveFromSnapshot:
+    """Test resolve_ark with ARKLET_RESOLVER_SNAPSHOT."""
+
+    def test_resolves_without_the_database(
+        self, client, naans, tmp_path, settings, django_assert_num_queries
+    ) -> None:
+        """ARKs in the snapshot are resolved from it; others from the database."""
+        path = tmp_path / "redirects.snapshot"
+        compile_snapshot(path, naan=1)
+        settings.ARKLET_RESOLVER_SNAPSHOT = str(path)
+        with django_assert_num_queries(0):
+            assert client.get("/ark:/1/ta").url == "https://example.com/1/a"
+            assert client.get("/ark:/1/tc9").status_code == 404
+        with django_assert_num_queries(1):
+            assert client.get("/ark:/2/ta").url == "https://example.com/2/a"
+        # Qualified ARKs pass through their ancestor in the snapshot
+        with django_assert_num_queries(0):
+            assert client.get("/ark:/1/ta/p/1").url == "https://example.com/1/a/p/1"
+
+    def test_missing_snapshot(self, client, naans, tmp_path, settings) -> None:
+        """A missing snapshot is logged, and ARKs are resolved from the database."""
+        settings.ARKLET_RESOLVER_SNAPSHOT = str(tmp_path / "missing.snapshot")
+        assert client.get("/ark:/1/ta").url == "https://example.com/1/a"
+
+    def test_picks_up_rebuilds(self, client, naans, tmp_path, settings) -> None:
+        """A snapshot renamed into place replaces the one in use."""
+        settings.ARKLET_RESOLVER_SNAPSHOT_CHECK_INTERVAL = 0
+        settings.ARKLET_RESOLVER_CACHE_SIZE = 0
+        path = tmp_path / "redirects.snapshot"
+        settings.ARKLET_RESOLVER_SNAPSHOT = str(path)
+        assert get_resolver_snapshot() is None
+
+        compile_snapshot(path, naan=1)
+        first = get_resolver_snapshot()
+        assert first.get("1/ta").target == "https://example.com/1/a"
+        Ark.objects.filter(ark="1/ta").update(url="https://example.com/new")
+        assert client.get("/ark:/1/ta").url == "https://example.com/1/a"
+
+        compile_snapshot(path, naan=1)
+        assert client.get("/ark:/1/ta").url == "https://example.com/new"
+        # Lookups still running on the old snapshot can finish
+        assert first.get("1/ta").target == "https://example.com/1/a"
+
+        path.unlink()
+        assert client.get("/ark:/1/ta").url == "https://example.com/new"
+
+    def test_without_the_database(
+        self, client, naans, tmp_path, settings, django_assert_num_queries
+    ) -> None:
+        """Without the database fallback, misses go to the NAAN's resolver."""
+        path = tmp_path / "redirects.snapshot"
+        compile_snapshot(path, naan=1)
+        settings.ARKLET_RESOLVER_SNAPSHOT = str(path)
+        settings.ARKLET_RESOLVER_SNAPSHOT_DB_FALLBACK = False
+        with django_assert_num_queries(0):
+            assert client.get("/ark:/1/tnew").url == "https://example.com/ark:/1/tnew"
+            assert client.get("/ark:/7/tx").url == "https://n2t.net/ark:/7/tx"
+
+    def test_inflections_without_the_database(
+        self, client, naans, tmp_path, settings, django_assert_num_queries
+    ) -> None:
+        """Without the database, inflections are answered from the snapshot."""
+        path = tmp_path / "redirects.snapshot"
+        compile_snapshot(path, naan=1)
+        settings.ARKLET_RESOLVER_SNAPSHOT = str(path)
+        settings.ARKLET_RESOLVER_SNAPSHOT_DB_FALLBACK = False
+        updated_at = Ark.objects.get(ark="1/ta").updated_at
+        with django_assert_num_queries(0):
+            assert client.get("/ark:/1/ta?info").json() == {
+                "ark": "1/ta",
+                "url": "https://example.com/1/a",
+                "updated_at": updated_at.isoformat(),
+            }
+            assert client.get("/ark:/1/ta/p/1??").json()["ark"] == "1/ta"
+            res = client.get("/ark:/1/tnew?info")
+            assert res.url == "https://example.com/ark:/1/tnew?info"
+
+    def test_templates_without_the_database(
+        self, client, naans, tmp_path, settings, django_assert_num_queries
+    ) -> None:
+        """Without the database, redirect templates are read from the snapshot."""
+        Shoulder.objects.create(
+            naan=naans[0],
+            shoulder="/t",
+            name="t",
+            description="",
+            redirect_template="https://example.org/{blade}",
+        )
+        path = tmp_path / "redirects.snapshot"
+        compile_snapshot(path, naan=1)
+        settings.ARKLET_RESOLVER_SNAPSHOT = str(path)
+        settings.ARKLET_RESOLVER_SNAPSHOT_DB_FALLBACK = False
+        with django_assert_num_queries(0):
+            assert client.get("/ark:/1/tnew").url == "https://example.org/new"
+            assert client.get("/ark:/1/xnew").url == "https://example.com/ark:/1/xnew"
@@ -0,0 +1,189 @@
+"""Tests for ark/utils.py, the NOID helpers and the ARK parser."""
+
+import random
+
+import pytest
+
+from arklet.ark import utils
+from arklet.ark.utils import (
+    BETANUMERIC,
+    RedirectTemplate,
+    generate_noids,
+    noid_check_digit,
+    noid_check_digits,
+    normalize_ark,
+    parse_ark,
+    parse_ark_parts,
+)
+
+
+def reference_check_digit(noid: str) -> str:
+    """The check digit algorithm as specified, one character at a time."""
+    total = 0
+    for pos, char in enumerate(noid, start=1):
+        score = BETANUMERIC.find(char)
+        if score > 0:
+            total += pos * score
+    return BETANUMERIC[total % 29]
+
+
+@pytest.fixture
+def arks() -> list[str]:
+    """ARK-like strings, including characters outside BETANUMERIC and non-ASCII."""
+    rng = random.Random(0)
+    alphabet = BETANUMERIC + "ABC/:-.é"
+    return [
+        "".join(rng.choice(alphabet) for _ in range(rng.randint(0, 30)))
+        for _ in range(3000)
+    ]
+
+
+def test_check_digit_matches_reference(arks) -> None:
+    """The table-driven check digit agrees with the specified algorithm."""
+    assert [noid_check_digit(ark) for ark in arks] == [
+        reference_check_digit(ark) for ark in arks
+    ]
+
+
+@pytest.mark.parametrize("use_numpy", [True, False])
+def test_check_digits_matches_reference(arks, use_numpy, monkeypatch) -> None:
+    """Bulk check digits agree with the scalar ones, with or without NumPy."""
+    if use_numpy:
+        pytest.importorskip("numpy")
+    else:
+        monkeypatch.setattr(utils, "numpy", None)
+    ascii_arks = [ark for ark in arks if ark.isascii()]
+    assert noid_check_digits(ascii_arks) == [
+        reference_check_digit(ark) for ark in ascii_arks
+    ]
+    assert noid_check_digits(arks) == [reference_check_digit(ark) for ark in arks]
+
+
+def test_generate_noids() -> None:
+    """generate_noids returns count NOIDs of length made of BETANUMERIC."""
+    noids = generate_noids(10000, 8)
+    assert len(noids) == 10000
+    assert {len(noid) for noid in noids} == {8}
+    assert set("".join(noids)) == set(BETANUMERIC)
+    assert len(set(noids)) == 10000
+    assert generate_noids(0, 8) == []
+    assert generate_noids(2, 0) == ["", ""]
+
+
+def reference_parse_ark(ark: str):
+    """parse_ark as it was before the compiled parser, kept to test against."""
+    parts = ark.split("ark:")
+    if len(parts) != 2:
+        raise ValueError("Not a valid ARK")
+    nma, ark = parts
+    ark = ark.lstrip("/")
+    parts = ark.split("/")
+    if len(parts) < 2:
+        raise ValueError("Not a valid ARK")
+    naan, assigned_name = parts[:2]
+    if len(naan) > 10:
+        raise ValueError("Not a valid NAAN")
+    try:
+        naan_int = int(naan)
+    except ValueError:
+        raise ValueError("ARK NAAN must be an integer")
+    return nma, naan_int, assigned_name
+
+
+def test_parse_ark_matches_reference() -> None:
+    """parse_ark returns, or raises, what it always has on ARK-like strings."""
+    rng = random.Random(0)
+    tokens = ["ark:", "/", "//", "13960", "1", "x", "t5", "n9", "-", ".", "?", "é"]
+    tokens += ["https://n2t.net/", " 7", "12345678901", "?info", "\n", "a", "0"]
+    for _ in range(5000):
+        ark = "".join(rng.choice(tokens) for _ in range(rng.randint(0, 8)))
+        try:
+            expected = reference_parse_ark(ark)
+        except ValueError as e:
+            with pytest.raises(ValueError, match=str(e)):
+                parse_ark(ark)
+        else:
+            assert parse_ark(ark) == expected
+
+
+def test_parse_ark_round_trip() -> None:
+    """The parts of an ARK put back together give the ARK."""
+    rng = random.Random(0)
+    alphabet = BETANUMERIC + "ABC/.-?é:="
+    for _ in range(3000):
+        ark = "".join(rng.choice(alphabet) for _ in range(rng.randint(0, 20)))
+        ark = f"https://n2t.net/ark:/{rng.randint(0, 99999)}/{ark}"
+        parsed = parse_ark_parts(ark)
+        assert ark == (
+            f"{parsed.nma}ark:/{parsed.naan}/"
+            f"{parsed.shoulder}{parsed.blade}{parsed.qualifier}{parsed.inflection}"
+        )
+        assert not parsed.shoulder or parsed.shoulder[-1].isdigit()
+        assert "/" not in parsed.blade and "?" not in parsed.qualifier
+
+
+def test_parse_ark_parts() -> None:
+    """ARKs are split into their NMA, NAAN, name, qualifier and inflection."""
+    parsed = parse_ark_parts("https://n2t.net/ark:/13960/t5n960f7n/p1.pdf?info")
+    assert parsed.nma == "https://n2t.net/"
+    assert parsed.naan == 13960
+    assert parsed.shoulder == "t5"
+    assert parsed.blade == "n960f7n"
+    assert parsed.name == "t5n960f7n"
+    assert parsed.qualifier == "/p1.pdf"
+    assert parsed.inflection == "?info"
+    assert parsed.assigned_name == "t5n960f7n"
+
+    parsed = parse_ark_parts("ark:12345/x6-8r.v2??")
+    assert parsed.nma == ""
+    assert (parsed.shoulder, parsed.blade) == ("x6", "-8r")
+    assert normalize_ark(parsed.name) == "x68r"
+    assert (parsed.qualifier, parsed.inflection) == (".v2", "??")
+    assert parsed.assigned_name == "x6-8r.v2??"
+
+    # Names that don't start with letters and a digit have no shoulder
+    assert parse_ark_parts("ark:/1/bcd").shoulder == ""
+    assert parse_ark_parts("ark:/1/Ab5").shoulder == ""
+    assert parse_ark_parts("ark:/1/5ab").shoulder == ""
+
+
+def test_parse_ark_check_digit() -> None:
+    """Only a valid NOID check digit is reported."""
+    name = "t5n960f7"
+    digit = noid_check_digit(f"13960/{name}")
+    assert parse_ark_parts(f"ark:/13960/{name}{digit}").check_digit == digit
+    wrong = "b" if digit != "b" else "c"
+    assert parse_ark_parts(f"ark:/13960/{name}{wrong}").check_digit == ""
+
+
+@pytest.mark.parametrize("ark", [None, 5, ["ark:/1/x"], {"ark": "ark:/1/x"}])
+def test_parse_ark_not_a_string(ark) -> None:
+    """Values that aren't strings are refused like malformed ARKs."""
+    with pytest.raises(ValueError, match="Not a valid ARK"):
+        parse_ark_parts(ark)
+
+
+def test_redirect_template() -> None:
+    """Redirect templates are filled in from the parts of an ARK."""
+    template = RedirectTemplate("https://example.org/{naan}/{shoulder}/{blade}?a={ark}")
+    assert template.expand(13960, "/t5", "t5n960f7n") == (
+        "https://example.org/13960/t5/n960f7n?a=13960/t5n960f7n"
+    )
+    assert template.expand(13960, "", "t5n960f7n") == (
+        "https://example.org/13960//t5n960f7n?a=13960/t5n960f7n"
+    )
+    assert RedirectTemplate("https://example.org/{name}").expand(1, "/t", "tx") == (
+        "https://example.org/tx"
+    )
+    assert RedirectTemplate("https://example.org/?q={name}").expand(
+        1, "/t", "tx/a b&c"
+    ) == ("https://example.org/?q=tx/a%20b%26c")
+
+
+@pytest.mark.parametrize(
+    "template", ["example.org/{name}", "https://example.org/{nope}", "ftp://x/{ark}"]
+)
+def test_invalid_redirect_template(template) -> None:
+    """Templates must be http(s) URLs using only the known placeholders."""
+    with pytest.raises(ValueError):
+        RedirectTemplate(template)
@@ -1,14 +1,26 @@
 """Tests for ark/views.py, comprising the main endpoints for arklet."""
 
+import json
 import uuid
 from dataclasses import asdict, dataclass
+from functools import partial
 from itertools import chain, count
 from unittest.mock import patch
 
 import pytest
+from asgiref.sync import async_to_sync
+from django.core.management import call_command
+from django.db import connection
+from django.http import Http404
+from django.test import AsyncClient, AsyncRequestFactory
+from django.test.utils import CaptureQueriesContext
+from django.utils.http import http_date
 
-from arklet.ark.models import Ark, Key, Naan, Shoulder
-from arklet.ark.utils import parse_ark
+from arklet.ark.cache import LRUCache
+from arklet.ark.export import iter_arks
+from arklet.ark.models import APIKey, Ark, Key, Naan, Shoulder
+from arklet.ark.utils import noid_check_digit, parse_ark
+from arklet.ark.views import aresolve_ark
 
 
 @dataclass
@@ -24,14 +36,6 @@ class MintArkArgs:
     HTTP_AUTHORIZATION: str  # pylint: disable=invalid-name
 
 
-@pytest.fixture
-def naan(db):
-    """Create the initial NAAN used for most tests."""
-    return Naan.objects.create(
-        naan=1, name="Archive", description="A NAAN", url="https://example.com"
-    )
-
-
 @pytest.fixture
 def shoulder(db, naan):
     """Create an initial shoulder used for most tests."""
@@ -53,7 +57,7 @@ def ark(db, naan, shoulder):
     return Ark.objects.create(
         ark=f"{naan.naan}{shoulder.shoulder}12346",
         naan=naan,
-        shoulder=shoulder,
+        shoulder=shoulder.shoulder,
         assigned_name="12346",
     )
 
@@ -161,6 +165,19 @@ class TestMintArk:
         # Then we get a 403 Forbidden
         assert res.status_code == 403
 
+    @pytest.mark.django_db
+    def test_unregistered_shoulder(self, client, mint_ark_args, settings) -> None:
+        """mint_ark mints on any shoulder, unless told to require registered ones."""
+        mint_ark_args.data["shoulder"] = "/x9"
+        res = client.post(**asdict(mint_ark_args))
+        assert res.json()["ark"].startswith("ark:/1/x9")
+
+        settings.ARKLET_REQUIRE_REGISTERED_SHOULDERS = True
+        res = client.post(**asdict(mint_ark_args))
+        assert res.status_code == 400
+        assert "shoulder" in res.json()
+        assert Ark.objects.count() == 1
+
     @pytest.mark.django_db(transaction=True)
     @patch("arklet.ark.models.generate_noid")
     def test_fails_after_too_many_collisions(
@@ -214,3 +231,870 @@ class TestMintArk:
         msg = "Ark created after %d collision(s)"
         assert any(record for record in caplog.records if record.msg == msg)
         self._validate_success(mint_ark_args, res)
+
+
+@pytest.fixture
+def update_ark_args(ark, auth) -> MintArkArgs:
+    """Create the happy path arguments for update_ark in Django test client."""
+    return MintArkArgs(
+        path="/update",
+        data={"ark": str(ark), "url": "https://example.com/bound"},
+        content_type="application/json",
+        HTTP_AUTHORIZATION=auth,
+    )
+
+
+class TestUpdateArk:
+    """Test the arklet update_ark endpoint.
+
+    update_ark binds a URL, metadata and commitment to an existing ARK.
+    """
+
+    @pytest.mark.django_db
+    def test_happy_path(self, client, update_ark_args, ark) -> None:
+        """update_ark binds the new URL to the ARK."""
+        res = client.put(**asdict(update_ark_args))
+        assert res.status_code == 200
+        ark.refresh_from_db()
+        assert ark.url == "https://example.com/bound"
+
+    @pytest.mark.django_db
+    def test_unknown_ark_is_not_found(self, client, update_ark_args) -> None:
+        """update_ark 404s for an ARK that hasn't been minted."""
+        update_ark_args.data["ark"] = "ark:/1/t2nothere"
+        res = client.put(**asdict(update_ark_args))
+        assert res.status_code == 404
+
+    @pytest.mark.django_db
+    def test_other_naan_is_forbidden(self, client, update_ark_args) -> None:
+        """update_ark only updates ARKs belonging to the authorized NAAN."""
+        update_ark_args.data["ark"] = "ark:/2/t212346"
+        res = client.put(**asdict(update_ark_args))
+        assert res.status_code == 403
+
+
+class TestResolveArk:
+    """Test the arklet resolve_ark endpoint.
+
+    resolve_ark redirects to the URL bound to an ARK, or to a fallback resolver.
+    """
+
+    @pytest.mark.django_db
+    def test_redirects_to_bound_url(self, client, ark) -> None:
+        """resolve_ark redirects to the ARK's URL."""
+        ark.url = "https://example.com/bound"
+        ark.save()
+        res = client.get(f"/{ark}")
+        assert res.status_code == 302
+        assert res.url == "https://example.com/bound"
+
+    @pytest.mark.django_db
+    def test_unbound_ark_is_not_found(self, client, ark) -> None:
+        """resolve_ark 404s for an ARK without a URL."""
+        res = client.get(f"/{ark}")
+        assert res.status_code == 404
+
+    @pytest.mark.django_db
+    def test_unknown_ark_falls_back_to_naan(self, client, naan) -> None:
+        """resolve_ark sends ARKs it doesn't know to the NAAN's own resolver."""
+        res = client.get("/ark:/1/t2unknown")
+        assert res.status_code == 302
+        assert res.url == "https://example.com/ark:/1/t2unknown"
+
+    @pytest.mark.django_db
+    def test_unknown_naan_falls_back_to_n2t(self, client) -> None:
+        """resolve_ark sends ARKs for unknown NAANs to n2t.net."""
+        res = client.get("/ark:/99/x1")
+        assert res.status_code == 302
+        assert res.url == "https://n2t.net/ark:/99/x1"
+
+    def test_malformed_ark_is_bad_request(self, client) -> None:
+        """resolve_ark rejects ARKs it can't parse."""
+        res = client.get("/ark:/notanaan/x1")
+        assert res.status_code == 400
+
+    @pytest.mark.django_db
+    def test_repeat_resolutions_are_cached(
+        self, client, naan, django_assert_num_queries
+    ) -> None:
+        """resolve_ark serves repeat resolutions without querying the database."""
+        client.get("/ark:/1/t2unknown")
+        with django_assert_num_queries(0):
+            res = client.get("/ark:/1/t2unknown")
+        assert res.url == "https://example.com/ark:/1/t2unknown"
+
+    @pytest.mark.django_db
+    def test_update_invalidates_cache(self, client, update_ark_args, ark) -> None:
+        """A cached "not bound" result is dropped once update_ark binds a URL."""
+        assert client.get(f"/{ark}").status_code == 404
+        client.put(**asdict(update_ark_args))
+        res = client.get(f"/{ark}")
+        assert res.status_code == 302
+        assert res.url == "https://example.com/bound"
+
+    @pytest.mark.django_db
+    def test_update_reaches_other_workers(self, client, bound_ark, settings) -> None:
+        """Other workers see an update once their local copy expires."""
+        settings.CACHES = {
+            "default": {
+                "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+                "LOCATION": "updates",
+            }
+        }
+        settings.ARKLET_RESOLVER_CACHE_BACKEND = "default"
+        other_worker = LRUCache(
+            10, ttl=300, backend="default", prefix="arklet:resolution:", local_ttl=1
+        )
+        key = bound_ark.ark
+        client.get(f"/{bound_ark}")
+        with patch("arklet.ark.cache.time.monotonic", return_value=0):
+            assert other_worker.get(key).target == "https://example.com/bound"
+        bound_ark.url = "https://example.com/rebound"
+        bound_ark.save()
+        with patch("arklet.ark.cache.time.monotonic", return_value=1):
+            assert other_worker.get(key) is None
+        assert client.get(f"/{bound_ark}").url == "https://example.com/rebound"
+
+    @pytest.mark.django_db
+    def test_naan_change_reaches_other_workers(self, client, naan, settings) -> None:
+        """Cached fallbacks are dropped by every worker sharing the cache backend."""
+        settings.CACHES = {
+            "default": {
+                "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+                "LOCATION": "resolver",
+            }
+        }
+        settings.ARKLET_RESOLVER_CACHE_BACKEND = "default"
+        other_worker = LRUCache(
+            max_size=10, ttl=300, backend="default", prefix="arklet:resolution:"
+        )
+        client.get("/ark:/1/t2unknown")
+        assert other_worker.get("1/t2unknown").target.startswith("https://example.com")
+        naan.url = "https://example.org"
+        naan.save()
+        with patch("arklet.ark.cache.GENERATION_CHECK_INTERVAL", 0):
+            assert other_worker.get("1/t2unknown") is None
+        res = client.get("/ark:/1/t2unknown")
+        assert res.url == "https://example.org/ark:/1/t2unknown"
+
+    @pytest.mark.django_db
+    def test_mint_invalidates_cache(self, client, mint_ark_args) -> None:
+        """A cached fallback redirect is dropped once the ARK is minted."""
+        expected_ark = f"ark:/1/t2bcd{noid_check_digit('1/t2bcd')}"
+        assert client.get(f"/{expected_ark}").url.startswith("https://example.com/ark")
+        mint_ark_args.data["url"] = "https://example.com/minted"
+        with patch("arklet.ark.models.generate_noid", return_value="bcd"):
+            minted_ark = client.post(**asdict(mint_ark_args)).json()["ark"]
+        assert minted_ark == expected_ark
+        assert client.get(f"/{minted_ark}").url == "https://example.com/minted"
+
+    @pytest.mark.django_db
+    def test_resolves_with_one_query(
+        self, client, ark, django_assert_num_queries
+    ) -> None:
+        """A bound ARK costs one query, for its url column alone."""
+        with django_assert_num_queries(1) as queries:
+            client.get(f"/{ark}")
+        assert queries.captured_queries[0]["sql"].startswith('SELECT "ark_ark"."url"')
+
+    @pytest.mark.django_db
+    def test_redirect_templates(
+        self, client, naan, shoulder, django_assert_num_queries
+    ) -> None:
+        """Missing ARKs go to their shoulder's template, else their NAAN's."""
+        naan.redirect_template = "https://example.org/naan/{ark}"
+        naan.save()
+        Shoulder.objects.create(
+            naan=naan,
+            shoulder="/t5",
+            name="t5",
+            description="",
+            redirect_template="https://example.org/{shoulder}/{blade}",
+        )
+        assert client.get("/ark:/1/t5n960f7n").url == "https://example.org/t5/n960f7n"
+        assert client.get("/ark:/1/t2x").url == "https://example.org/naan/1/t2x"
+        # Once the registry is loaded, the template costs no query of its own
+        with django_assert_num_queries(1):
+            assert client.get("/ark:/1/x9").url == "https://example.org/naan/1/x9"
+
+    @pytest.mark.django_db
+    def test_suffix_passthrough(
+        self, client, bound_ark, naan, django_assert_num_queries
+    ) -> None:
+        """Qualified ARKs go to their nearest bound ancestor, with one query."""
+        with django_assert_num_queries(1):
+            res = client.get(f"/{bound_ark}/page/3.pdf")
+        assert res.url == "https://example.com/bound/page/3.pdf"
+        assert client.get(f"/{bound_ark}.v2").url == "https://example.com/bound.v2"
+        # Unbound ancestors are passed over, but an unbound ARK itself isn't found
+        Ark.objects.create(
+            ark=f"{bound_ark.ark}/page", naan=naan, shoulder="/t2", assigned_name=""
+        )
+        res = client.get(f"/{bound_ark}/page/3")
+        assert res.url == "https://example.com/bound/page/3"
+        assert client.get(f"/{bound_ark}/page").status_code == 404
+
+    @pytest.mark.django_db
+    def test_hyphens_are_insignificant(
+        self, client, bound_ark, naan, django_assert_num_queries
+    ) -> None:
+        """ARKs resolve with or without hyphens, as minted or as imported."""
+        name = bound_ark.assigned_name
+        hyphenated = f"/ark:/1/t2-{name[:2]}-{name[2:]}"
+        with django_assert_num_queries(1):
+            assert client.get(hyphenated).url == "https://example.com/bound"
+        assert client.get(f"/{bound_ark}").url == "https://example.com/bound"
+        assert client.get(f"{hyphenated}/p-1").url == "https://example.com/bound/p-1"
+        Ark.objects.create(
+            ark="1/t2C0X-SPWFRSGR-N",
+            naan=naan,
+            shoulder="/t2",
+            assigned_name="C0X-SPWFRSGR-N",
+            url="https://example.com/imported",
+        )
+        res = client.get("/ark:/1/t2C0X-SPWFRSGR-N")
+        assert res.url == "https://example.com/imported"
+
+    @pytest.mark.django_db
+    def test_fallbacks_are_cached_as_requested(self, client, naan) -> None:
+        """A fallback for a name without hyphens doesn't shadow one stored with them."""
+        Ark.objects.create(
+            ark="1/C0X-SPWFRSGR-N",
+            naan=naan,
+            shoulder="/C0X",
+            assigned_name="-SPWFRSGR-N",
+            url="https://example.com/imported",
+        )
+        res = client.get("/ark:/1/C0XSPWFRSGRN")
+        assert res.url == "https://example.com/ark:/1/C0XSPWFRSGRN"
+        res = client.get("/ark:/1/C0X-SPWFRSGR-N")
+        assert res.url == "https://example.com/imported"
+
+    @pytest.mark.django_db
+    def test_suffix_stays_in_the_path(self, client, bound_ark) -> None:
+        """Qualifiers are added to the ancestor URL's path, never to its host."""
+        bound_ark.url = "https://example.org"
+        bound_ark.save()
+        res = client.get(f"/{bound_ark}.evil.com/x")
+        assert res.url == "https://example.org/.evil.com/x"
+        bound_ark.url = "https://example.org/item?id=1#top"
+        bound_ark.save()
+        res = client.get(f"/{bound_ark}/page%233")
+        assert res.url == "https://example.org/item/page%233?id=1#top"
+
+    @pytest.mark.django_db
+    def test_inflections(self, client, bound_ark, naan) -> None:
+        """?info and ?? answer with the ARK's record instead of redirecting."""
+        bound_ark.metadata = "who: Someone"
+        bound_ark.commitment = "Kept forever"
+        bound_ark.save()
+        for inflection in ["?info", "??"]:
+            res = client.get(f"/{bound_ark}{inflection}")
+            assert res.status_code == 200
+            record = res.json()
+            assert record["ark"] == bound_ark.ark
+            assert record["url"] == "https://example.com/bound"
+            assert (record["metadata"], record["commitment"]) == (
+                "who: Someone",
+                "Kept forever",
+            )
+        assert client.get(f"/{bound_ark}/page?info").json()["ark"] == bound_ark.ark
+        # A bare "?" is only seen in the raw URI kept by servers such as gunicorn
+        res = client.get(f"/{bound_ark}", RAW_URI=f"/{bound_ark}?")
+        assert res.json()["ark"] == bound_ark.ark
+        assert client.get(f"/{bound_ark}?other=1").status_code == 302
+
+    @pytest.mark.django_db
+    def test_inflections_of_unknown_arks(self, client, naan) -> None:
+        """Inflections of ARKs missing here are passed on to their fallback."""
+        res = client.get("/ark:/1/t2unknown?info")
+        assert res.url == "https://example.com/ark:/1/t2unknown?info"
+
+
+@pytest.fixture
+def bound_ark(ark) -> Ark:
+    ark.url = "https://example.com/bound"
+    ark.save()
+    return ark
+
+
+@pytest.mark.django_db
+class TestResolverCaching:
+    """Test the caching headers and conditional GETs of resolve_ark."""
+
+    def test_headers(self, client, bound_ark, settings) -> None:
+        """Redirects carry Cache-Control, an ETag and the ARK's Last-Modified."""
+        settings.ARKLET_RESOLVER_MAX_AGE = 60
+        res = client.get(f"/{bound_ark}")
+        assert res.status_code == 302
+        assert res.headers["Cache-Control"] == "public, max-age=60"
+        assert res.headers["ETag"].startswith('"')
+        assert res.headers["Last-Modified"] == http_date(
+            bound_ark.updated_at.timestamp()
+        )
+
+    def test_if_none_match(self, client, bound_ark) -> None:
+        """A matching ETag gets a 304, until the ARK is rebound."""
+        etag = client.get(f"/{bound_ark}").headers["ETag"]
+        res = client.get(f"/{bound_ark}", HTTP_IF_NONE_MATCH=etag)
+        assert res.status_code == 304
+        assert res.headers["ETag"] == etag
+
+        bound_ark.url = "https://example.com/rebound"
+        bound_ark.save()
+        res = client.get(f"/{bound_ark}", HTTP_IF_NONE_MATCH=etag)
+        assert res.status_code == 302
+        assert res.url == "https://example.com/rebound"
+
+    def test_if_modified_since(self, client, bound_ark) -> None:
+        """A redirect unchanged since If-Modified-Since gets a 304."""
+        last_modified = client.get(f"/{bound_ark}").headers["Last-Modified"]
+        res = client.get(f"/{bound_ark}", HTTP_IF_MODIFIED_SINCE=last_modified)
+        assert res.status_code == 304
+        earlier = http_date(bound_ark.updated_at.timestamp() - 60)
+        res = client.get(f"/{bound_ark}", HTTP_IF_MODIFIED_SINCE=earlier)
+        assert res.status_code == 302
+
+    def test_max_age_overrides(self, client, bound_ark, settings) -> None:
+        """Max ages may be set per shoulder, then per NAAN."""
+        settings.ARKLET_RESOLVER_MAX_AGES = {"1": 600, "1/t2": 3600}
+        assert client.get(f"/{bound_ark}").headers["Cache-Control"].endswith("=3600")
+        settings.ARKLET_RESOLVER_MAX_AGES = {"1": 600, "1/x9": 3600}
+        assert client.get(f"/{bound_ark}").headers["Cache-Control"].endswith("=600")
+
+    def test_permanent_commitment(self, client, bound_ark, settings) -> None:
+        """ARKs committed to be permanent are redirected with a 301."""
+        settings.ARKLET_PERMANENT_COMMITMENT = "permanent"
+        assert client.get(f"/{bound_ark}").status_code == 302
+        bound_ark.commitment = " Permanent "
+        bound_ark.save()
+        res = client.get(f"/{bound_ark}")
+        assert res.status_code == 301
+        assert res.url == "https://example.com/bound"
+
+    def test_fallbacks_are_revalidated(self, client, naan) -> None:
+        """Fallback redirects can't be cached, as the ARK may be minted any time."""
+        res = client.get("/ark:/1/t2unknown")
+        assert res.status_code == 302
+        assert res.headers["Cache-Control"] == "no-cache"
+        assert "ETag" not in res.headers
+
+    def test_template_redirects_are_cached(self, client, naan, settings) -> None:
+        """Template redirects get their shoulder's max-age, like bound ARKs."""
+        settings.ARKLET_RESOLVER_MAX_AGES = {"1/t5": 3600}
+        Shoulder.objects.create(
+            naan=naan,
+            shoulder="/t5",
+            name="t5",
+            description="",
+            redirect_template="https://example.org/{blade}",
+        )
+        res = client.get("/ark:/1/t5x%20y/p&q=1")
+        assert res.url == "https://example.org/x%20y/p%26q%3D1"
+        assert res.headers["Cache-Control"] == "public, max-age=3600"
+        assert "ETag" not in res.headers
+
+
+class TestResolverOnly:
+    """Test the resolver-only mode of ARKLET_RESOLVER_ONLY."""
+
+    @pytest.fixture(autouse=True)
+    def resolver_only(self, settings):
+        settings.MIDDLEWARE = settings.ARKLET_RESOLVER_MIDDLEWARE
+        settings.ROOT_URLCONF = "arklet.entrypoints.resolver_urls"
+
+    @pytest.mark.django_db
+    def test_resolves(self, client, ark) -> None:
+        """ARKs resolve without sessions or auth."""
+        ark.url = "https://example.com/bound"
+        ark.save()
+        res = client.get(f"/{ark}")
+        assert res.status_code == 302
+        assert res.url == "https://example.com/bound"
+        assert "sessionid" not in res.cookies
+
+    @pytest.mark.django_db
+    def test_serves_nothing_else(self, client, mint_ark_args) -> None:
+        """Minting and the admin are left to the full entrypoint."""
+        assert client.post(**asdict(mint_ark_args)).status_code == 404
+        assert client.get("/admin/").status_code == 404
+
+
+@pytest.fixture
+def batch_mint_ark_args(mint_ark_args) -> MintArkArgs:
+    """Create the happy path arguments for batch_mint_ark in Django test client."""
+    mint_ark_args.path = "/mint/batch"
+    mint_ark_args.data["arks"] = [
+        {"url": f"https://example.com/{i}", "metadata": str(i)} for i in range(5)
+    ]
+    return mint_ark_args
+
+
+class TestAsyncResolveArk:
+    """Test aresolve_ark, the resolve_ark routed under ASGI."""
+
+    @staticmethod
+    def resolve(ark: str):
+        request = AsyncRequestFactory().get(f"/{ark}")
+        return async_to_sync(aresolve_ark)(request, ark=ark)
+
+    @pytest.mark.django_db
+    def test_redirects_to_bound_url(self, ark) -> None:
+        """aresolve_ark redirects to the ARK's URL."""
+        ark.url = "https://example.com/bound"
+        ark.save()
+        res = self.resolve(str(ark))
+        assert res.status_code == 302
+        assert res.url == "https://example.com/bound"
+
+    @pytest.mark.django_db
+    def test_unbound_ark_is_not_found(self, ark) -> None:
+        """aresolve_ark 404s for an ARK without a URL."""
+        with pytest.raises(Http404):
+            self.resolve(str(ark))
+
+    @pytest.mark.django_db
+    def test_falls_back_like_resolve_ark(self, naan) -> None:
+        """aresolve_ark falls back to the NAAN's resolver, then to n2t.net."""
+        assert self.resolve("ark:/1/t2unknown").url == (
+            "https://example.com/ark:/1/t2unknown"
+        )
+        assert self.resolve("ark:/99/x1").url == "https://n2t.net/ark:/99/x1"
+
+    @pytest.mark.django_db
+    def test_redirect_templates(self, naan, shoulder) -> None:
+        """aresolve_ark applies redirect templates like resolve_ark."""
+        Shoulder.objects.filter(pk=shoulder.pk).update(
+            redirect_template="https://example.org/{name}"
+        )
+        assert self.resolve("ark:/1/t2x").url == "https://example.org/t2x"
+
+    @pytest.mark.django_db
+    def test_passthrough_and_inflections(self, bound_ark) -> None:
+        """aresolve_ark passes suffixes through and answers inflections."""
+        res = self.resolve(f"{bound_ark}/page/3")
+        assert res.url == "https://example.com/bound/page/3"
+        request = AsyncRequestFactory().get(f"/{bound_ark}?info")
+        res = async_to_sync(aresolve_ark)(request, str(bound_ark))
+        assert json.loads(res.content)["ark"] == bound_ark.ark
+
+    def test_malformed_ark_is_bad_request(self) -> None:
+        """aresolve_ark rejects ARKs it can't parse."""
+        assert self.resolve("ark:/notanaan/x1").status_code == 400
+
+    @pytest.mark.django_db
+    def test_shares_the_resolver_cache(
+        self, client, naan, django_assert_num_queries
+    ) -> None:
+        """Resolutions cached by either view are served without a query."""
+        client.get("/ark:/1/t2unknown")
+        with django_assert_num_queries(0):
+            res = self.resolve("ark:/1/t2unknown")
+        assert res.url == "https://example.com/ark:/1/t2unknown"
+
+
+class TestBatchMintArk:
+    """Test the arklet batch_mint_ark endpoint.
+
+    batch_mint_ark mints many ARKs for one NAAN and shoulder in a single request.
+    """
+
+    @pytest.mark.django_db
+    def test_happy_path(self, client, batch_mint_ark_args) -> None:
+        """batch_mint_ark mints one ARK per binding, in request order."""
+        res = client.post(**asdict(batch_mint_ark_args))
+        assert res.status_code == 200
+        minted = [result["ark"] for result in res.json()["arks"]]
+        assert len(set(minted)) == 5
+        for i, minted_ark in enumerate(minted):
+            ark = Ark.objects.get(ark=minted_ark.removeprefix("ark:/"))
+            assert ark.url == f"https://example.com/{i}"
+            assert ark.metadata == str(i)
+
+    @pytest.mark.django_db
+    def test_invalid_items_are_reported(self, client, batch_mint_ark_args) -> None:
+        """batch_mint_ark reports per-item errors and mints the valid items."""
+        batch_mint_ark_args.data["arks"][1] = {"url": "not a url"}
+        batch_mint_ark_args.data["arks"][3] = "not an object"
+        res = client.post(**asdict(batch_mint_ark_args))
+        results = res.json()["arks"]
+        assert "url" in results[1]["errors"]
+        assert "errors" in results[3]
+        assert all("ark" in results[i] for i in (0, 2, 4))
+        assert Ark.objects.count() == 3
+
+    def test_authorized_naan_matches_post_naan(
+        self, client, batch_mint_ark_args
+    ) -> None:
+        """batch_mint_ark NAAN in auth header matches NAAN in POST body."""
+        batch_mint_ark_args.data["naan"] += 1
+        res = client.post(**asdict(batch_mint_ark_args))
+        assert res.status_code == 403
+
+    @pytest.mark.django_db
+    def test_unregistered_shoulder(self, client, batch_mint_ark_args, settings) -> None:
+        """batch_mint_ark can be told to mint only on registered shoulders."""
+        settings.ARKLET_REQUIRE_REGISTERED_SHOULDERS = True
+        batch_mint_ark_args.data["shoulder"] = "/x9"
+        res = client.post(**asdict(batch_mint_ark_args))
+        assert res.status_code == 400
+        assert "shoulder" in res.json()
+
+    def test_batch_size_is_limited(self, client, batch_mint_ark_args, settings) -> None:
+        """batch_mint_ark refuses batches larger than ARKLET_MAX_BATCH_SIZE."""
+        settings.ARKLET_MAX_BATCH_SIZE = 4
+        res = client.post(**asdict(batch_mint_ark_args))
+        assert res.status_code == 400
+
+    @pytest.mark.django_db
+    @patch("arklet.ark.models.generate_noids")
+    def test_only_collisions_are_regenerated(
+        self, mock_noid_gen, client, batch_mint_ark_args, ark
+    ) -> None:
+        """batch_mint_ark re-generates NOIDs only for the bindings that collided."""
+        # The first binding collides with an existing ARK, the second with the third.
+        existing_noid = ark.assigned_name[:-1]
+        noids = iter([existing_noid, "b1", "b1", "b3", "b4", "b5", "b6", "b7"])
+        mock_noid_gen.side_effect = lambda count, length: [
+            next(noids) for _ in range(count)
+        ]
+        res = client.post(**asdict(batch_mint_ark_args))
+        minted = [result["ark"] for result in res.json()["arks"]]
+        assert [name[len("ark:/1/t2") : -1] for name in minted] == [
+            "b5",
+            "b1",
+            "b6",
+            "b3",
+            "b4",
+        ]
+
+
+@pytest.fixture
+def batch_update_ark_args(ark, auth) -> MintArkArgs:
+    """Create the happy path arguments for batch_update_ark in Django test client."""
+    return MintArkArgs(
+        path="/update/batch",
+        data={"arks": [{"ark": str(ark), "url": "https://example.com/bound"}]},
+        content_type="application/json",
+        HTTP_AUTHORIZATION=auth,
+    )
+
+
+class TestBatchUpdateArk:
+    """Test the arklet batch_update_ark endpoint.
+
+    batch_update_ark rebinds many ARKs of one NAAN in a single request.
+    """
+
+    @pytest.mark.django_db
+    def test_happy_path(self, client, batch_update_ark_args, ark) -> None:
+        """batch_update_ark binds the new URL and bumps updated_at."""
+        updated_at = ark.updated_at
+        res = client.put(**asdict(batch_update_ark_args))
+        assert res.json() == {"arks": [{"ark": str(ark), "status": "updated"}]}
+        ark.refresh_from_db()
+        assert ark.url == "https://example.com/bound"
+        assert ark.updated_at > updated_at
+
+    @pytest.mark.django_db
+    def test_per_ark_status(self, client, batch_update_ark_args) -> None:
+        """batch_update_ark reports the outcome of each update separately."""
+        batch_update_ark_args.data["arks"] += [
+            {"ark": "ark:/1/t2nothere"},
+            {"ark": "ark:/2/t212346"},
+            {"ark": "not an ark"},
+        ]
+        res = client.put(**asdict(batch_update_ark_args))
+        statuses = [result["status"] for result in res.json()["arks"]]
+        assert statuses == ["updated", "not found", "forbidden", "invalid"]
+
+    @pytest.mark.django_db
+    def test_invalidates_cache(self, client, batch_update_ark_args, ark) -> None:
+        """batch_update_ark drops cached resolutions for the ARKs it updates."""
+        assert client.get(f"/{ark}").status_code == 404
+        client.put(**asdict(batch_update_ark_args))
+        assert client.get(f"/{ark}").url == "https://example.com/bound"
+
+    def test_put_only(self, client, batch_update_ark_args) -> None:
+        """batch_update_ark only accepts PUT requests."""
+        res = client.post(**asdict(batch_update_ark_args))
+        assert res.status_code == 405
+
+
+class TestAuthorize:
+    """Test the bearer token checks shared by the write endpoints."""
+
+    @pytest.mark.django_db
+    def test_authorization_is_cached(self, client, mint_ark_args) -> None:
+        """A repeat request with the same key skips the key lookup."""
+        client.post(**asdict(mint_ark_args))
+        with CaptureQueriesContext(connection) as queries:
+            res = client.post(**asdict(mint_ark_args))
+        assert res.status_code == 200
+        assert not [q for q in queries if "key" in q["sql"]]
+
+    @pytest.mark.django_db
+    def test_bad_keys_are_cached(
+        self, client, mint_ark_args, django_assert_num_queries
+    ) -> None:
+        """A repeat request with a rejected key is refused without a query."""
+        mint_ark_args.HTTP_AUTHORIZATION = f"Bearer {uuid.uuid4()}"
+        client.post(**asdict(mint_ark_args))
+        with django_assert_num_queries(0):
+            res = client.post(**asdict(mint_ark_args))
+        assert res.status_code == 403
+
+    @pytest.mark.django_db
+    def test_deactivated_key_is_revoked(self, client, mint_ark_args, naan) -> None:
+        """Deactivating a cached key revokes it immediately."""
+        assert client.post(**asdict(mint_ark_args)).status_code == 200
+        Key.objects.filter(naan=naan).get().delete()
+        assert client.post(**asdict(mint_ark_args)).status_code == 403
+
+    @pytest.mark.django_db
+    def test_apikey_deactivate_command(self, client, mint_ark_args, naan) -> None:
+        """manage.py apikey --deactivate revokes a cached APIKey."""
+        plain_key = APIKey.objects.create_key(naan, "ingest")
+        mint_ark_args.HTTP_AUTHORIZATION = f"Bearer {plain_key}"
+        assert client.post(**asdict(mint_ark_args)).status_code == 200
+        call_command("apikey", str(naan.naan), "ingest", "--deactivate")
+        assert client.post(**asdict(mint_ark_args)).status_code == 403
+
+
+def read_ndjson(res) -> list[dict]:
+    """Parse a streamed NDJSON response."""
+    body = b"".join(res.streaming_content).decode()
+    return [json.loads(line) for line in body.splitlines()]
+
+
+class TestVerifyArks:
+    """Test the arklet verify_arks endpoint."""
+
+    @pytest.mark.django_db
+    def test_statuses(self, client, naan) -> None:
+        """verify_arks reports existence and check digits of each ARK in order."""
+        ark, _ = Ark.objects.mint(naan, "/t2", "", "", "")
+        name = ark.assigned_name
+        transposed = f"ark:/1/t2{name[1]}{name[0]}{name[2:]}"
+        res = client.post(
+            "/verify",
+            {"arks": [str(ark), transposed, "not an ark", 5]},
+            content_type="application/json",
+        )
+        assert res["Content-Type"] == "application/x-ndjson"
+        results = read_ndjson(res)
+        assert [r["ark"] for r in results] == [str(ark), transposed, "not an ark", 5]
+        assert results[0] == {
+            "ark": str(ark),
+            "status": "found",
+            "valid_check_digit": True,
+        }
+        if name[0] != name[1]:
+            assert results[1]["valid_check_digit"] is False
+        assert results[1]["status"] == "not found"
+        assert results[2] == {"ark": "not an ark", "status": "malformed"}
+        assert results[3]["status"] == "malformed"
+
+    def test_hyphens(self, client, naan) -> None:
+        """Hyphens are ignored when checking existence and check digits."""
+        ark, _ = Ark.objects.mint(naan, "/t2", "", "", "")
+        name = ark.assigned_name
+        res = client.post(
+            "/verify",
+            {"arks": [f"ark:/1/t2-{name[:3]}-{name[3:]}"]},
+            content_type="application/json",
+        )
+        [result] = read_ndjson(res)
+        assert (result["status"], result["valid_check_digit"]) == ("found", True)
+
+    def test_streams_under_asgi(self, naan) -> None:
+        """Under ASGI, results are streamed from an async iterator, not buffered."""
+
+        async def verify():
+            res = await AsyncClient().post(
+                "/verify", {"arks": ["ark:/1/t2x"]}, content_type="application/json"
+            )
+            assert res.is_async
+            return b"".join([chunk async for chunk in res.streaming_content])
+
+        [result] = [json.loads(line) for line in async_to_sync(verify)().splitlines()]
+        assert result["status"] == "not found"
+
+    @pytest.mark.django_db
+    def test_queries_once_per_chunk(
+        self, client, naan, django_assert_num_queries
+    ) -> None:
+        """verify_arks checks existence with one query per 1000 ARKs."""
+        arks = [f"ark:/1/t2{i}" for i in range(2500)]
+        with django_assert_num_queries(3):
+            res = client.post(
+                "/verify", {"arks": arks}, content_type="application/json"
+            )
+            assert len(read_ndjson(res)) == 2500
+
+    def test_bad_requests(self, client, settings) -> None:
+        """verify_arks rejects bodies that aren't a list of ARKs, or are too long."""
+        settings.ARKLET_MAX_VERIFY_SIZE = 2
+        post = partial(client.post, "/verify", content_type="application/json")
+        assert post({"arks": "ark:/1/t2"}).status_code == 400
+        assert post({"ark": []}).status_code == 400
+        assert post({"arks": ["ark:/1/t2"] * 3}).status_code == 400
+        assert client.get("/verify").status_code == 405
+
+
+@pytest.fixture
+def many_arks(naan, shoulder) -> list[Ark]:
+    """Mint ARKs on two shoulders."""
+    arks, _ = Ark.objects.mint_many(naan, "/t2", [{"url": "https://example.com"}] * 7)
+    other_arks, _ = Ark.objects.mint_many(naan, "/t3", [{}] * 3)
+    return arks + other_arks
+
+
+class TestExportArks:
+    """Test the arklet export_arks endpoint and exportarks command."""
+
+    @pytest.mark.django_db
+    def test_exports_every_ark(self, client, auth, many_arks) -> None:
+        """export_arks streams every ARK of the NAAN, in order."""
+        res = client.get("/export", {"naan": 1}, HTTP_AUTHORIZATION=auth)
+        assert res["Content-Type"] == "application/x-ndjson"
+        rows = read_ndjson(res)
+        assert [row["ark"] for row in rows] == sorted(ark.ark for ark in many_arks)
+        assert rows[0].keys() == {
+            "ark",
+            "url",
+            "metadata",
+            "commitment",
+            "created_at",
+            "updated_at",
+        }
+
+    @pytest.mark.django_db
+    def test_streams_under_asgi(self, auth, many_arks) -> None:
+        """Under ASGI, exports are streamed from an async iterator, not buffered."""
+
+        async def export():
+            res = await AsyncClient().get(
+                "/export",
+                {"naan": 1},
+                headers={"Authorization": auth},
+            )
+            assert res.is_async
+            return b"".join([chunk async for chunk in res.streaming_content])
+
+        rows = [json.loads(line) for line in async_to_sync(export)().splitlines()]
+        assert [row["ark"] for row in rows] == sorted(ark.ark for ark in many_arks)
+
+    @pytest.mark.django_db
+    def test_filters(self, client, auth, many_arks) -> None:
+        """export_arks can be limited to a shoulder and to ARKs updated since."""
+        res = client.get(
+            "/export", {"naan": 1, "shoulder": "/t3"}, HTTP_AUTHORIZATION=auth
+        )
+        assert len(read_ndjson(res)) == 3
+        later = Ark.objects.get(pk=many_arks[0].pk)
+        later.url = "https://example.com/later"
+        later.save()
+        res = client.get(
+            "/export",
+            {"naan": 1, "since": later.updated_at.isoformat()},
+            HTTP_AUTHORIZATION=auth,
+        )
+        assert [row["ark"] for row in read_ndjson(res)] == [later.ark]
+
+    @pytest.mark.django_db
+    def test_csv(self, client, auth, many_arks) -> None:
+        """export_arks writes CSV with a header row."""
+        res = client.get(
+            "/export", {"naan": 1, "format": "csv"}, HTTP_AUTHORIZATION=auth
+        )
+        lines = b"".join(res.streaming_content).decode().splitlines()
+        assert lines[0] == "ark,url,metadata,commitment,created_at,updated_at"
+        assert len(lines) == 11
+
+    @pytest.mark.django_db
+    def test_keyset_pagination(self, naan, many_arks, django_assert_num_queries):
+        """iter_arks reads one batch per query, however many rows there are."""
+        with django_assert_num_queries(4):
+            rows = list(iter_arks(naan, batch_size=3))
+        assert [row[0] for row in rows] == sorted(ark.ark for ark in many_arks)
+
+    @pytest.mark.django_db
+    def test_authorization(self, client, auth, naan) -> None:
+        """export_arks needs a key authorized for the NAAN."""
+        Naan.objects.create(naan=2, name="Other", description="", url="")
+        assert client.get("/export", {"naan": 1}).status_code == 403
+        res = client.get("/export", {"naan": 2}, HTTP_AUTHORIZATION=auth)
+        assert res.status_code == 403
+        res = client.get("/export", {"naan": "x"}, HTTP_AUTHORIZATION=auth)
+        assert res.status_code == 400
+
+    @pytest.mark.django_db
+    def test_command(self, many_arks, tmp_path) -> None:
+        """exportarks writes the same rows as export_arks."""
+        output = tmp_path / "arks.csv"
+        call_command(
+            "exportarks", "1", "--shoulder", "/t2", "--format", "csv", output=output
+        )
+        assert len(output.read_text().splitlines()) == 8
+
+
+class TestArkChanges:
+    """Test the arklet ark_changes feed."""
+
+    @pytest.fixture(autouse=True)
+    def no_delay(self, settings) -> None:
+        settings.ARKLET_CHANGES_DELAY = 0
+
+    def page(self, client, auth, **params) -> dict:
+        res = client.get("/changes", {"naan": 1, **params}, HTTP_AUTHORIZATION=auth)
+        assert res.status_code == 200
+        return res.json()
+
+    @pytest.mark.django_db
+    def test_pages_through_every_change(self, client, auth, many_arks) -> None:
+        """Following the cursor visits every ARK once, in order of change."""
+        seen, cursor = [], ""
+        while True:
+            page = self.page(client, auth, cursor=cursor, limit=3)
+            if not page["arks"]:
+                break
+            seen += page["arks"]
+            cursor = page["cursor"]
+        assert sorted(row["ark"] for row in seen) == sorted(a.ark for a in many_arks)
+        assert [row["updated_at"] for row in seen] == sorted(
+            row["updated_at"] for row in seen
+        )
+
+    @pytest.mark.django_db
+    def test_only_new_changes(self, client, auth, many_arks) -> None:
+        """After catching up, the cursor returns only ARKs changed since."""
+        cursor = self.page(client, auth, limit=100)["cursor"]
+        assert self.page(client, auth, cursor=cursor) == {"arks": [], "cursor": cursor}
+        Ark.objects.bind_many({many_arks[3].ark: {"url": "https://example.com/new"}})
+        page = self.page(client, auth, cursor=cursor)
+        assert [row["url"] for row in page["arks"]] == ["https://example.com/new"]
+        assert page["cursor"] != cursor
+
+    @pytest.mark.django_db
+    def test_since(self, client, auth, many_arks) -> None:
+        """Without a cursor, the feed can start at a timestamp."""
+        latest = Ark.objects.order_by("updated_at").last()
+        page = self.page(client, auth, since=latest.updated_at.isoformat())
+        assert [row["ark"] for row in page["arks"]] == [latest.ark]
+
+    @pytest.mark.django_db
+    def test_delay(self, client, auth, many_arks, settings) -> None:
+        """Changes younger than ARKLET_CHANGES_DELAY are held back."""
+        settings.ARKLET_CHANGES_DELAY = 60
+        assert self.page(client, auth)["arks"] == []
+
+    @pytest.mark.django_db
+    def test_bad_requests(self, client, auth, naan) -> None:
+        """ark_changes rejects invalid cursors and other NAANs."""
+        res = client.get(
+            "/changes", {"naan": 1, "cursor": "nope"}, HTTP_AUTHORIZATION=auth
+        )
+        assert res.status_code == 400
+        res = client.get("/changes", {"naan": 2}, HTTP_AUTHORIZATION=auth)
+        assert res.status_code == 403
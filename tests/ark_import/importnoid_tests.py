@@ -0,0 +1,99 @@
+"""Tests for the importnoid management command."""
+
+import shutil
+
+import pytest
+from django.core.management import CommandError, call_command
+from django.db import connection
+
+from arklet.ark.models import Ark, Naan
+from arklet.ark_import.loader import import_range, plan_shards
+from arklet.ark_import.noid import parse_rules
+from tests.ark_import.noid_tests import SAMPLE_DUMP
+
+
+@pytest.fixture
+def naan(db):
+    """Create the NAAN of the sample dump."""
+    return Naan.objects.create(
+        naan=13960, name="Archive", description="A NAAN", url="https://example.com"
+    )
+
+
+@pytest.fixture
+def dump(tmp_path):
+    """Copy the sample dump somewhere its checkpoint can be written."""
+    return shutil.copy(SAMPLE_DUMP, tmp_path / "noid.dump")
+
+
+@pytest.mark.django_db
+def test_clears_resolver_cache(naan, dump, client) -> None:
+    """Fallbacks cached before the import don't outlive it."""
+    res = client.get("/ark:/13960/fk3ws8hp67")
+    assert res.url == "https://example.com/ark:/13960/fk3ws8hp67"
+    call_command("importnoid", dump, "--shoulder", "13960/fk")
+    res = client.get("/ark:/13960/fk3ws8hp67")
+    assert res.url == "http://www.archive.org/details/thereefanovel00wharrich"
+
+
+@pytest.mark.django_db
+def test_imports_bindings(naan, dump) -> None:
+    """importnoid loads the bindings under the given shoulders."""
+    call_command("importnoid", dump, "--shoulder", "13960/t", "--shoulder", "13960/fk")
+    assert Ark.objects.count() == 8
+    ark = Ark.objects.get(ark="13960/fk3ws8hp67")
+    assert ark.shoulder == "/fk"
+    assert ark.assigned_name == "3ws8hp67"
+    assert ark.url == "http://www.archive.org/details/thereefanovel00wharrich"
+
+
+@pytest.mark.django_db
+def test_resumes_from_checkpoint(naan, dump) -> None:
+    """A second run resumes after the last committed batch."""
+    args = [dump, "--shoulder", "13960/t", "--batch-size", "3"]
+    call_command("importnoid", *args)
+    Ark.objects.all().delete()
+    call_command("importnoid", *args)
+    assert Ark.objects.count() == 0
+    call_command("importnoid", *args, "--restart")
+    assert Ark.objects.count() == 7
+
+
+@pytest.mark.django_db
+def test_existing_arks_are_not_overwritten(naan, dump) -> None:
+    """ARKs already in the database are counted as conflicts and left alone."""
+    Ark.objects.create(
+        ark="13960/t00000018", naan=naan, shoulder="/t", assigned_name="00000018"
+    )
+    call_command("importnoid", dump, "--shoulder", "13960/t")
+    assert Ark.objects.count() == 7
+    assert Ark.objects.get(ark="13960/t00000018").url == ""
+
+
+@pytest.mark.django_db
+def test_unknown_naan(dump) -> None:
+    """importnoid refuses to import ARKs for NAANs that don't exist."""
+    with pytest.raises(CommandError):
+        call_command("importnoid", dump, "--shoulder", "13960/t")
+
+
+@pytest.mark.django_db
+def test_shards_import_every_binding_once(naan, dump, tmp_path) -> None:
+    """Importing the shards of a dump one by one imports the whole dump."""
+    rules = parse_rules(["13960/t", "13960/fk"])
+    shards = plan_shards(dump, 5)
+    results = [
+        import_range(dump, rules, tmp_path / f"shard-{i}", start=start, end=end)
+        for i, (start, end) in enumerate(shards)
+    ]
+    assert sum(result["inserted"] for result in results) == 8
+    assert Ark.objects.count() == 8
+
+
+@pytest.mark.django_db
+def test_workers_need_concurrent_writes(naan, dump) -> None:
+    """--workers is refused on SQLite, which would lock up under parallel writes."""
+    if connection.vendor != "sqlite":
+        pytest.skip("only SQLite refuses --workers")
+    with pytest.raises(CommandError):
+        call_command("importnoid", dump, "--shoulder", "13960/t", "--workers", "2")
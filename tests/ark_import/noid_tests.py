@@ -0,0 +1,78 @@
+"""Tests for ark_import/noid.py, the Noid dump parsing pipeline."""
+
+import io
+from pathlib import Path
+
+import pytest
+
+import arklet.ark_import
+from arklet.ark_import.noid import (
+    ShoulderRule,
+    extract_ark,
+    noid_bindings,
+    parse_rules,
+    read_records,
+)
+
+SAMPLE_DUMP = Path(arklet.ark_import.__file__).parent / "sample_noid_output.txt"
+
+
+def test_parse_rules_longest_shoulder_first() -> None:
+    """Rules are ordered so the most specific shoulder is tried first."""
+    rules = parse_rules(["13960/t", "ark:/13960/fk"])
+    assert rules == [ShoulderRule(13960, "/fk"), ShoulderRule(13960, "/t")]
+
+
+@pytest.mark.parametrize("spec", ["13960", "abc/t", "13960/"])
+def test_parse_rules_rejects_bad_specs(spec) -> None:
+    """Rules need an integer NAAN and a shoulder."""
+    with pytest.raises(ValueError):
+        parse_rules([spec])
+
+
+def test_extract_ark() -> None:
+    """Record keys are split into NAAN, shoulder and blade."""
+    rules = parse_rules(["13960/t", "13960/fk"])
+    assert extract_ark("ark:/13960/fk3ws8hp67|_t", rules) == (13960, "/fk", "3ws8hp67")
+    with pytest.raises(ValueError):
+        extract_ark("ark:/12345/t00000018|_t", rules)
+    with pytest.raises(ValueError):
+        extract_ark("ark:/13960/t0000001|_t", rules, blade_length=8)
+
+
+def test_sample_dump() -> None:
+    """Only the _t records of the sample dump are read."""
+    with SAMPLE_DUMP.open("rb") as f:
+        bindings = [
+            b for b, _ in noid_bindings(read_records(f), parse_rules(["13960/t"]))
+        ]
+    assert len(bindings) == 7
+    assert bindings[0].ark == "13960/t00000018"
+    assert bindings[0].url == "http://www.archive.org/details/intronational00greerich"
+
+
+def test_read_records_resumes_on_record_boundary() -> None:
+    """Reading from any offset picks up exactly the records not yet read."""
+    dump = SAMPLE_DUMP.read_bytes()
+    with SAMPLE_DUMP.open("rb") as f:
+        records = list(read_records(f))
+        for start in range(0, len(dump), 97):
+            expected = [r for r in records if r.end_offset > start]
+            # The record straddling start is only re-read if its key line begins there
+            resumed = list(read_records(f, start=start))
+            assert resumed == expected[len(expected) - len(resumed) :]
+            assert len(expected) - len(resumed) in (0, 1)
+
+
+def test_read_records_shards_partition_the_dump() -> None:
+    """Byte-range shards together yield every record exactly once."""
+    f = io.BytesIO(SAMPLE_DUMP.read_bytes())
+    size = len(f.getvalue())
+    everything = list(read_records(f))
+    for step in (1, 50, 333, size):
+        shards = [
+            record
+            for start in range(0, size, step)
+            for record in read_records(f, start=start, end=start + step)
+        ]
+        assert shards == everything
@@ -0,0 +1,61 @@
+"""Shared pytest fixtures for the arklet test suite."""
+
+import pytest
+
+from arklet.ark.cache import get_auth_cache, get_resolver_cache
+from arklet.ark.models import Ark, Naan
+from arklet.ark.shoulders import reset_shoulder_registry
+
+
+@pytest.fixture(autouse=True)
+def clear_caches():
+    """In-process caches outlive the per-test database rollback, so reset them."""
+    get_resolver_cache().clear()
+    get_auth_cache().clear()
+    reset_shoulder_registry()
+    yield
+    get_resolver_cache().clear()
+    get_auth_cache().clear()
+    reset_shoulder_registry()
+
+
+@pytest.fixture
+def naan(db):
+    """Create the initial NAAN used for most tests."""
+    return Naan.objects.create(
+        naan=1, name="Archive", description="A NAAN", url="https://example.com"
+    )
+
+
+@pytest.fixture
+def naans(naan):
+    """Create a second NAAN next to the initial one."""
+    other = Naan.objects.create(
+        naan=2, name="Other", description="", url="https://example.com"
+    )
+    return [naan, other]
+
+
+@pytest.fixture
+def create_arks(db):
+    """Return a function that bulk creates ARKs of a NAAN on a shoulder.
+
+    Each ARK is bound to url, filled in with its naan and name.
+    """
+
+    def create(naan, shoulder, names, url="https://example.com/{naan}/{name}"):
+        return Ark.objects.bulk_create(
+            (
+                Ark(
+                    ark=f"{naan.naan}{shoulder}{name}",
+                    naan=naan,
+                    shoulder=shoulder,
+                    assigned_name=name,
+                    url=url.format(naan=naan.naan, name=name),
+                )
+                for name in names
+            ),
+            batch_size=5000,
+        )
+
+    return create